@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 import os
 
+from corsheaders.defaults import default_headers
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -144,7 +146,9 @@ CORS_ALLOWED_ORIGINS = [
 CORS_EXPOSE_HEADERS = [
     'Content-Type',
     'X-CSRFToken',
+    'Idempotent-Replayed',
 ]
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 
 # Session settings
 SESSION_COOKIE_SECURE = False  # Set to True in production
@@ -159,6 +163,85 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Keyset pagination for product listings. Clients may request a smaller or
+# larger page with ?page_size=, capped at CATALOG_MAX_PAGE_SIZE.
+CATALOG_PAGE_SIZE = 24
+CATALOG_MAX_PAGE_SIZE = 100
+
+# Order history (/api/orders/) is keyset paginated the same way.
+ORDER_HISTORY_PAGE_SIZE = 20
+ORDER_HISTORY_MAX_PAGE_SIZE = 100
+
+# Admin changelists (Orders, Carts, Products) count at most this many rows;
+# a larger unfiltered table is counted from the database's statistics.
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
+# Upper bounds (exclusive) of the price facet buckets in the product list.
+CATALOG_PRICE_BUCKETS = (100, 500, 1000, 5000)
+
+# Catalog read responses are cached until a Product, ProductImage or
+# Category write bumps the catalog version (see products/cache.py). Any
+# shared backend (Redis, Memcached) can replace local memory here.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+CATALOG_CACHE_TIMEOUT = 60 * 60
+
+# Product image derivatives (products/images.py): resized widths in pixels,
+# each written as WebP and JPEG by a background thread pool after upload.
+PRODUCT_IMAGE_WIDTHS = (320, 640, 1280)
+PRODUCT_IMAGE_WORKERS = 2
+
+# Abandoned carts are purged (`manage.py purge_carts`, run from cron) once
+# idle this many days; carts attached to a user are kept longer.
+CART_ANONYMOUS_TTL_DAYS = 30
+CART_USER_TTL_DAYS = 180
+CART_PURGE_CHUNK_SIZE = 500
+
+# Where carts are stored (products/cart_storage.py). CacheCartStore keeps
+# anonymous carts in CACHES and writes them to the database on login or
+# checkout; it needs a shared cache (Redis, Memcached) with several workers.
+# Stock holds are written to the database whichever store is used, so it
+# saves the cart writes but not the hold writes of each add.
+CART_STORE = 'products.cart_storage.ORMCartStore'
+
+# Minutes a cart's stock hold lasts (products/inventory.py). Holds are
+# refreshed on every cart change and freed by `manage.py release_expired_holds`.
+STOCK_HOLD_MINUTES = 15
+
+# Cart writes sent with an Idempotency-Key header (products/idempotency.py)
+# store their response for this long so retries replay it; purge with
+# `manage.py purge_idempotency_keys`. A duplicate arriving while the first
+# request runs waits up to IDEMPOTENCY_WAIT_SECONDS; a key held longer than
+# IDEMPOTENCY_LOCK_SECONDS by a request that died is taken over.
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+IDEMPOTENCY_WAIT_SECONDS = 10
+IDEMPOTENCY_LOCK_SECONDS = 60
+
+# Delivered and cancelled orders untouched for ORDER_ARCHIVE_AFTER_DAYS are
+# moved to the archive tables by `manage.py archive_orders` (run from cron),
+# ORDER_ARCHIVE_CHUNK_SIZE orders per transaction (products/archive.py).
+ORDER_ARCHIVE_AFTER_DAYS = 180
+ORDER_ARCHIVE_CHUNK_SIZE = 500
+
+# Background jobs (products/jobs.py, run by `manage.py run_workers`). A
+# failed job is retried after JOB_RETRY_BASE_SECONDS, doubling each time up
+# to JOB_RETRY_MAX_SECONDS, and marked dead after JOB_MAX_ATTEMPTS. A job
+# still running after JOB_LOCK_TIMEOUT seconds is assumed lost and requeued.
+JOB_WORKER_THREADS = 2
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BASE_SECONDS = 10
+JOB_RETRY_MAX_SECONDS = 60 * 60
+JOB_LOCK_TIMEOUT = 5 * 60
+
+# Outgoing mail is printed to the console in development. New orders and
+# contact messages are also sent to STAFF_NOTIFICATION_EMAILS.
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'orders@buildcom.local'
+STAFF_NOTIFICATION_EMAILS = []
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
@@ -1,6 +1,41 @@
 from django.contrib import admin
+from django.contrib.admin.views.main import SEARCH_VAR
+from django.db.models import Prefetch, Q
+from django.shortcuts import redirect
+from django.urls import reverse
+from django.utils.http import urlencode
 from django.utils.html import format_html
-from .models import Product, Category, Order, OrderItem, Cart, CartItem, ProductImage, ContactSubmission
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import (Product, Category, Order, OrderItem, ArchivedOrder, ArchivedOrderItem, Cart, CartItem, ProductImage,
+                     ContactSubmission, StockReservation, Job, DailySales)
+from .archive import find_order, order_querysets
+from .jobs import retry
+from .pagination import EstimatedCountPaginator
+from .rollups import sales_report
+from .search import get_search_backend
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist settings for tables too big to count or scan on every page
+    view. ``prefix_search_fields`` pairs a field with a function that
+    normalises the search term for it (or None); each field is matched
+    with a case-sensitive ``startswith`` so an index on it can answer.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    prefix_search_fields = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term or not self.prefix_search_fields:
+            return super().get_search_results(request, queryset, search_term)
+        condition = Q()
+        for field, normalise in self.prefix_search_fields:
+            condition |= Q(**{f'{field}__startswith': normalise(term) if normalise else term})
+        return queryset.filter(condition), False
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -11,6 +46,9 @@ class OrderItemInline(admin.TabularInline):
     def has_add_permission(self, request, obj=None):
         return False
 
+class ArchivedOrderItemInline(OrderItemInline):
+    model = ArchivedOrderItem
+
 class ProductImageInline(admin.TabularInline):
     model = ProductImage
     extra = 1
@@ -21,25 +59,60 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ('name',)
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'category', 'display_price', 'stock')
+class ProductAdmin(LargeTableAdmin):
+    list_display = ('name', 'category', 'display_price', 'stock', 'reserved')
     list_filter = ('category',)
+    list_select_related = ('category',)
     search_fields = ('name', 'description')
+    search_help_text = 'Searches name, description and category like the shop search.'
+    readonly_fields = ('reserved',)
     inlines = [ProductImageInline]
 
+    def get_search_results(self, request, queryset, search_term):
+        # The full-text index instead of icontains over description
+        if not search_term.strip():
+            return queryset, False
+        return get_search_backend().search(queryset, search_term), False
+
     def display_price(self, obj):
         return f'₹{obj.price}'
     display_price.short_description = 'Price'
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableAdmin):
     list_display = ('order_number', 'customer_details', 'order_items', 'display_total', 'status', 'created_at')
     list_filter = ('status', 'created_at')
-    search_fields = ('order_number', 'user_email', 'full_name', 'phone')
+    search_fields = ('order_number', 'user_email', 'phone')
+    prefix_search_fields = (('order_number', str.upper), ('user_email', str.lower), ('phone', None))
+    search_help_text = 'Start of an order number, email address or phone number.'
     readonly_fields = ('order_number', 'user_id', 'user_email', 'display_total', 'created_at', 'updated_at')
     inlines = [OrderItemInline]
     ordering = ('-created_at',)
     list_editable = ('status',)
+    item_model = OrderItem
+    # Searches and lookups here also reach archived orders (products/archive.py)
+    reads_archive = True
+
+    def get_queryset(self, request):
+        items = self.item_model.objects.only('order_id', 'product_name', 'product_price', 'quantity').order_by('id')
+        return super().get_queryset(request).prefetch_related(Prefetch('items', queryset=items))
+
+    def changelist_view(self, request, extra_context=None):
+        term = request.GET.get(SEARCH_VAR, '').strip()
+        if self.reads_archive and term:
+            archived, _ = self.get_search_results(request, order_querysets()[1], term)
+            if archived.exists():
+                url = reverse('admin:products_archivedorder_changelist') + '?' + urlencode({SEARCH_VAR: term})
+                self.message_user(request, format_html(
+                    'Archived orders also match “{}”: <a href="{}">view them</a>.', term, url))
+        return super().changelist_view(request, extra_context)
+
+    def change_view(self, request, object_id, form_url='', extra_context=None):
+        if self.reads_archive and str(object_id).isdigit():
+            order = find_order(pk=object_id)
+            if isinstance(order, ArchivedOrder):
+                return redirect('admin:products_archivedorder_change', order.pk)
+        return super().change_view(request, object_id, form_url, extra_context)
 
     def display_total(self, obj):
         return f'₹{obj.total_amount}'
@@ -94,15 +167,55 @@ class OrderAdmin(admin.ModelAdmin):
         else:
             super().save_model(request, obj, form, change)
 
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(OrderAdmin):
+    """Archived orders with the same columns and search as live ones, read-only."""
+    list_editable = ()
+    reads_archive = False
+    readonly_fields = OrderAdmin.readonly_fields + ('archived_at',)
+    inlines = [ArchivedOrderItemInline]
+    item_model = ArchivedOrderItem
+    fieldsets = OrderAdmin.fieldsets[:2] + (
+        ('Timestamps', {
+            'fields': ('created_at', 'updated_at', 'archived_at'),
+            'classes': ('collapse',)
+        }),
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(Cart)
-class CartAdmin(admin.ModelAdmin):
+class CartAdmin(LargeTableAdmin):
     list_display = ('id', 'user_email', 'session_id', 'display_total', 'created_at')
     search_fields = ('user_email', 'session_id')
+    prefix_search_fields = (('user_email', str.lower), ('session_id', None))
+    search_help_text = 'Start of an email address or session id.'
     readonly_fields = ('display_total',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_totals()
+
     def display_total(self, obj):
         return f'₹{obj.total}'
     display_total.short_description = 'Total'
+    display_total.admin_order_field = 'items_total'
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('holder', 'product', 'quantity', 'expires_at')
+    list_select_related = ('product',)
+    search_fields = ('holder',)
+    readonly_fields = ('holder', 'product', 'quantity', 'expires_at', 'created_at')
+
+    def has_add_permission(self, request):
+        return False
 
 class CartItemInline(admin.TabularInline):
     model = CartItem
@@ -152,3 +265,58 @@ class ContactSubmissionAdmin(admin.ModelAdmin):
             color, obj.get_status_display()
         )
     status_badge.short_description = 'Status'
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task', 'status', 'attempts', 'run_at', 'created_at', 'finished_at')
+    list_filter = ('status', 'task')
+    readonly_fields = ('task', 'payload', 'status', 'attempts', 'max_attempts', 'run_at',
+                       'locked_by', 'locked_at', 'last_error', 'created_at', 'finished_at')
+    actions = ['retry_jobs']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Retry selected dead jobs')
+    def retry_jobs(self, request, queryset):
+        self.message_user(request, f'{retry(queryset)} jobs queued again.')
+
+@admin.register(DailySales)
+class DailySalesAdmin(admin.ModelAdmin):
+    """
+    The sales dashboard: the last 30 days from the rollup tables, above the
+    raw daily rows. Nothing here reads Order or OrderItem.
+    """
+    list_display = ('day', 'status', 'orders', 'units', 'revenue')
+    list_filter = ('status',)
+    date_hierarchy = 'day'
+    ordering = ('-day', 'status')
+    change_list_template = 'admin/products/dailysales/change_list.html'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        until = timezone.localdate()
+        since = until - timedelta(days=29)
+        by_day = sales_report(since, until, 'day')
+        peak = max((row['revenue'] for row in by_day['rows']), default=0) or 1
+        for row in by_day['rows']:
+            row['width'] = int(row['revenue'] * 100 / peak)
+        extra_context = {
+            **(extra_context or {}),
+            'since': since,
+            'until': until,
+            'totals': by_day['totals'],
+            'by_day': by_day['rows'],
+            'by_status': sales_report(since, until, 'status', statuses=[s for s, _ in Order.STATUS_CHOICES])['rows'],
+            'top_products': sales_report(since, until, 'product', limit=10)['rows'],
+            'top_categories': sales_report(since, until, 'category', limit=10)['rows'],
+        }
+        return super().changelist_view(request, extra_context)
@@ -0,0 +1,102 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem
+
+# Orders in these statuses never change again and may be archived
+ARCHIVE_STATUSES = ('delivered', 'cancelled')
+
+
+def archive_age():
+    return timedelta(days=getattr(settings, 'ORDER_ARCHIVE_AFTER_DAYS', 180))
+
+
+def archivable(now=None, age=None):
+    """Finished orders not updated for ``age`` (ORDER_ARCHIVE_AFTER_DAYS by default)."""
+    cutoff = (now or timezone.now()) - (archive_age() if age is None else age)
+    return Order.objects.filter(status__in=ARCHIVE_STATUSES, updated_at__lt=cutoff)
+
+
+def order_querysets(**filters):
+    """
+    The orders matching ``filters`` in the hot table and in the archive.
+    Every reader of order history goes through both, so archiving an
+    order never hides it from its owner or from staff.
+    """
+    return [Order.objects.filter(**filters), ArchivedOrder.objects.filter(**filters)]
+
+
+def find_order(**filters):
+    """The order matching ``filters``, live or archived, or None."""
+    for queryset in order_querysets(**filters):
+        order = queryset.first()
+        if order is not None:
+            return order
+    return None
+
+
+def archive_orders(age=None, chunk_size=None, pause=0):
+    """
+    Move archivable orders and their items into ArchivedOrder and
+    ArchivedOrderItem, ``chunk_size`` orders per transaction, sleeping
+    ``pause`` seconds between chunks. Returns counts and timings for reporting.
+    """
+    chunk_size = chunk_size or getattr(settings, 'ORDER_ARCHIVE_CHUNK_SIZE', 500)
+    started = time.monotonic()
+    now = timezone.now()
+    candidates = archivable(now, age).order_by('pk')
+    if connection.features.has_select_for_update_skip_locked:
+        # Leave orders someone is editing for the next run
+        candidates = candidates.select_for_update(skip_locked=True)
+
+    stats = {'orders': 0, 'items': 0, 'chunks': 0}
+    while True:
+        with transaction.atomic():
+            ids = list(candidates.values_list('pk', flat=True)[:chunk_size])
+            if not ids:
+                break
+            orders, items = _move(ids, now)
+        stats['orders'] += orders
+        stats['items'] += items
+        stats['chunks'] += 1
+        if pause:
+            time.sleep(pause)
+    stats['elapsed'] = time.monotonic() - started
+    return stats
+
+
+def _columns(model, exclude=()):
+    return ', '.join(
+        connection.ops.quote_name(field.column)
+        for field in model._meta.concrete_fields if field.column not in exclude
+    )
+
+
+def _move(ids, now):
+    # Copy with INSERT ... SELECT and remove with raw DELETEs: nothing is
+    # loaded into Python, and the orders live on in the archive, so the
+    # pre_delete signal must not take them out of the sales rollups.
+    table = lambda model: connection.ops.quote_name(model._meta.db_table)
+    id_list = ', '.join(['%s'] * len(ids))
+    order_columns = _columns(ArchivedOrder, exclude=('archived_at',))
+    item_columns = _columns(ArchivedOrderItem)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table(ArchivedOrder)} ({order_columns}, archived_at) '
+            f'SELECT {order_columns}, %s FROM {table(Order)} WHERE id IN ({id_list})',
+            [connection.ops.adapt_datetimefield_value(now), *ids],
+        )
+        orders = cursor.rowcount
+        cursor.execute(
+            f'INSERT INTO {table(ArchivedOrderItem)} ({item_columns}) '
+            f'SELECT {item_columns} FROM {table(OrderItem)} WHERE order_id IN ({id_list})',
+            ids,
+        )
+        items = cursor.rowcount
+        cursor.execute(f'DELETE FROM {table(OrderItem)} WHERE order_id IN ({id_list})', ids)
+        cursor.execute(f'DELETE FROM {table(Order)} WHERE id IN ({id_list})', ids)
+    return orders, items
@@ -0,0 +1,139 @@
+import functools
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+VERSION_KEY = 'catalog:version'
+MODIFIED_KEY = 'catalog:modified'
+HITS_KEY = 'catalog:stats:hits'
+MISSES_KEY = 'catalog:stats:misses'
+
+# Query params whose value is matched case-insensitively, so "Cement" and
+# "cement " share a cache entry.
+CASE_INSENSITIVE_PARAMS = ('search', 'q')
+
+
+def _incr(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Missing or evicted; add() keeps a concurrent creator's value
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key)
+
+
+def get_catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, timeout=None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_catalog_version():
+    """
+    Invalidate every cached catalog response at once. Entries keyed on the
+    old version are never read again and simply age out of the cache.
+    """
+    _incr(VERSION_KEY)
+    cache.set(MODIFIED_KEY, int(time.time()), timeout=None)
+
+
+def get_catalog_modified():
+    """Unix time of the last catalog write seen by this cache, if known."""
+    return cache.get(MODIFIED_KEY)
+
+
+def bump_catalog_version_on_commit():
+    # Bump now for readers in this transaction and again once the write is
+    # visible, so a response cached from pre-commit data cannot outlive it.
+    bump_catalog_version()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(bump_catalog_version)
+
+
+def cache_stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'version': get_catalog_version(),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
+
+
+def normalized_params(request):
+    params = []
+    for key, values in request.query_params.lists():
+        for value in values:
+            value = ' '.join(value.split())
+            if not value:
+                continue
+            if key in CASE_INSENSITIVE_PARAMS:
+                value = value.lower()
+            params.append((key, value))
+    return urlencode(sorted(params))
+
+
+def request_fingerprint(request, view):
+    # The host is part of the key because paginated responses embed
+    # absolute next/previous links.
+    raw = '|'.join([
+        request.get_host(),
+        view.basename,
+        view.action or '',
+        str(view.kwargs.get(view.lookup_url_kwarg or view.lookup_field, '')),
+        normalized_params(request),
+    ])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def catalog_cache_key(request, view):
+    return f'catalog:v{get_catalog_version()}:{request_fingerprint(request, view)}'
+
+
+def cache_catalog_response(view_method):
+    """
+    Serve a successful GET from the cache until the catalog version changes.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if request.method != 'GET':
+            return view_method(self, request, *args, **kwargs)
+
+        key = catalog_cache_key(request, self)
+        data = cache.get(key)
+        if data is not None:
+            _incr(HITS_KEY)
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _incr(MISSES_KEY)
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, response.data, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 3600))
+        response['X-Cache'] = 'MISS'
+        return response
+    return wrapper
+
+
+class CatalogCacheMixin:
+    """
+    Viewset mixin caching ``list`` and ``retrieve``. Decorate extra GET
+    actions with ``cache_catalog_response``.
+    """
+    @cache_catalog_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cache_catalog_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
@@ -0,0 +1,395 @@
+import uuid
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Prefetch, Q, prefetch_related_objects
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .carts import apply_operations, existing_products, hold_results, plan_operations
+from .inventory import release
+from .models import Cart, CartItem, Product
+
+
+def _product_fields(serializer):
+    items = serializer.nested('items')
+    product = items.nested('product') if items is not None else None
+    return product.fields if product is not None else {}
+
+
+class CartStore:
+    """
+    Where carts live. ``CartViewSet`` resolves and changes carts only through
+    the configured store, so every store must give the same API behaviour.
+
+    ``get`` returns the request's cart (or None) and ``get_or_create`` makes
+    one. Writes (``add``, ``set_quantity``, ``remove``, ``clear``,
+    ``apply``) are followed by ``changed``, which bumps the version and
+    refreshes the total. Stock holds are taken by the view, not the store.
+    ``load_items`` readies a cart for CartSerializer and ``line`` returns one
+    line for delta responses.
+    """
+    def get(self, request):
+        raise NotImplementedError
+
+    def get_or_create(self, request, cart=None):
+        raise NotImplementedError
+
+    def is_empty(self, cart):
+        raise NotImplementedError
+
+    def quantities(self, cart):
+        """``{product_id: quantity}`` for every line."""
+        raise NotImplementedError
+
+    def product_of(self, cart, item_id):
+        """The product id of line ``item_id``, or None if the cart has no such line."""
+        raise NotImplementedError
+
+    def add(self, cart, product_id, quantity):
+        raise NotImplementedError
+
+    def set_quantity(self, cart, item_id, quantity):
+        """Set a line's quantity, removing it at 0. Returns False if missing."""
+        raise NotImplementedError
+
+    def remove(self, cart, item_id):
+        raise NotImplementedError
+
+    def clear(self, cart):
+        raise NotImplementedError
+
+    def apply(self, cart, operations, reserve=None):
+        """
+        Apply parsed batch operations; ``reserve`` is called with the final
+        quantities before any line is written (see ``carts.hold_results``).
+        """
+        raise NotImplementedError
+
+    def changed(self, cart):
+        pass
+
+    def load_items(self, cart, serializer):
+        raise NotImplementedError
+
+    def line(self, cart, product_id=None, item_id=None):
+        raise NotImplementedError
+
+
+class ORMCartStore(CartStore):
+    """Every cart is a Cart row with CartItem rows."""
+
+    def get(self, request):
+        """
+        The user's cart and the session's cart are read in one query; an
+        anonymous session cart is attached to the user on login, or merged
+        into the cart they already have.
+        """
+        user_id = request.query_params.get('user_id') or request.data.get('user_id')
+        session_id = request.session.get('cart_id')
+        lookup = Q()
+        if user_id:
+            lookup |= Q(user_id=user_id)
+        if session_id:
+            lookup |= Q(session_id=session_id)
+        if not lookup:
+            return None
+
+        user_cart = session_cart = None
+        for cart in Cart.objects.with_totals().filter(lookup).order_by('id'):
+            if user_id and cart.user_id == user_id and user_cart is None:
+                user_cart = cart
+            if cart.session_id == session_id:
+                session_cart = cart
+
+        if session_cart is None or session_cart == user_cart:
+            return user_cart or session_cart
+        if not user_id or session_cart.user_id:
+            # Anonymous request, or the session cart belongs to someone else
+            return user_cart or session_cart
+        if user_cart is None:
+            session_cart.user_id = user_id
+            session_cart.user_email = request.data.get('user_email') or session_cart.user_email
+            session_cart.save(update_fields=['user_id', 'user_email', 'updated_at'])
+            return session_cart
+
+        # Holds follow the session key; the merged lines are re-held on checkout
+        release(session_cart.session_id)
+        Cart.objects.merge(session_cart, user_cart)
+        request.session['cart_id'] = user_cart.session_id
+        return Cart.objects.with_totals().get(pk=user_cart.pk)
+
+    def get_or_create(self, request, cart=None):
+        user_id = request.data.get('user_id')
+        user_email = request.data.get('user_email')
+        if not cart:
+            session_id = str(uuid.uuid4())
+            request.session['cart_id'] = session_id
+            cart = Cart.objects.create(
+                session_id=session_id,
+                user_id=user_id,
+                user_email=user_email
+            )
+        elif user_id and not cart.user_id:
+            cart.user_id = user_id
+            cart.user_email = user_email
+            cart.save(update_fields=['user_id', 'user_email', 'updated_at'])
+        return cart
+
+    def is_empty(self, cart):
+        return not cart.items.exists()
+
+    def quantities(self, cart):
+        return dict(CartItem.objects.filter(cart=cart).values_list('product_id', 'quantity'))
+
+    def product_of(self, cart, item_id):
+        return CartItem.objects.filter(id=item_id, cart=cart).values_list('product_id', flat=True).first()
+
+    def add(self, cart, product_id, quantity):
+        CartItem.objects.add_quantity(cart.pk, product_id, quantity)
+
+    def set_quantity(self, cart, item_id, quantity):
+        lines = CartItem.objects.filter(id=item_id, cart=cart)
+        if quantity > 0:
+            return bool(lines.update(quantity=quantity, updated_at=timezone.now()))
+        return self.remove(cart, item_id)
+
+    def remove(self, cart, item_id):
+        deleted, _ = CartItem.objects.filter(id=item_id, cart=cart).delete()
+        return bool(deleted)
+
+    def clear(self, cart):
+        cart.items.all().delete()
+
+    def apply(self, cart, operations, reserve=None):
+        return apply_operations(cart, operations, reserve)
+
+    def changed(self, cart):
+        Cart.objects.filter(pk=cart.pk).bump_version()
+        cart.items_total, cart.version = (
+            Cart.objects.with_totals().values_list('items_total', 'version').get(pk=cart.pk)
+        )
+
+    def load_items(self, cart, serializer):
+        """
+        Load every line with its product in one query (plus one for images
+        when they are rendered), however many items the cart holds.
+        """
+        queryset = CartItem.objects.with_subtotals().select_related('product')
+        fields = _product_fields(serializer)
+        if 'category_name' in fields:
+            queryset = queryset.select_related('product__category')
+        if 'product_images' in fields:
+            queryset = queryset.prefetch_related('product__product_images')
+        if 'description' not in fields and 'summary' not in fields:
+            queryset = queryset.defer('product__description')
+        prefetch_related_objects([cart], Prefetch('items', queryset=queryset))
+
+    def line(self, cart, product_id=None, item_id=None):
+        lookup = {'product_id': product_id} if product_id is not None else {'id': item_id}
+        return (
+            CartItem.objects.with_subtotals()
+            .select_related('product__category')
+            .filter(cart=cart, **lookup)
+            .first()
+        )
+
+
+class StoredCart:
+    """
+    An anonymous cart kept outside the database. It carries the attributes
+    CartSerializer reads; ``items`` is a plain list of unsaved CartItems
+    whose id is the product id.
+    """
+    id = pk = None
+    user_id = user_email = None
+
+    def __init__(self, session_id, lines=None, version=0):
+        self.session_id = session_id
+        self.lines = lines or {}  # product id -> quantity, in insertion order
+        self.version = version
+        self.items = []
+
+    @property
+    def total(self):
+        return sum((item.subtotal for item in self.items), Decimal('0.00'))
+
+
+class CacheCartStore(ORMCartStore):
+    """
+    Keeps anonymous carts in the Django cache, so browsing visitors cost no
+    Cart or CartItem writes; the session only holds the cart's key. Stock
+    holds still live in the database for every cart, so each add or quantity
+    change writes a StockReservation and Product.reserved as with
+    ORMCartStore. A cart is written to the database, merged into any cart
+    the user already has, once a request carries a user_id (login,
+    checkout). Carts attached to a user are handled exactly as by
+    ORMCartStore.
+
+    Anonymous writes are read-modify-write on the cache entry, so two
+    simultaneous adds from the same browser may collapse into one.
+    """
+    key_prefix = 'cart:anon:'
+
+    def cache_key(self, session_id):
+        return f'{self.key_prefix}{session_id}'
+
+    def timeout(self):
+        return getattr(settings, 'CART_ANONYMOUS_TTL_DAYS', 30) * 24 * 60 * 60
+
+    def load(self, session_id):
+        data = cache.get(self.cache_key(session_id))
+        if data is None:
+            return None
+        return StoredCart(session_id, dict(data['lines']), data['version'])
+
+    def save(self, cart):
+        cart.version += 1
+        data = {'lines': cart.lines, 'version': cart.version}
+        cache.set(self.cache_key(cart.session_id), data, self.timeout())
+
+    def persist(self, request, stored, user_id):
+        """Write an anonymous cart to the database for ``user_id`` and forget it."""
+        with transaction.atomic():
+            cart = Cart.objects.filter(user_id=user_id).order_by('id').first()
+            if cart is None:
+                cart, _ = Cart.objects.get_or_create(session_id=stored.session_id, defaults={
+                    'user_id': user_id, 'user_email': request.data.get('user_email'),
+                })
+            for product_id in Product.objects.filter(pk__in=stored.lines).values_list('pk', flat=True):
+                CartItem.objects.add_quantity(cart.pk, product_id, stored.lines[product_id])
+            Cart.objects.filter(pk=cart.pk).bump_version()
+        cache.delete(self.cache_key(stored.session_id))
+        if cart.session_id != stored.session_id:
+            # Holds follow the session key; the lines are re-held on checkout
+            release(stored.session_id)
+        request.session['cart_id'] = cart.session_id
+
+    def get(self, request):
+        user_id = request.query_params.get('user_id') or request.data.get('user_id')
+        session_id = request.session.get('cart_id')
+        stored = self.load(session_id) if session_id else None
+        if stored is None:
+            return super().get(request)
+        if user_id:
+            self.persist(request, stored, user_id)
+            return super().get(request)
+        return stored
+
+    def get_or_create(self, request, cart=None):
+        if isinstance(cart, StoredCart):
+            return cart
+        if cart is not None or request.data.get('user_id'):
+            return super().get_or_create(request, cart)
+        session_id = str(uuid.uuid4())
+        request.session['cart_id'] = session_id
+        return StoredCart(session_id)
+
+    def product_of(self, cart, item_id):
+        if not isinstance(cart, StoredCart):
+            return super().product_of(cart, item_id)
+        return self._product_id(cart, item_id)
+
+    def _product_id(self, cart, item_id):
+        try:
+            product_id = int(item_id)
+        except (TypeError, ValueError):
+            return None
+        return product_id if product_id in cart.lines else None
+
+    def is_empty(self, cart):
+        if isinstance(cart, StoredCart):
+            return not cart.lines
+        return super().is_empty(cart)
+
+    def quantities(self, cart):
+        if isinstance(cart, StoredCart):
+            return dict(cart.lines)
+        return super().quantities(cart)
+
+    def add(self, cart, product_id, quantity):
+        if not isinstance(cart, StoredCart):
+            return super().add(cart, product_id, quantity)
+        cart.lines[product_id] = cart.lines.get(product_id, 0) + quantity
+        self.save(cart)
+
+    def set_quantity(self, cart, item_id, quantity):
+        if not isinstance(cart, StoredCart):
+            return super().set_quantity(cart, item_id, quantity)
+        product_id = self._product_id(cart, item_id)
+        if product_id is None:
+            return False
+        if quantity > 0:
+            cart.lines[product_id] = quantity
+        else:
+            del cart.lines[product_id]
+        self.save(cart)
+        return True
+
+    def remove(self, cart, item_id):
+        if not isinstance(cart, StoredCart):
+            return super().remove(cart, item_id)
+        return self.set_quantity(cart, item_id, 0)
+
+    def clear(self, cart):
+        if not isinstance(cart, StoredCart):
+            return super().clear(cart)
+        cart.lines = {}
+        self.save(cart)
+
+    def apply(self, cart, operations, reserve=None):
+        if not isinstance(cart, StoredCart):
+            return super().apply(cart, operations, reserve)
+        products = existing_products(operations, known=cart.lines)
+        by_item = {product_id: product_id for product_id in cart.lines}
+        before = dict(cart.lines)
+        results = plan_operations(cart.lines, operations, products, by_item)
+        if reserve is not None:
+            hold_results(results, cart.lines, before, reserve)
+        cart.lines = {product_id: quantity for product_id, quantity in cart.lines.items() if quantity}
+        self.save(cart)
+        return results
+
+    def changed(self, cart):
+        if not isinstance(cart, StoredCart):
+            return super().changed(cart)
+        # The total is computed from current prices, so load the lines now
+        self._load_products(cart, fields={'category_name'})
+
+    def load_items(self, cart, serializer):
+        if not isinstance(cart, StoredCart):
+            return super().load_items(cart, serializer)
+        self._load_products(cart, _product_fields(serializer))
+
+    def _load_products(self, cart, fields):
+        queryset = Product.objects.all()
+        if 'category_name' in fields:
+            queryset = queryset.select_related('category')
+        if 'product_images' in fields:
+            queryset = queryset.prefetch_related('product_images')
+        products = queryset.in_bulk(list(cart.lines))
+        cart.items = [
+            CartItem(id=product_id, product=products[product_id], quantity=quantity)
+            for product_id, quantity in cart.lines.items()
+            if product_id in products
+        ]
+
+    def line(self, cart, product_id=None, item_id=None):
+        if not isinstance(cart, StoredCart):
+            return super().line(cart, product_id, item_id)
+        if product_id is None:
+            product_id = self._product_id(cart, item_id)
+        return next((item for item in cart.items if item.product_id == product_id), None)
+
+
+_stores = {}
+
+
+def get_cart_store():
+    """Return the store named by ``CART_STORE`` (a dotted path), ORM by default."""
+    path = getattr(settings, 'CART_STORE', 'products.cart_storage.ORMCartStore')
+    if path not in _stores:
+        _stores[path] = import_string(path)()
+    return _stores[path]
@@ -0,0 +1,196 @@
+import time
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .db import delete_in_chunks
+from .models import Cart, CartItem, Product
+
+MAX_OPERATIONS = 200
+OPERATIONS = ('add', 'set', 'remove')
+
+
+def parse_quantity(value, minimum):
+    """``value`` as an int of at least ``minimum``, or None if it is not one."""
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number >= minimum else None
+
+
+def _parse_int(value, name, index, minimum):
+    number = parse_quantity(value, minimum)
+    if number is None:
+        raise serializers.ValidationError(
+            {'operations': f'operation {index}: {name} must be an integer >= {minimum}'}
+        )
+    return number
+
+
+def parse_operations(raw):
+    """
+    Validate a list of ``{"op": "add"|"set"|"remove", "product_id" | "item_id",
+    "quantity"}`` dicts. Malformed input rejects the whole batch; references to
+    missing products or lines are reported per operation by ``apply_operations``.
+    """
+    if not isinstance(raw, list) or not raw:
+        raise serializers.ValidationError({'operations': 'A non-empty list of operations is required.'})
+    if len(raw) > MAX_OPERATIONS:
+        raise serializers.ValidationError({'operations': f'At most {MAX_OPERATIONS} operations per batch.'})
+
+    operations = []
+    for index, op in enumerate(raw):
+        if not isinstance(op, dict) or op.get('op') not in OPERATIONS:
+            raise serializers.ValidationError(
+                {'operations': f'operation {index}: op must be one of {", ".join(OPERATIONS)}'}
+            )
+        kind = op['op']
+        parsed = {'op': kind}
+        if op.get('product_id') is not None:
+            parsed['product_id'] = _parse_int(op['product_id'], 'product_id', index, 1)
+        elif kind != 'add' and op.get('item_id') is not None:
+            parsed['item_id'] = _parse_int(op['item_id'], 'item_id', index, 1)
+        else:
+            raise serializers.ValidationError(
+                {'operations': f'operation {index}: product_id is required'
+                 if kind == 'add' else f'operation {index}: product_id or item_id is required'}
+            )
+        if kind == 'add':
+            parsed['quantity'] = _parse_int(op.get('quantity', 1), 'quantity', index, 1)
+        elif kind == 'set':
+            parsed['quantity'] = _parse_int(op.get('quantity'), 'quantity', index, 0)
+        operations.append(parsed)
+    return operations
+
+
+def plan_operations(quantities, operations, products, by_item):
+    """
+    Apply parsed operations in order to ``quantities`` (product id ->
+    quantity, updated in place; 0 marks a removed line). ``products`` holds
+    the product ids that exist and ``by_item`` maps line ids to product ids.
+    Returns one result dict per operation.
+    """
+    results = []
+    for index, op in enumerate(operations):
+        product_id = op.get('product_id', by_item.get(op.get('item_id')))
+        result = {'index': index, 'op': op['op'], 'product_id': product_id}
+        if product_id is None:
+            result.update(status='error', error='Item not found')
+        elif product_id not in products:
+            result.update(status='error', error='Product not found')
+        elif op['op'] == 'remove' and not quantities.get(product_id):
+            result.update(status='error', error='Item not found')
+        else:
+            if op['op'] == 'add':
+                quantities[product_id] = quantities.get(product_id, 0) + op['quantity']
+            elif op['op'] == 'set':
+                quantities[product_id] = op['quantity']
+            else:
+                quantities[product_id] = 0
+            result.update(status='ok', quantity=quantities[product_id])
+        results.append(result)
+    return results
+
+
+def hold_results(results, quantities, before, reserve):
+    """
+    Call ``reserve`` with the final quantity of every product the operations
+    changed; it returns InsufficientStock lines for those it could not hold.
+    Those products go back to their quantity ``before`` the batch and their
+    operations become errors carrying what is ``available``.
+    """
+    targets = {r['product_id']: quantities[r['product_id']] for r in results if r['status'] == 'ok'}
+    short = {line['product_id']: line for line in reserve(targets)} if targets else {}
+    for result in results:
+        line = short.get(result['product_id'])
+        if line is not None and result['status'] == 'ok':
+            del result['quantity']
+            result.update(status='error', error='Insufficient stock', available=line['available'])
+    for product_id in short:
+        quantities[product_id] = before.get(product_id, 0)
+    return results
+
+
+def existing_products(operations, known=()):
+    """Ids of the products the operations name that exist, in one query."""
+    wanted = {op['product_id'] for op in operations if 'product_id' in op} - set(known)
+    products = set(Product.objects.filter(pk__in=wanted).values_list('pk', flat=True))
+    products.update(known)
+    return products
+
+
+def apply_operations(cart, operations, reserve=None):
+    """
+    Apply parsed operations to ``cart`` in order, in one transaction: one
+    product lookup, one read of the cart's lines, then a single upsert and a
+    single delete. ``reserve`` (see ``hold_results``) settles stock before
+    anything is written. Returns one result dict per operation.
+    """
+    with transaction.atomic():
+        lines = {
+            item.product_id: item
+            for item in CartItem.objects.select_for_update().filter(cart=cart).only('id', 'product_id', 'quantity')
+        }
+        by_item = {item.pk: product_id for product_id, item in lines.items()}
+        products = existing_products(operations, known=lines)
+        quantities = {product_id: item.quantity for product_id, item in lines.items()}
+        results = plan_operations(quantities, operations, products, by_item)
+        if reserve is not None:
+            hold_results(results, quantities, {pid: item.quantity for pid, item in lines.items()}, reserve)
+
+        now = timezone.now()
+        changed = [
+            CartItem(cart=cart, product_id=product_id, quantity=quantity, updated_at=now)
+            for product_id, quantity in quantities.items()
+            if quantity and (product_id not in lines or lines[product_id].quantity != quantity)
+        ]
+        removed = [product_id for product_id, quantity in quantities.items()
+                   if not quantity and product_id in lines]
+        if changed:
+            CartItem.objects.bulk_create(
+                changed, update_conflicts=True,
+                unique_fields=['cart', 'product'], update_fields=['quantity', 'updated_at'],
+            )
+        if removed:
+            CartItem.objects.filter(cart=cart, product_id__in=removed).delete()
+    return results
+
+
+def purge_carts(anonymous_days=None, user_days=None, chunk_size=None, pause=0, sessions=True):
+    """
+    Delete carts (and their lines) idle longer than their TTL, then expired
+    sessions. Safe to run from cron while the site is serving traffic.
+    Returns counts and timings for reporting.
+    """
+    if anonymous_days is None:
+        anonymous_days = getattr(settings, 'CART_ANONYMOUS_TTL_DAYS', 30)
+    if user_days is None:
+        user_days = getattr(settings, 'CART_USER_TTL_DAYS', 180)
+    chunk_size = chunk_size or getattr(settings, 'CART_PURGE_CHUNK_SIZE', 500)
+    now = timezone.now()
+    started = time.monotonic()
+
+    stats = {}
+    anonymous = Cart.objects.filter(user_id__isnull=True, updated_at__lt=now - timedelta(days=anonymous_days))
+    stats['anonymous_rows'], chunks = delete_in_chunks(anonymous, chunk_size, pause)
+    owned = Cart.objects.filter(user_id__isnull=False, updated_at__lt=now - timedelta(days=user_days))
+    stats['user_rows'], more = delete_in_chunks(owned, chunk_size, pause)
+    stats['chunks'] = chunks + more
+
+    stats['session_rows'] = 0
+    if sessions:
+        if settings.SESSION_ENGINE == 'django.contrib.sessions.backends.db':
+            from django.contrib.sessions.models import Session
+            stats['session_rows'], more = delete_in_chunks(
+                Session.objects.filter(expire_date__lt=now), chunk_size, pause)
+            stats['chunks'] += more
+        else:
+            import_module(settings.SESSION_ENGINE).SessionStore.clear_expired()
+
+    stats['elapsed'] = time.monotonic() - started
+    return stats
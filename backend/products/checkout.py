@@ -0,0 +1,99 @@
+import uuid
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .cache import bump_catalog_version_on_commit
+from .inventory import InsufficientStock, consume
+from .jobs import enqueue
+from .models import Cart, CartItem, Order, OrderItem, Product, StockReservation
+from .rollups import record_order
+
+
+def new_order_number():
+    return f"ORD-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}"
+
+
+def place_order(cart, details):
+    """
+    Turn ``cart`` into an Order in one transaction. Stock is taken with a
+    conditional ``UPDATE ... SET stock = stock - qty WHERE stock - reserved >= qty``
+    per product, where the cart's own hold counts as available and moves out
+    of ``reserved`` with the stock. Products are updated in id order so
+    concurrent checkouts lock rows in the same order, and stock can never go
+    negative or eat into other carts' holds. If any line is short nothing is
+    written and InsufficientStock lists every short line. ``details`` holds
+    the Order's customer fields. The sales rollups are updated and
+    confirmation emails queued in the same transaction.
+    """
+    with transaction.atomic():
+        lines = list(
+            CartItem.objects.with_subtotals()
+            .filter(cart=cart)
+            .select_related('product__category')
+            .order_by('product_id')
+        )
+        holds = dict(
+            StockReservation.objects.select_for_update()
+            .filter(holder=cart.session_id, product_id__in=[line.product_id for line in lines])
+            .values_list('product_id', 'quantity')
+        )
+        now = timezone.now()
+        short = []
+        for line in lines:
+            held = holds.get(line.product_id, 0)
+            taken = Product.objects.filter(
+                pk=line.product_id, stock__gte=F('reserved') - held + line.quantity,
+            ).update(stock=F('stock') - line.quantity, reserved=F('reserved') - held, updated_at=now)
+            if not taken:
+                short.append(line)
+        if short:
+            available = {
+                pk: stock - reserved + holds.get(pk, 0)
+                for pk, stock, reserved in Product.objects.filter(
+                    pk__in=[line.product_id for line in short]
+                ).values_list('pk', 'stock', 'reserved')
+            }
+            # Raising rolls back the stock already taken for the other lines
+            raise InsufficientStock([
+                {
+                    'item_id': line.pk,
+                    'product_id': line.product_id,
+                    'product_name': line.product.name,
+                    'requested': line.quantity,
+                    'available': max(available.get(line.product_id, 0), 0),
+                }
+                for line in short
+            ])
+
+        order = Order.objects.create(
+            order_number=new_order_number(),
+            total_amount=sum(line.subtotal for line in lines),
+            **details,
+        )
+        items = OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=line.product,
+                product_name=line.product.name,
+                product_price=line.product.price,
+                quantity=line.quantity,
+            )
+            for line in lines
+        ])
+        record_order(order, items)
+        # Queued in this transaction: sent only if the order commits
+        enqueue('order_confirmation', order_id=order.pk)
+        enqueue('order_notification', order_id=order.pk)
+        consume(cart.session_id, holds)
+        CartItem.objects.filter(cart=cart).delete()
+        Cart.objects.filter(pk=cart.pk).bump_version()
+        # Stock changed through update(), which sends no signals. Cached
+        # catalog pages are only dropped when a product sells out, since that
+        # changes in_stock listings and facets; other stock counts may lag
+        # there until the next catalog write, and /api/stock/ is always live.
+        if Product.objects.filter(pk__in=[line.product_id for line in lines], stock__lte=0).exists():
+            bump_catalog_version_on_commit()
+    return order
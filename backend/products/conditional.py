@@ -0,0 +1,76 @@
+import functools
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .cache import get_catalog_modified, get_catalog_version, request_fingerprint
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    # Weak: the representation is equivalent, not byte-identical across renderers
+    return 'W/"%s"' % digest[:32]
+
+
+def conditional_get(view_method):
+    """
+    Answer GET/HEAD with 304 Not Modified when the client's If-None-Match or
+    If-Modified-Since still matches ``view.get_validators(request)``, without
+    running the view. Successful responses get ETag and Last-Modified.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view_method(self, request, *args, **kwargs)
+
+        etag, last_modified = self.get_validators(request)
+        if etag is None and last_modified is None:
+            return view_method(self, request, *args, **kwargs)
+
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is None:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+        else:
+            response = not_modified
+
+        if etag is not None:
+            response['ETag'] = quote_etag(etag)
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, **self.conditional_cache_control)
+        return response
+    return wrapper
+
+
+class ConditionalGetMixin:
+    """
+    Viewset mixin adding conditional GET to ``list`` and ``retrieve``.
+    Subclasses implement ``get_validators`` returning ``(etag, last_modified)``
+    where ``last_modified`` is a Unix timestamp; either may be None.
+    """
+    # Let caches store responses but always revalidate them
+    conditional_cache_control = {'no_cache': True}
+
+    def get_validators(self, request):
+        raise NotImplementedError
+
+    @conditional_get
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @conditional_get
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+class CatalogConditionalMixin(ConditionalGetMixin):
+    """
+    Validators for catalog endpoints taken from the catalog version counter,
+    so revalidation costs no database queries.
+    """
+    def get_validators(self, request):
+        etag = make_etag('catalog', get_catalog_version(), request_fingerprint(request, self))
+        return etag, get_catalog_modified()
@@ -0,0 +1,24 @@
+import time
+
+from django.db import transaction
+
+
+def delete_in_chunks(queryset, chunk_size, pause=0):
+    """
+    Delete ``queryset`` a chunk of primary keys at a time, each chunk in its
+    own short transaction so writers are never blocked for long. Each chunk
+    is deleted through ``queryset`` again, so a row that stopped matching
+    after its id was picked is kept. Returns ``(rows, chunks)``; ``rows``
+    counts cascaded rows too.
+    """
+    rows = chunks = 0
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return rows, chunks
+        with transaction.atomic():
+            deleted, _ = queryset.filter(pk__in=ids).delete()
+        rows += deleted
+        chunks += 1
+        if pause:
+            time.sleep(pause)
@@ -0,0 +1,183 @@
+import csv
+import itertools
+import json
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import ArchivedOrder, ArchivedOrderItem, ContactSubmission, Order, OrderItem, Product
+
+CHUNK_SIZE = 2000
+
+
+class ExportError(ValueError):
+    pass
+
+
+class Dataset:
+    """
+    A flat export of one table, followed by its archive table if it has
+    one. Rows are read with ``values_list().iterator()``
+    so neither model instances nor the full result set are held in memory.
+    """
+    model = None
+    archive_model = None  # read after ``model`` when rows are also archived
+    columns = ()  # (header, ORM path) pairs
+    status_field = None
+
+    def get_querysets(self):
+        return [model.objects.all() for model in (self.model, self.archive_model) if model is not None]
+
+    def rows(self, since=None, until=None, statuses=None, chunk_size=CHUNK_SIZE):
+        if statuses and self.status_field is None:
+            raise ExportError(f'{self.name} cannot be filtered by status')
+        paths = [path for _, path in self.columns]
+        querysets = [self.filter(queryset, since, until, statuses) for queryset in self.get_querysets()]
+        return itertools.chain.from_iterable(
+            queryset.values_list(*paths).iterator(chunk_size=chunk_size) for queryset in querysets
+        )
+
+    def filter(self, queryset, since, until, statuses):
+        queryset = queryset.order_by('pk')
+        if since is not None:
+            queryset = queryset.filter(**{f'{self.date_field}__gte': since})
+        if until is not None:
+            queryset = queryset.filter(**{f'{self.date_field}__lt': until})
+        if statuses:
+            queryset = queryset.filter(**{f'{self.status_field}__in': statuses})
+        return queryset
+
+    @property
+    def headers(self):
+        return [header for header, _ in self.columns]
+
+
+class ProductDataset(Dataset):
+    name = 'products'
+    model = Product
+    date_field = 'updated_at'
+    columns = (
+        ('id', 'id'), ('name', 'name'), ('category', 'category__name'),
+        ('price', 'price'), ('stock', 'stock'),
+        ('created_at', 'created_at'), ('updated_at', 'updated_at'),
+    )
+
+
+class OrderItemDataset(Dataset):
+    name = 'order-items'
+    model = OrderItem
+    archive_model = ArchivedOrderItem
+    date_field = 'order__created_at'
+    status_field = 'order__status'
+    columns = (
+        ('order_number', 'order__order_number'), ('order_date', 'order__created_at'),
+        ('status', 'order__status'), ('user_email', 'order__user_email'),
+        ('full_name', 'order__full_name'), ('phone', 'order__phone'),
+        ('address', 'order__address'), ('product_id', 'product_id'),
+        ('product_name', 'product_name'), ('product_price', 'product_price'),
+        ('quantity', 'quantity'), ('order_total', 'order__total_amount'),
+    )
+
+
+class OrderDataset(Dataset):
+    name = 'orders'
+    model = Order
+    archive_model = ArchivedOrder
+    date_field = 'created_at'
+    status_field = 'status'
+    columns = (
+        ('order_number', 'order_number'), ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'), ('status', 'status'),
+        ('payment_method', 'payment_method'), ('user_id', 'user_id'),
+        ('user_email', 'user_email'), ('full_name', 'full_name'),
+        ('phone', 'phone'), ('address', 'address'), ('total_amount', 'total_amount'),
+    )
+
+
+class ContactDataset(Dataset):
+    name = 'contacts'
+    model = ContactSubmission
+    date_field = 'created_at'
+    status_field = 'status'
+    columns = (
+        ('id', 'id'), ('created_at', 'created_at'), ('status', 'status'),
+        ('subject', 'subject'), ('name', 'name'), ('email', 'email'),
+        ('phone', 'phone'), ('message', 'message'), ('admin_notes', 'admin_notes'),
+    )
+
+
+DATASETS = {dataset.name: dataset for dataset in (
+    ProductDataset(), OrderDataset(), OrderItemDataset(), ContactDataset(),
+)}
+
+
+def parse_bound(value, name, end=False):
+    """
+    Accept a date or datetime. A bare ``until`` date includes that whole day.
+    """
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+        parsed = datetime.combine(day, time.min) if day else parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ExportError(f'{name} must be an ISO date or datetime')
+    if day and end:
+        parsed += timedelta(days=1)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(headers, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(headers)
+    for row in rows:
+        yield writer.writerow([_plain(value) for value in row])
+
+
+def ndjson_lines(headers, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(headers, map(_plain, row))), separators=(',', ':')) + '\n'
+
+
+FORMATS = {
+    'csv': (csv_lines, 'text/csv'),
+    'ndjson': (ndjson_lines, 'application/x-ndjson'),
+}
+
+
+def export_lines(dataset_name, fmt, since=None, until=None, statuses=None):
+    """
+    Return ``(lines, content_type)`` for an export; ``lines`` is a lazy
+    iterator of encoded text lines. Raises ExportError on bad arguments.
+    """
+    dataset = DATASETS.get(dataset_name)
+    if dataset is None:
+        raise ExportError(f'Unknown dataset {dataset_name!r}; choose from {", ".join(DATASETS)}')
+    if fmt not in FORMATS:
+        raise ExportError(f'Unknown format {fmt!r}; choose from {", ".join(FORMATS)}')
+    render, content_type = FORMATS[fmt]
+    rows = dataset.rows(
+        since=parse_bound(since, 'since'),
+        until=parse_bound(until, 'until', end=True),
+        statuses=statuses,
+    )
+    return render(dataset.headers, rows), content_type
@@ -0,0 +1,150 @@
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Count, Q
+from rest_framework import serializers
+
+from .exports import ExportError, parse_bound
+from .models import Order
+
+
+def _parse_list(params, name):
+    # Accept both ?category=1&category=2 and ?category=1,2
+    values = []
+    for raw in params.getlist(name):
+        values.extend(part.strip() for part in raw.split(',') if part.strip())
+    return values
+
+
+class ProductFilter:
+    """
+    Server-side product filters and their facet counts.
+
+    Supported params: ``category`` (one or more ids), ``min_price``,
+    ``max_price`` and ``in_stock``. Facets are disjunctive: each facet is
+    counted with every filter applied except its own, so the UI can show
+    how many products selecting another option would return.
+    """
+    def __init__(self, params):
+        self.categories = self._parse_ids(_parse_list(params, 'category'))
+        self.min_price = self._parse_price(params.get('min_price'), 'min_price')
+        self.max_price = self._parse_price(params.get('max_price'), 'max_price')
+        self.in_stock = params.get('in_stock', '').lower() in ('1', 'true', 'yes')
+        self.price_buckets = getattr(settings, 'CATALOG_PRICE_BUCKETS', (100, 500, 1000, 5000))
+
+    @staticmethod
+    def _parse_ids(values):
+        try:
+            return [int(value) for value in values]
+        except ValueError:
+            raise serializers.ValidationError({'category': 'Category ids must be integers.'})
+
+    @staticmethod
+    def _parse_price(value, name):
+        if not value:
+            return None
+        try:
+            price = Decimal(value)
+        except InvalidOperation:
+            raise serializers.ValidationError({name: 'A valid number is required.'})
+        if not price.is_finite():
+            raise serializers.ValidationError({name: 'A valid number is required.'})
+        return price
+
+    def category_q(self):
+        return Q(category__in=self.categories) if self.categories else Q()
+
+    def price_q(self):
+        q = Q()
+        if self.min_price is not None:
+            q &= Q(price__gte=self.min_price)
+        if self.max_price is not None:
+            q &= Q(price__lte=self.max_price)
+        return q
+
+    def stock_q(self):
+        return Q(stock__gt=0) if self.in_stock else Q()
+
+    def filter(self, queryset):
+        return queryset.filter(self.category_q() & self.price_q() & self.stock_q())
+
+    def bucket_ranges(self):
+        bounds = [None, *self.price_buckets, None]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def facets(self, queryset):
+        """
+        Category, price bucket and in-stock counts from one GROUP BY category
+        query over ``queryset`` (which must not have these filters applied).
+        """
+        price_q, stock_q = self.price_q(), self.stock_q()
+        ranges = self.bucket_ranges()
+        aggregates = {
+            'matching': Count('id', filter=price_q & stock_q or None),
+            'in_stock': Count('id', filter=Q(stock__gt=0) & price_q),
+        }
+        for index, (low, high) in enumerate(ranges):
+            bucket_q = Q()
+            if low is not None:
+                bucket_q &= Q(price__gte=low)
+            if high is not None:
+                bucket_q &= Q(price__lt=high)
+            aggregates[f'bucket_{index}'] = Count('id', filter=bucket_q & stock_q or None)
+
+        rows = (
+            queryset.order_by()
+            .values('category_id', 'category__name')
+            .annotate(**aggregates)
+            .order_by('category__name')
+        )
+
+        categories, in_stock, buckets = [], 0, [0] * len(ranges)
+        for row in rows:
+            categories.append({
+                'id': row['category_id'],
+                'name': row['category__name'],
+                'count': row['matching'],
+                'selected': row['category_id'] in self.categories,
+            })
+            # Price and stock facets only count the selected categories
+            if self.categories and row['category_id'] not in self.categories:
+                continue
+            in_stock += row['in_stock']
+            for index in range(len(ranges)):
+                buckets[index] += row[f'bucket_{index}']
+
+        return {
+            'categories': categories,
+            'price': [
+                {'min': low, 'max': high, 'count': count}
+                for (low, high), count in zip(ranges, buckets)
+            ],
+            'in_stock': in_stock,
+        }
+
+
+class OrderFilter:
+    """
+    Order history filters: ``status`` (one or more) and a ``since``/``until``
+    range on created_at, where a bare ``until`` date includes that day.
+    """
+    def __init__(self, params):
+        valid = {choice for choice, _ in Order.STATUS_CHOICES}
+        self.statuses = _parse_list(params, 'status')
+        unknown = [value for value in self.statuses if value not in valid]
+        if unknown:
+            raise serializers.ValidationError({'status': f'Unknown status {unknown[0]!r}.'})
+        try:
+            self.since = parse_bound(params.get('since'), 'since')
+            self.until = parse_bound(params.get('until'), 'until', end=True)
+        except ExportError as e:
+            raise serializers.ValidationError({'date': str(e)})
+
+    def filter(self, queryset):
+        if self.statuses:
+            queryset = queryset.filter(status__in=self.statuses)
+        if self.since is not None:
+            queryset = queryset.filter(created_at__gte=self.since)
+        if self.until is not None:
+            queryset = queryset.filter(created_at__lt=self.until)
+        return queryset
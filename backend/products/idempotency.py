@@ -0,0 +1,127 @@
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .db import delete_in_chunks
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+POLL_INTERVAL = 0.05
+
+
+def key_ttl():
+    return timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+
+def request_scope(request):
+    """Keys are per user, or per session for anonymous carts."""
+    user_id = request.query_params.get('user_id') or request.data.get('user_id')
+    if user_id:
+        return f'user:{user_id}'
+    if request.session.session_key is None:
+        request.session.save()
+    return f'session:{request.session.session_key}'
+
+
+def request_fingerprint(request):
+    data = request.data
+    if hasattr(data, 'lists'):
+        data = dict(data.lists())
+    body = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method}|{request.path}|{body}'.encode('utf-8')).hexdigest()
+
+
+def _claim(scope, key, fingerprint):
+    """
+    Insert the in-flight row for ``key``. Returns ``(row, True)`` when this
+    request now owns the key, or ``(existing row, False)``.
+    """
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                scope=scope, key=key, fingerprint=fingerprint,
+                created_at=now, expires_at=now + key_ttl(),
+            ), True
+    except IntegrityError:
+        return IdempotencyKey.objects.filter(scope=scope, key=key).first(), False
+
+
+def replay(row):
+    return Response(row.response_body, status=row.status_code, headers={'Idempotent-Replayed': 'true'})
+
+
+def idempotent(view_method):
+    """
+    Make a write action safe to retry with an ``Idempotency-Key`` header.
+    The first request with a key claims it by inserting a row, runs, and
+    stores its status and body; later requests with the same key get that
+    response back without running the action. A duplicate that arrives
+    while the first is still running polls for up to
+    IDEMPOTENCY_WAIT_SECONDS and then answers 409. Reusing a key with a
+    different body is a 422. Server errors release the key for a retry.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({'error': f'{HEADER} is too long'}, status=status.HTTP_400_BAD_REQUEST)
+
+        scope, fingerprint = request_scope(request), request_fingerprint(request)
+        deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT_SECONDS', 10)
+        while True:
+            row, claimed = _claim(scope, key, fingerprint)
+            if claimed:
+                break
+            if row is None:
+                continue  # purged or released since our insert failed
+            now = timezone.now()
+            stale = now - timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_SECONDS', 60))
+            if row.expires_at <= now or (row.status_code is None and row.created_at <= stale):
+                # Expired, or its request died without releasing it; take over
+                IdempotencyKey.objects.filter(pk=row.pk, created_at=row.created_at).delete()
+                continue
+            if row.fingerprint != fingerprint:
+                return Response(
+                    {'error': f'{HEADER} was already used for a different request'},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if row.status_code is not None:
+                return replay(row)
+            if time.monotonic() >= deadline:
+                return Response(
+                    {'error': f'A request with this {HEADER} is still in progress'},
+                    status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'},
+                )
+            time.sleep(POLL_INTERVAL)
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except Exception:
+            row.delete()
+            raise
+        if response.status_code >= 500:
+            row.delete()
+        else:
+            IdempotencyKey.objects.filter(pk=row.pk).update(
+                status_code=response.status_code, response_body=response.data,
+            )
+        return response
+    return wrapper
+
+
+def purge_expired_keys(chunk_size=None, pause=0):
+    """Delete stored keys past their TTL in chunks. Returns ``(rows, chunks)``."""
+    chunk_size = chunk_size or getattr(settings, 'CART_PURGE_CHUNK_SIZE', 500)
+    expired = IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+    return delete_in_chunks(expired, chunk_size, pause)
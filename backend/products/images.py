@@ -0,0 +1,150 @@
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection, transaction
+from PIL import Image, ImageOps
+
+from .cache import bump_catalog_version
+
+logger = logging.getLogger(__name__)
+
+DERIVED_PREFIX = 'products/derived'
+
+# Pillow format name, file extension and save options per output format
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_widths():
+    return tuple(sorted(getattr(settings, 'PRODUCT_IMAGE_WIDTHS', (320, 640, 1280))))
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'PRODUCT_IMAGE_WORKERS', 2),
+                thread_name_prefix='image-derivatives',
+            )
+        return _executor
+
+
+def derivative_path(digest, width, fmt):
+    return f'{DERIVED_PREFIX}/{digest[:2]}/{digest}/{width}.{FORMATS[fmt][1]}'
+
+
+def needs_derivatives(instance):
+    return bool(instance.image) and instance.image_variants.get('source') != instance.image.name
+
+
+def _render(image, width, fmt):
+    pil_format, _, options = FORMATS[fmt]
+    if image.width > width:
+        height = round(image.height * width / image.width)
+        image = image.resize((width, height), Image.LANCZOS)
+    if fmt == 'jpeg' and image.mode != 'RGB':
+        # JPEG has no alpha channel; flatten transparent PNGs onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.split()[-1])
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def generate_derivatives(model, pk, force=False):
+    """
+    Write resized WebP and JPEG copies of ``model(pk).image`` and record them
+    in ``image_variants``. Files are named after the source's SHA-256, so
+    re-running, or uploading the same picture twice, reuses existing files.
+    Returns the number of files written.
+    """
+    instance = model.objects.filter(pk=pk).only('image', 'image_variants').first()
+    if instance is None or not instance.image:
+        return 0
+    if not force and not needs_derivatives(instance):
+        return 0
+
+    source = instance.image.name
+    with default_storage.open(source, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+
+    written = 0
+    variants = {fmt: {} for fmt in FORMATS}
+    with Image.open(BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        # Never upscale; a source narrower than every width gets one variant
+        widths = [w for w in get_widths() if w < image.width] or [image.width]
+        for width in widths:
+            for fmt in FORMATS:
+                path = derivative_path(digest, width, fmt)
+                exists = default_storage.exists(path)
+                if exists and force:
+                    default_storage.delete(path)
+                    exists = False
+                if not exists:
+                    default_storage.save(path, ContentFile(_render(image, width, fmt)))
+                    written += 1
+                variants[fmt][str(width)] = path
+        record = {'source': source, 'hash': digest, 'width': image.width, **variants}
+
+    # Only record against the file we processed; a newer upload wins
+    updated = model.objects.filter(pk=pk, image=source).update(image_variants=record)
+    if updated:
+        bump_catalog_version()
+    return written
+
+
+def _run(model, pk):
+    close_old_connections()
+    try:
+        generate_derivatives(model, pk)
+    except Exception:
+        logger.exception('Image derivatives failed for %s %s', model.__name__, pk)
+    finally:
+        connection.close()
+
+
+def schedule_derivatives(instance):
+    """
+    Queue derivative generation for ``instance`` once the current
+    transaction commits, on the worker pool rather than the request thread.
+    """
+    if not needs_derivatives(instance):
+        return
+    model, pk = type(instance), instance.pk
+    if getattr(settings, 'PRODUCT_IMAGE_DERIVATIVES_SYNC', False):
+        transaction.on_commit(lambda: generate_derivatives(model, pk))
+    else:
+        transaction.on_commit(lambda: get_executor().submit(_run, model, pk))
+
+
+def variant_urls(variants):
+    """
+    Public form of ``image_variants``: per-format width->URL maps and
+    ready-made ``srcset`` strings.
+    """
+    if not variants or 'hash' not in variants:
+        return None
+    data = {'width': variants['width'], 'srcset': {}}
+    for fmt in FORMATS:
+        urls = {width: default_storage.url(path) for width, path in variants.get(fmt, {}).items()}
+        data[fmt] = urls
+        data['srcset'][fmt] = ', '.join(
+            f'{url} {width}w' for width, url in sorted(urls.items(), key=lambda item: int(item[0]))
+        )
+    return data
@@ -0,0 +1,247 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from django.utils import timezone
+
+from .models import Product, StockReservation
+
+
+class InsufficientStock(Exception):
+    """Raised with one entry per cart line that cannot be fulfilled."""
+    def __init__(self, lines):
+        super().__init__('Insufficient stock')
+        self.lines = lines
+
+
+def hold_ttl():
+    return timedelta(minutes=getattr(settings, 'STOCK_HOLD_MINUTES', 15))
+
+
+def _take(product_id, delta):
+    """Add ``delta`` to Product.reserved if that keeps it within stock."""
+    return Product.objects.filter(pk=product_id, stock__gte=F('reserved') + delta).update(
+        reserved=F('reserved') + delta,
+    )
+
+
+def hold(holder, product_id, quantity, add=False):
+    """
+    Hold ``quantity`` units of a product for ``holder`` until the TTL runs
+    out (``add`` adds to the current hold instead). Taking more stock is one
+    conditional UPDATE on the product row, so concurrent holders of the same
+    product queue on that row and can never reserve more than is in stock.
+    Raises InsufficientStock when the units are not available; 0 releases.
+    """
+    with transaction.atomic():
+        current = (
+            StockReservation.objects.select_for_update()
+            .filter(holder=holder, product_id=product_id)
+            .first()
+        )
+        held = current.quantity if current else 0
+        target = held + quantity if add else quantity
+        delta = target - held
+        if delta > 0 and not _take(product_id, delta):
+            # Free other holders' lapsed units of this product, then retry
+            release_expired(product_ids=[product_id], exclude_holder=holder)
+            if not _take(product_id, delta):
+                product = Product.objects.filter(pk=product_id).values('name', 'stock', 'reserved').first()
+                available = product['stock'] - product['reserved'] + held if product else 0
+                raise InsufficientStock([{
+                    'product_id': product_id,
+                    'product_name': product['name'] if product else None,
+                    'requested': target,
+                    'available': max(available, 0),
+                }])
+        elif delta < 0:
+            Product.objects.filter(pk=product_id).update(reserved=F('reserved') + delta)
+
+        if target == 0:
+            if current:
+                current.delete()
+        elif current:
+            current.quantity = target
+            current.expires_at = timezone.now() + hold_ttl()
+            current.save(update_fields=['quantity', 'expires_at'])
+        else:
+            StockReservation.objects.create(
+                holder=holder, product_id=product_id, quantity=target,
+                expires_at=timezone.now() + hold_ttl(),
+            )
+    return target
+
+
+def hold_many(holder, targets):
+    """
+    Set ``holder``'s holds to ``targets`` (``{product_id: quantity}``) in a
+    fixed number of queries: the product rows are read once, every change
+    is one guarded UPDATE and the reservations are upserted in bulk. Products
+    without enough stock keep their current hold. Returns
+    ``(held, short)``: the quantities now held and InsufficientStock lines.
+    """
+    if not targets:
+        return {}, []
+    try:
+        return _hold_many(holder, targets)
+    except _Raced:
+        return _hold_each(holder, targets)
+
+
+class _Raced(Exception):
+    pass
+
+
+def _hold_many(holder, targets):
+    with transaction.atomic():
+        current = dict(
+            StockReservation.objects.select_for_update()
+            .filter(holder=holder, product_id__in=targets)
+            .values_list('product_id', 'quantity')
+        )
+        products = {
+            pk: (name, stock - reserved)
+            for pk, name, stock, reserved in Product.objects.select_for_update()
+            .filter(pk__in=targets).order_by('pk').values_list('pk', 'name', 'stock', 'reserved')
+        }
+        if any(targets[pk] - current.get(pk, 0) > free for pk, (_, free) in products.items()):
+            release_expired(product_ids=list(products), exclude_holder=holder)
+            products = {
+                pk: (name, stock - reserved)
+                for pk, name, stock, reserved in Product.objects
+                .filter(pk__in=targets).values_list('pk', 'name', 'stock', 'reserved')
+            }
+
+        deltas, short = {}, []
+        for pk, target in targets.items():
+            held = current.get(pk, 0)
+            if pk not in products:
+                continue
+            name, free = products[pk]
+            if target - held > free:
+                short.append({'product_id': pk, 'product_name': name, 'requested': target,
+                              'available': max(free + held, 0)})
+            elif target != held:
+                deltas[pk] = target - held
+        if deltas:
+            delta = Case(*[When(pk=pk, then=Value(d)) for pk, d in deltas.items()], output_field=IntegerField())
+            growing = [pk for pk, d in deltas.items() if d > 0]
+            updated = Product.objects.filter(pk__in=deltas).filter(
+                Q(stock__gte=F('reserved') + delta) | ~Q(pk__in=growing)
+            ).update(reserved=F('reserved') + delta)
+            if updated != len(deltas):
+                # Stock changed under us (SQLite cannot lock the rows read
+                # above); roll back and take the products one at a time
+                raise _Raced
+
+        now = timezone.now()
+        held = {pk: current.get(pk, 0) + deltas.get(pk, 0) for pk in targets if pk in products}
+        StockReservation.objects.filter(holder=holder, product_id__in=[pk for pk, q in held.items() if not q]).delete()
+        kept = [
+            StockReservation(holder=holder, product_id=pk, quantity=q, expires_at=now + hold_ttl())
+            for pk, q in held.items() if q
+        ]
+        if kept:
+            StockReservation.objects.bulk_create(
+                kept, update_conflicts=True,
+                unique_fields=['holder', 'product'], update_fields=['quantity', 'expires_at'],
+            )
+    return {pk: q for pk, q in held.items() if q}, short
+
+
+def _hold_each(holder, targets):
+    held, short = {}, []
+    for pk, target in targets.items():
+        try:
+            held[pk] = hold(holder, pk, target)
+        except InsufficientStock as e:
+            short.extend(e.lines)
+    return {pk: q for pk, q in held.items() if q}, short
+
+
+def release(holder, product_ids=None):
+    """Drop ``holder``'s holds (optionally only for ``product_ids``)."""
+    with transaction.atomic():
+        holds = StockReservation.objects.select_for_update().filter(holder=holder)
+        if product_ids is not None:
+            holds = holds.filter(product_id__in=product_ids)
+        return _release(holds)
+
+
+def _release(holds):
+    """Delete ``holds`` (already locked) and take them off Product.reserved."""
+    rows = list(holds.values_list('pk', 'product_id', 'quantity'))
+    if not rows:
+        return 0
+    per_product = {}
+    for _, product_id, quantity in rows:
+        per_product[product_id] = per_product.get(product_id, 0) + quantity
+    # Same product order as checkout, so the two never deadlock
+    for product_id in sorted(per_product):
+        Product.objects.filter(pk=product_id).update(reserved=F('reserved') - per_product[product_id])
+    StockReservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+    return len(rows)
+
+
+def held_by(holder):
+    """``{product_id: quantity}`` currently held by ``holder``."""
+    return dict(StockReservation.objects.filter(holder=holder).values_list('product_id', 'quantity'))
+
+
+def consume(holder, product_ids):
+    """
+    Forget ``holder``'s holds on ``product_ids`` once checkout has moved them
+    out of stock and Product.reserved itself; release any others.
+    """
+    StockReservation.objects.filter(holder=holder, product_id__in=product_ids).delete()
+    release(holder)
+
+
+def release_expired(now=None, product_ids=None, exclude_holder=None, chunk_size=500):
+    """
+    The sweeper: release holds past their expiry, ``chunk_size`` at a time,
+    each chunk in its own short transaction. Returns the number released.
+    """
+    now = now or timezone.now()
+    released = 0
+    while True:
+        with transaction.atomic():
+            expired = StockReservation.objects.select_for_update().filter(expires_at__lte=now)
+            if product_ids is not None:
+                expired = expired.filter(product_id__in=product_ids)
+            if exclude_holder is not None:
+                expired = expired.exclude(holder=exclude_holder)
+            ids = list(expired.order_by('expires_at').values_list('pk', flat=True)[:chunk_size])
+            count = _release(StockReservation.objects.filter(pk__in=ids)) if ids else 0
+        released += count
+        if count < chunk_size:
+            return released
+
+
+def recount_reserved():
+    """
+    Rebuild Product.reserved from the reservation rows, repairing any drift.
+    Returns the number of products corrected.
+    """
+    fixed = 0
+    with transaction.atomic():
+        sums = dict(
+            StockReservation.objects.values('product_id').annotate(total=Sum('quantity'))
+            .values_list('product_id', 'total')
+        )
+        stale = Product.objects.exclude(reserved=0).exclude(pk__in=sums).update(reserved=0)
+        fixed += stale
+        for product_id, reserved in Product.objects.filter(pk__in=sums).values_list('pk', 'reserved'):
+            if reserved != sums[product_id]:
+                Product.objects.filter(pk=product_id).update(reserved=sums[product_id])
+                fixed += 1
+    return fixed
+
+
+def availability(product_ids):
+    """``{product_id: {stock, reserved, available}}`` from the product rows alone."""
+    return {
+        pk: {'stock': stock, 'reserved': reserved, 'available': max(stock - reserved, 0)}
+        for pk, stock, reserved in Product.objects.filter(pk__in=product_ids).values_list('pk', 'stock', 'reserved')
+    }
@@ -0,0 +1,230 @@
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import OperationalError, close_old_connections, connection, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name, max_attempts=None):
+    """Register the decorated function as the job task ``name``."""
+    def register(func):
+        TASKS[name] = (func, max_attempts)
+        return func
+    return register
+
+
+def enqueue(name, run_at=None, **payload):
+    """
+    Queue task ``name`` to be called with ``payload`` as keyword arguments.
+    The row is written in the caller's transaction, so a job queued during
+    checkout exists only if the order does, and no worker sees it earlier.
+    """
+    if name not in TASKS:
+        raise KeyError(f'Unknown task {name!r}')
+    max_attempts = TASKS[name][1] or getattr(settings, 'JOB_MAX_ATTEMPTS', 5)
+    return Job.objects.create(task=name, payload=payload, run_at=run_at or timezone.now(), max_attempts=max_attempts)
+
+
+def backoff(attempts):
+    """Delay before retry number ``attempts``: exponential, capped, with jitter."""
+    base = getattr(settings, 'JOB_RETRY_BASE_SECONDS', 10)
+    delay = min(base * 2 ** (attempts - 1), getattr(settings, 'JOB_RETRY_MAX_SECONDS', 3600))
+    # Jitter keeps a batch that failed together from retrying together
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim(worker, limit=1):
+    """
+    Claim up to ``limit`` due jobs for ``worker`` and return them, oldest
+    first. Where the database supports it the candidates are read with
+    ``FOR UPDATE SKIP LOCKED`` so workers pass over each other's rows
+    instead of queueing on them. The claim itself is a conditional UPDATE
+    (still queued) tagged with a fresh token, so on SQLite, which has no
+    row locks, two workers racing for a job cannot both get it.
+    """
+    token = f'{worker[:80]}:{uuid.uuid4().hex[:12]}'
+    now = timezone.now()
+    with transaction.atomic():
+        due = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).order_by('run_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.values_list('pk', flat=True)[:limit])
+        if not ids:
+            return []
+        Job.objects.filter(pk__in=ids, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_by=token, locked_at=now, attempts=F('attempts') + 1,
+        )
+        # Read back in the same transaction: if anything fails the claim rolls back
+        return list(Job.objects.filter(locked_by=token, status=Job.RUNNING).order_by('run_at', 'id'))
+
+
+def run(job):
+    """Run a claimed job and record the outcome. Returns the job's new status."""
+    registered = TASKS.get(job.task)
+    try:
+        if registered is None:
+            raise LookupError(f'No task registered as {job.task!r}')
+        registered[0](**job.payload)
+    except Exception:
+        now = timezone.now()
+        error = traceback.format_exc()
+        if registered is None or job.attempts >= job.max_attempts:
+            logger.error('Job %s (%s) dead after %s attempts', job.pk, job.task, job.attempts)
+            _finish(job, status=Job.DEAD, last_error=error, finished_at=now)
+            return Job.DEAD
+        logger.warning('Job %s (%s) failed, attempt %s of %s', job.pk, job.task, job.attempts, job.max_attempts)
+        _finish(job, status=Job.QUEUED, last_error=error, run_at=now + backoff(job.attempts))
+        return Job.QUEUED
+    _finish(job, status=Job.DONE, finished_at=timezone.now())
+    return Job.DONE
+
+
+def _finish(job, **changes):
+    # Only the claimant may record the outcome; a job requeued as stale
+    # and claimed again belongs to the new worker.
+    for attempt in range(5):
+        try:
+            Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(locked_by='', locked_at=None, **changes)
+            return
+        except OperationalError:
+            # SQLite reports a busy database instead of waiting
+            if attempt == 4:
+                raise
+            time.sleep(0.05 * (attempt + 1))
+
+
+def requeue_stale(now=None):
+    """
+    Give jobs whose worker died mid-run (claimed more than JOB_LOCK_TIMEOUT
+    seconds ago) back to the queue, or dead-letter them if out of attempts.
+    """
+    now = now or timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        locked_at__lt=now - timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 300)),
+    )
+    dead = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.DEAD, locked_by='', locked_at=None, finished_at=now, last_error='Worker lost',
+    )
+    return dead + stale.update(status=Job.QUEUED, locked_by='', locked_at=None, run_at=now)
+
+
+def retry(jobs):
+    """Put dead jobs back in the queue with a fresh set of attempts."""
+    return jobs.filter(status=Job.DEAD).update(
+        status=Job.QUEUED, attempts=0, run_at=timezone.now(), finished_at=None,
+    )
+
+
+def queue_stats():
+    """Job counts per status and the age in seconds of the oldest due job."""
+    counts = dict(Job.objects.order_by().values_list('status').annotate(count=Count('id')))
+    oldest = Job.objects.filter(status=Job.QUEUED, run_at__lte=timezone.now()).aggregate(oldest=Min('run_at'))['oldest']
+    return {
+        **{status: counts.get(status, 0) for status, _ in Job.STATUS_CHOICES},
+        'lag': (timezone.now() - oldest).total_seconds() if oldest else 0,
+    }
+
+
+def drain(worker='inline', batch=10):
+    """Run due jobs in the calling thread until none is left; returns counts by outcome."""
+    outcomes = {Job.DONE: 0, Job.QUEUED: 0, Job.DEAD: 0}
+    while True:
+        jobs = claim(worker, batch)
+        if not jobs:
+            return outcomes
+        for job in jobs:
+            outcomes[run(job)] += 1
+
+
+class WorkerPool:
+    """
+    Threads that claim and run jobs until stopped. With ``burst`` each
+    thread exits once the queue has nothing due; ``max_jobs`` stops the pool
+    after that many jobs. ``stats`` holds throughput counters.
+    """
+    def __init__(self, threads=2, batch=10, poll=1.0, burst=False, max_jobs=None):
+        self.threads, self.batch, self.poll = threads, batch, poll
+        self.burst, self.max_jobs = burst, max_jobs
+        self.name = f'{socket.gethostname()}:{os.getpid()}'
+        self.stop = threading.Event()
+        self.lock = threading.Lock()
+        self.stats = {Job.DONE: 0, Job.QUEUED: 0, Job.DEAD: 0, 'claims': 0, 'busy': 0}
+        self.started = None
+
+    @property
+    def processed(self):
+        return self.stats[Job.DONE] + self.stats[Job.QUEUED] + self.stats[Job.DEAD]
+
+    def elapsed(self):
+        return time.monotonic() - self.started if self.started else 0
+
+    def start(self):
+        requeue_stale()
+        self.started = time.monotonic()
+        self.pool = [
+            threading.Thread(target=self.work, args=(f'{self.name}:{index}',), daemon=True)
+            for index in range(self.threads)
+        ]
+        for thread in self.pool:
+            thread.start()
+
+    def join(self, timeout=None):
+        """Wait up to ``timeout`` seconds in all; True once every thread exited."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self.pool:
+            thread.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+        return not any(thread.is_alive() for thread in self.pool)
+
+    def run(self):
+        self.start()
+        self.join()
+        return self.stats
+
+    def work(self, worker):
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                try:
+                    jobs = claim(worker, self.batch)
+                except OperationalError:
+                    with self.lock:
+                        self.stats['busy'] += 1
+                    time.sleep(random.uniform(0.01, 0.05))
+                    continue
+                with self.lock:
+                    self.stats['claims'] += 1
+                if not jobs:
+                    if self.burst:
+                        return
+                    requeue_stale()
+                    self.stop.wait(self.poll)
+                    continue
+                for job in jobs:
+                    try:
+                        status = run(job)
+                    except OperationalError:
+                        # The outcome was not recorded; the job is requeued once its lock times out
+                        logger.exception('Could not record the outcome of job %s', job.pk)
+                        continue
+                    with self.lock:
+                        self.stats[status] += 1
+                        if self.max_jobs and self.processed >= self.max_jobs:
+                            self.stop.set()
+        finally:
+            connection.close()
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.archive import ARCHIVE_STATUSES, archive_orders
+
+
+class Command(BaseCommand):
+    help = (
+        f'Move {" and ".join(ARCHIVE_STATUSES)} orders not updated for ORDER_ARCHIVE_AFTER_DAYS '
+        'into the archive tables, a chunk of orders per transaction. Order history, '
+        'exports, the admin and the sales rollups keep reading them there.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int,
+                            help='Archive orders untouched this many days; default ORDER_ARCHIVE_AFTER_DAYS')
+        parser.add_argument('--chunk-size', type=int, help='Orders moved per transaction')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to sleep between chunks to spread the load')
+
+    def handle(self, *args, **options):
+        days = options['older_than_days']
+        if days is not None and days < 0:
+            raise CommandError('--older-than-days cannot be negative')
+        stats = archive_orders(
+            age=timedelta(days=days) if days is not None else None,
+            chunk_size=options['chunk_size'], pause=options['pause'],
+        )
+        elapsed = stats['elapsed']
+        rows = stats['orders'] + stats['items']
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {stats["orders"]} orders and {stats["items"]} items in {stats["chunks"]} chunks, '
+            f'{elapsed:.2f}s ({rate:,.0f} rows/sec)'
+        ))
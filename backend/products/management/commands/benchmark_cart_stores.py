@@ -0,0 +1,94 @@
+import random
+import re
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from products.cart_storage import CacheCartStore
+from products.models import Product
+
+STORES = {
+    'orm': 'products.cart_storage.ORMCartStore',
+    'cache': 'products.cart_storage.CacheCartStore',
+}
+WRITE = re.compile(r'\s*(?:INSERT INTO|UPDATE|DELETE FROM)\s+"(\w+)"', re.IGNORECASE)
+# Stock holds are kept in the database by every store
+HOLD_TABLES = ('products_stockreservation', 'products_product')
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Replay anonymous browsing sessions (add to cart, change a quantity, view '
+        'the cart) against each cart store and compare database queries, writes '
+        '(split into cart and stock hold writes) and throughput. Runs inside a '
+        'transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=50)
+        parser.add_argument('--adds', type=int, default=5, help='Items added per session')
+        parser.add_argument('--stores', nargs='+', choices=STORES, default=list(STORES))
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        product_ids = list(Product.objects.values_list('pk', flat=True)[:200])
+        if not product_ids:
+            raise CommandError('The benchmark needs at least one product')
+        results = {}
+        for name in options['stores']:
+            results[name] = self.run(STORES[name], product_ids, options)
+
+        self.stdout.write(f'{"store":<8}{"requests":>10}{"queries":>10}{"writes":>10}{"cart":>8}'
+                          f'{"holds":>8}{"writes/req":>12}{"req/s":>10}')
+        for name, row in results.items():
+            self.stdout.write(
+                f'{name:<8}{row["requests"]:>10}{row["queries"]:>10}{row["writes"]:>10}'
+                f'{row["writes"] - row["hold_writes"]:>8}{row["hold_writes"]:>8}'
+                f'{row["writes"] / row["requests"]:>12.2f}{row["requests"] / row["elapsed"]:>10,.0f}'
+            )
+
+    def run(self, store, product_ids, options):
+        rng = random.Random(options['seed'])
+        row = {'requests': 0}
+        session_ids = []
+        with override_settings(CART_STORE=store, ALLOWED_HOSTS=['testserver']):
+            try:
+                with transaction.atomic():
+                    # Adds hold stock; make sure every sampled product has enough
+                    Product.objects.filter(pk__in=product_ids).update(stock=F('reserved') + 10_000)
+                    with CaptureQueriesContext(connection) as queries:
+                        started = time.monotonic()
+                        for _ in range(options['sessions']):
+                            client = Client()
+                            for product_id in rng.sample(product_ids, min(options['adds'], len(product_ids))):
+                                self.post(client, 'add_item', {'product_id': product_id, 'quantity': 1})
+                                row['requests'] += 1
+                            item_id = client.get('/api/cart/').json()['items'][0]['id']
+                            self.post(client, 'update_item', {'item_id': item_id, 'quantity': 3})
+                            row['requests'] += 2
+                            session_ids.append(client.session['cart_id'])
+                        row['elapsed'] = time.monotonic() - started
+                        raise Rollback
+            except Rollback:
+                pass
+        row['queries'] = len(queries)
+        tables = [match.group(1) for match in map(WRITE.match, (q['sql'] for q in queries.captured_queries)) if match]
+        row['writes'] = len(tables)
+        row['hold_writes'] = sum(1 for table in tables if table in HOLD_TABLES)
+        # Cached anonymous carts outlive the rolled back transaction; drop them
+        cache.delete_many([CacheCartStore().cache_key(session_id) for session_id in session_ids])
+        return row
+
+    def post(self, client, action, data):
+        response = client.post(f'/api/cart/{action}/', data, content_type='application/json')
+        if response.status_code != 200:
+            raise CommandError(f'{action} failed with {response.status_code}: {response.content[:200]!r}')
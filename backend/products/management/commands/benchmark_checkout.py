@@ -0,0 +1,94 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from products.checkout import InsufficientStock, place_order
+from products.models import Cart, CartItem, Category, Job, Order, Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure checkout throughput on one high-demand product: concurrent '
+        'workers check out single-unit carts until stock runs out. A scratch '
+        'product, its carts, orders and their queued jobs are created and removed again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--carts', type=int, default=300)
+        parser.add_argument('--stock', type=int, default=200)
+        parser.add_argument('--threads', type=int, default=8)
+
+    def handle(self, *args, **options):
+        category = Category.objects.create(name='Checkout benchmark')
+        product = Product.objects.create(
+            name='Checkout benchmark SKU', price=Decimal('100.00'),
+            stock=options['stock'], category=category,
+        )
+        try:
+            stats = self.run(product, options)
+            product.refresh_from_db(fields=['stock'])
+        finally:
+            orders = list(Order.objects.filter(items__product=product).values_list('pk', flat=True))
+            Job.objects.filter(payload__order_id__in=orders).delete()
+            Order.objects.filter(pk__in=orders).delete()
+            Cart.objects.filter(session_id__startswith='checkout-benchmark-').delete()
+            product.delete()
+            category.delete()
+
+        elapsed = stats['elapsed']
+        self.stdout.write(self.style.SUCCESS(
+            f'{stats["ok"]} checkouts, {stats["short"]} refused for stock, {stats["retries"]} '
+            f'lock retries in {elapsed:.2f}s with {options["threads"]} threads: '
+            f'{stats["ok"] / elapsed:,.0f} checkouts/sec'
+        ))
+        self.stdout.write(f'Final stock {product.stock} (started at {options["stock"]})')
+
+    def run(self, product, options):
+        carts = []
+        for i in range(options['carts']):
+            cart = Cart.objects.create(session_id=f'checkout-benchmark-{i}', user_id=f'benchmark-{i}')
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+            carts.append(cart)
+
+        stats = {'ok': 0, 'short': 0, 'retries': 0}
+        lock = threading.Lock()
+        queue = iter(carts)
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        cart = next(queue, None)
+                    if cart is None:
+                        return
+                    outcome = self.checkout(cart)
+                    with lock:
+                        stats[outcome[0]] += 1
+                        stats['retries'] += outcome[1]
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats['elapsed'] = time.monotonic() - started
+        return stats
+
+    def checkout(self, cart):
+        retries = 0
+        while True:
+            try:
+                place_order(cart, {'user_id': cart.user_id, 'full_name': 'Benchmark', 'phone': '0', 'address': '-'})
+                return 'ok', retries
+            except InsufficientStock:
+                return 'short', retries
+            except OperationalError:
+                # SQLite allows one writer at a time
+                retries += 1
+                time.sleep(0.001)
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.exports import DATASETS, FORMATS, ExportError, export_lines
+
+
+class Command(BaseCommand):
+    help = 'Stream a dataset (products, orders, order-items, contacts) to CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(DATASETS))
+        parser.add_argument('--format', choices=list(FORMATS), default='csv')
+        parser.add_argument('--output', help='File to write (default: stdout)')
+        parser.add_argument('--since', help='Earliest date or datetime (inclusive)')
+        parser.add_argument('--until', help='Latest date (inclusive) or datetime (exclusive)')
+        parser.add_argument('--status', help='Comma separated statuses')
+
+    def handle(self, *args, **options):
+        statuses = [s.strip() for s in (options['status'] or '').split(',') if s.strip()]
+        try:
+            lines, _ = export_lines(
+                options['dataset'], options['format'],
+                since=options['since'], until=options['until'], statuses=statuses,
+            )
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        started = time.monotonic()
+        if options['output']:
+            with open(options['output'], 'w', newline='', encoding='utf-8') as out:
+                count = self.write_lines(lines, out.write)
+        else:
+            count = self.write_lines(lines, lambda line: self.stdout.write(line, ending=''))
+        elapsed = time.monotonic() - started
+        self.stderr.write(f'Exported {count} lines in {elapsed:.2f}s')
+
+    def write_lines(self, lines, write):
+        count = 0
+        for line in lines:
+            write(line)
+            count += 1
+        return count
@@ -0,0 +1,63 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from products.images import generate_derivatives
+from products.models import Product, ProductImage
+
+
+def _generate(model, pk, force):
+    try:
+        return generate_derivatives(model, pk, force=force)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Generate resized and WebP derivatives for existing product images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Regenerate derivatives even when already recorded')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Number of images processed in parallel')
+
+    def handle(self, *args, **options):
+        force = options['force']
+        jobs = []
+        for model in (Product, ProductImage):
+            images = model.objects.exclude(image='').exclude(image__isnull=True)
+            jobs.extend((model, pk) for pk in images.values_list('pk', flat=True).iterator())
+
+        started = time.monotonic()
+        written = failed = 0
+        for (model, pk), result in self.run_jobs(jobs, force, options['workers']):
+            if isinstance(result, Exception):
+                failed += 1
+                self.stderr.write(f'{model.__name__} {pk}: {result}')
+            else:
+                written += result
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {len(jobs)} images ({failed} failed), wrote {written} files in {elapsed:.2f}s'
+        ))
+
+    def run_jobs(self, jobs, force, workers):
+        if workers <= 1:
+            for model, pk in jobs:
+                try:
+                    yield (model, pk), generate_derivatives(model, pk, force=force)
+                except Exception as e:
+                    yield (model, pk), e
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_generate, model, pk, force): (model, pk) for model, pk in jobs}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as e:
+                    yield futures[future], e
@@ -0,0 +1,222 @@
+import csv
+import json
+import os
+import statistics
+import time
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from products.cache import bump_catalog_version
+from products.models import Category, Product
+from products.search import get_search_backend
+
+UPDATE_FIELDS = ('description', 'price', 'stock', 'category_id')
+# Product.price is max_digits=10, decimal_places=2
+MAX_PRICE = Decimal('99999999.99')
+
+
+class RowError(ValueError):
+    pass
+
+
+def read_rows(path, fmt):
+    """Yield ``(row, error)`` pairs from a CSV or JSONL file, one line at a time."""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if fmt == 'csv':
+            for row in csv.DictReader(f):
+                yield row, None
+        else:
+            for line_number, line in enumerate(f, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line), None
+                except json.JSONDecodeError as e:
+                    yield None, f'line {line_number}: invalid JSON ({e.msg})'
+
+
+def clean_row(row):
+    name = (row.get('name') or '').strip()
+    category = (row.get('category') or '').strip()
+    if not name:
+        raise RowError('name is required')
+    if not category:
+        raise RowError('category is required')
+    # Bad values are rejected here, as one row's error, rather than failing
+    # the save of the whole batch. NaN survives quantize(), so check it too.
+    try:
+        price = Decimal(str(row.get('price'))).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        raise RowError(f'invalid price {row.get("price")!r}')
+    if not price.is_finite() or not 0 <= price <= MAX_PRICE:
+        raise RowError(f'invalid price {row.get("price")!r}')
+    try:
+        stock = int(row.get('stock') or 0)
+    except (TypeError, ValueError):
+        raise RowError(f'invalid stock {row.get("stock")!r}')
+    if stock < 0:
+        raise RowError(f'invalid stock {row.get("stock")!r}')
+    return {
+        'name': name,
+        'description': (row.get('description') or '').strip(),
+        'price': price,
+        'stock': stock,
+        'category': category,
+    }
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Import products from a CSV or JSONL file with columns name, description, '
+        'price, stock and category (by name). Products are matched by name; new '
+        'ones are bulk created and changed ones bulk updated, one transaction per batch.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Input format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would change without writing')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist')
+        fmt = options['format'] or ('csv' if path.lower().endswith('.csv') else 'jsonl')
+        batch_size = max(1, options['batch_size'])
+        self.dry_run = options['dry_run']
+        self.verbosity = options['verbosity']
+
+        # Every category is resolved once up front; new names are added as met
+        self.categories = dict(Category.objects.values_list('name', 'id'))
+        self.totals = {'rows': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'errors': 0}
+        timings = []
+
+        started = time.monotonic()
+        for number, batch in enumerate(batched(read_rows(path, fmt), batch_size), start=1):
+            batch_started = time.monotonic()
+            counts = self.import_batch(batch)
+            elapsed = time.monotonic() - batch_started
+            timings.append(elapsed)
+            if self.verbosity >= 2:
+                self.stdout.write(
+                    f'batch {number}: {len(batch)} rows in {elapsed * 1000:.0f}ms '
+                    f'(+{counts["created"]} ~{counts["updated"]} ={counts["unchanged"]})'
+                )
+        elapsed = time.monotonic() - started
+
+        if not self.dry_run and (self.totals['created'] or self.totals['updated']):
+            bump_catalog_version()
+        self.report(elapsed, timings)
+
+    def import_batch(self, batch):
+        rows = {}
+        for row, error in batch:
+            self.totals['rows'] += 1
+            try:
+                if error:
+                    raise RowError(error)
+                cleaned = clean_row(row)
+            except RowError as e:
+                self.totals['errors'] += 1
+                self.stderr.write(f'row {self.totals["rows"]}: {e}')
+                continue
+            # A later row for the same product wins within the batch
+            rows[cleaned['name']] = cleaned
+
+        counts = {'created': 0, 'updated': 0, 'unchanged': 0}
+        if not rows:
+            return counts
+
+        with transaction.atomic():
+            self.resolve_categories({row['category'] for row in rows.values()})
+            existing = {}
+            for product in Product.objects.filter(name__in=rows).order_by('-id').only('id', 'name', *UPDATE_FIELDS):
+                existing[product.name] = product  # lowest id wins for duplicate names
+
+            now = timezone.now()
+            to_create, to_update = [], []
+            for name, row in rows.items():
+                category_id = self.categories.get(row['category'])
+                product = existing.get(name)
+                if product is None:
+                    to_create.append(Product(
+                        name=name, description=row['description'], price=row['price'],
+                        stock=row['stock'], category_id=category_id,
+                    ))
+                    continue
+                values = {'description': row['description'], 'price': row['price'],
+                          'stock': row['stock'], 'category_id': category_id}
+                changed = {field: value for field, value in values.items()
+                           if getattr(product, field) != value}
+                if not changed:
+                    counts['unchanged'] += 1
+                    continue
+                if self.dry_run and self.verbosity >= 2:
+                    diff = ', '.join(f'{field}: {getattr(product, field)!r} -> {value!r}'
+                                     for field, value in changed.items())
+                    self.stdout.write(f'  ~ {name}: {diff}')
+                for field, value in changed.items():
+                    setattr(product, field, value)
+                product.updated_at = now  # bulk_update skips auto_now
+                to_update.append(product)
+
+            if self.dry_run:
+                if self.verbosity >= 2:
+                    for product in to_create:
+                        self.stdout.write(f'  + {product.name}')
+            else:
+                created = Product.objects.bulk_create(to_create)
+                Product.objects.bulk_update(to_update, [*UPDATE_FIELDS, 'updated_at'])
+                # Bulk writes send no signals, so refresh the search index here
+                get_search_backend().index_products([p.pk for p in created + to_update])
+
+        counts['created'] = len(to_create)
+        counts['updated'] = len(to_update)
+        for key, value in counts.items():
+            self.totals[key] += value
+        return counts
+
+    def resolve_categories(self, names):
+        missing = [name for name in names if name not in self.categories]
+        if not missing:
+            return
+        if self.dry_run:
+            for name in missing:
+                self.stdout.write(f'  + category {name}')
+                self.categories[name] = None
+            return
+        Category.objects.bulk_create([Category(name=name) for name in missing])
+        self.categories.update(
+            Category.objects.filter(name__in=missing).values_list('name', 'id')
+        )
+
+    def report(self, elapsed, timings):
+        totals = self.totals
+        rate = totals['rows'] / elapsed if elapsed else 0
+        prefix = '[dry run] would import' if self.dry_run else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix} {totals["rows"]} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec): '
+            f'{totals["created"]} created, {totals["updated"]} updated, '
+            f'{totals["unchanged"]} unchanged, {totals["errors"]} errors'
+        ))
+        if timings:
+            ms = sorted(t * 1000 for t in timings)
+            p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+            self.stdout.write(
+                f'{len(ms)} batches: min {ms[0]:.0f}ms, mean {statistics.mean(ms):.0f}ms, '
+                f'p95 {p95:.0f}ms, max {ms[-1]:.0f}ms'
+            )
@@ -0,0 +1,54 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.carts import purge_carts
+from products.models import Cart
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete carts idle longer than CART_ANONYMOUS_TTL_DAYS (anonymous) or '
+        'CART_USER_TTL_DAYS (attached to a user), with their lines, plus expired '
+        'sessions. Rows are deleted in small chunks; schedule it from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Idle days before an anonymous cart is purged')
+        parser.add_argument('--user-days', type=int, help='Idle days before a user cart is purged')
+        parser.add_argument('--chunk-size', type=int, help='Rows deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to sleep between chunks to spread the load')
+        parser.add_argument('--keep-sessions', action='store_true',
+                            help='Do not purge expired sessions')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count the carts that would be purged without deleting')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            return self.dry_run(options)
+        stats = purge_carts(
+            anonymous_days=options['days'],
+            user_days=options['user_days'],
+            chunk_size=options['chunk_size'],
+            pause=options['pause'],
+            sessions=not options['keep_sessions'],
+        )
+        rows = stats['anonymous_rows'] + stats['user_rows'] + stats['session_rows']
+        elapsed = stats['elapsed']
+        rate = rows / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Purged {rows} rows in {stats["chunks"]} chunks, {elapsed:.2f}s ({rate:,.0f} rows/sec): '
+            f'{stats["anonymous_rows"]} anonymous cart rows, {stats["user_rows"]} user cart rows, '
+            f'{stats["session_rows"]} sessions'
+        ))
+
+    def dry_run(self, options):
+        now = timezone.now()
+        days = options['days'] or getattr(settings, 'CART_ANONYMOUS_TTL_DAYS', 30)
+        user_days = options['user_days'] or getattr(settings, 'CART_USER_TTL_DAYS', 180)
+        anonymous = Cart.objects.filter(user_id__isnull=True, updated_at__lt=now - timedelta(days=days)).count()
+        owned = Cart.objects.filter(user_id__isnull=False, updated_at__lt=now - timedelta(days=user_days)).count()
+        self.stdout.write(f'[dry run] would purge {anonymous} anonymous and {owned} user carts')
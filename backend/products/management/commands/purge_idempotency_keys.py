@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.idempotency import purge_expired_keys
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete stored Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL_HOURS, '
+        'in small chunks. Schedule it from cron alongside purge_carts.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, help='Rows deleted per transaction')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to sleep between chunks to spread the load')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rows, chunks = purge_expired_keys(chunk_size=options['chunk_size'], pause=options['pause'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Purged {rows} idempotency keys in {chunks} chunks, {time.monotonic() - started:.2f}s'
+        ))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.inventory import recount_reserved, release_expired
+
+
+class Command(BaseCommand):
+    help = (
+        'Release stock holds past their expiry (STOCK_HOLD_MINUTES) so the units '
+        'become available again. Run it from cron, or keep it running with --every.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Holds released per transaction')
+        parser.add_argument('--recount', action='store_true',
+                            help='Also rebuild Product.reserved from the reservation rows')
+        parser.add_argument('--every', type=float,
+                            help='Keep running, sweeping every this many seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired(chunk_size=options['chunk_size'])
+            message = f'Released {released} expired holds'
+            if options['recount']:
+                message += f', corrected reserved stock on {recount_reserved()} products'
+            self.stdout.write(self.style.SUCCESS(message))
+            if not options['every']:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from products.jobs import WorkerPool, queue_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Run background jobs (order and contact emails) from the jobs table with '
+        'a pool of worker threads. Runs until interrupted; --burst drains the '
+        'queue and exits, for cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, help='Worker threads (default JOB_WORKER_THREADS)')
+        parser.add_argument('--batch', type=int, default=10, help='Jobs claimed per query')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due')
+        parser.add_argument('--max-jobs', type=int, help='Stop after about this many jobs')
+        parser.add_argument('--stats-every', type=float, default=60,
+                            help='Seconds between throughput reports')
+
+    def handle(self, *args, **options):
+        pool = WorkerPool(
+            threads=options['threads'] or getattr(settings, 'JOB_WORKER_THREADS', 2),
+            batch=options['batch'],
+            poll=options['poll'],
+            burst=options['burst'],
+            max_jobs=options['max_jobs'],
+        )
+        pool.start()
+        try:
+            while not pool.join(timeout=options['stats_every']):
+                self.report(pool)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping after the jobs in hand...')
+            pool.stop.set()
+            pool.join()
+        self.report(pool, final=True)
+
+    def report(self, pool, final=False):
+        elapsed = pool.elapsed()
+        stats = pool.stats
+        rate = pool.processed / elapsed if elapsed else 0
+        queue = queue_stats()
+        message = (
+            f'{pool.processed} jobs in {elapsed:.2f}s ({rate:,.1f} jobs/sec): {stats["done"]} done, '
+            f'{stats["queued"]} to retry, {stats["dead"]} dead, {stats["busy"]} busy retries. '
+            f'Queue: {queue["queued"]} queued, {queue["running"]} running, {queue["dead"]} dead, '
+            f'lag {queue["lag"]:.1f}s'
+        )
+        self.stdout.write(self.style.SUCCESS(message) if final else message)
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def create_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS products_product_fts USING fts5("
+        "name, description, category, "
+        "tokenize = 'porter unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "INSERT INTO products_product_fts (rowid, name, description, category) "
+        "SELECT p.id, p.name, p.description, c.name "
+        "FROM products_product p JOIN products_category c ON c.id = p.category_id"
+    )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS products_product_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_product_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
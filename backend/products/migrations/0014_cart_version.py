@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-17 19:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cart',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
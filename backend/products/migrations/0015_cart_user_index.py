@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-17 19:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_cart_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['user_id'], name='cart_user_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.7 on 2026-10-17 20:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0018_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user_id', 'created_at'], name='order_user_created_idx'),
+        ),
+    ]
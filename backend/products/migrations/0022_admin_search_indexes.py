@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-17 20:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0021_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cart',
+            index=models.Index(fields=['user_email'], name='cart_email_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user_email'], name='order_email_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['phone'], name='order_phone_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
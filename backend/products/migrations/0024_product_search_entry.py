@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-17 20:39
+
+import django.db.models.deletion
+import products.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0023_order_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchEntry',
+            fields=[
+                ('product', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='products.product')),
+                ('document', products.models.FullTextField(db_column='products_product_fts')),
+            ],
+            options={
+                'db_table': 'products_product_fts',
+                'managed': False,
+            },
+        ),
+    ]
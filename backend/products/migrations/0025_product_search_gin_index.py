@@ -0,0 +1,41 @@
+from django.db import migrations
+
+TABLE = 'products_product_fts'
+INDEX_NAME = 'product_search_document_idx'
+# The document PostgresSearchBackend.index_products() stores, with its 'simple' config
+DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(p.name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(c.name, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(p.description, '')), 'C')"
+)
+
+
+def create_search_table(apps, schema_editor):
+    # SQLite keeps its FTS5 table of the same name (migration 0011). Like
+    # that table, rows are removed by the backend rather than a foreign key,
+    # which would also stop flush from truncating products_product.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'CREATE TABLE {TABLE} (rowid bigint PRIMARY KEY, {TABLE} tsvector NOT NULL)')
+    schema_editor.execute(
+        f'INSERT INTO {TABLE} (rowid, {TABLE}) SELECT p.id, {DOCUMENT} '
+        f'FROM products_product p JOIN products_category c ON c.id = p.category_id'
+    )
+    schema_editor.execute(f'CREATE INDEX {INDEX_NAME} ON {TABLE} USING gin ({TABLE})')
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0024_product_search_entry'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
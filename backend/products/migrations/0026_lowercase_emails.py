@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-17 21:00
+
+import products.models
+from django.db import migrations
+from django.db.models.functions import Lower
+
+
+def lowercase_emails(apps, schema_editor):
+    # Rows saved before LowercaseEmailField keep the case they were entered in
+    for name in ('Cart', 'Order', 'ArchivedOrder'):
+        model = apps.get_model('products', name)
+        model.objects.exclude(user_email=Lower('user_email')).update(user_email=Lower('user_email'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0025_product_search_gin_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedorder',
+            name='user_email',
+            field=products.models.LowercaseEmailField(blank=True, max_length=254, null=True),
+        ),
+        migrations.AlterField(
+            model_name='cart',
+            name='user_email',
+            field=products.models.LowercaseEmailField(blank=True, max_length=254, null=True),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='user_email',
+            field=products.models.LowercaseEmailField(blank=True, max_length=254, null=True),
+        ),
+        migrations.RunPython(lowercase_emails, migrations.RunPython.noop),
+    ]
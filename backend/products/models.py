@@ -1,7 +1,31 @@
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import ExpressionWrapper, F, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
+from decimal import Decimal
 import uuid
 
+# SQLite drops the scale of computed decimals, so annotated money is re-quantized
+CENTS = Decimal('0.01')
+
+def money_field():
+    return models.DecimalField(max_digits=12, decimal_places=2)
+
+class LowercaseEmailField(models.EmailField):
+    """
+    An email stored and looked up lower-cased, as Supabase stores account
+    emails, so prefix searches can use a case-sensitive index.
+    """
+    def pre_save(self, model_instance, add):
+        value = self.get_prep_value(super().pre_save(model_instance, add))
+        setattr(model_instance, self.attname, value)
+        return value
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        return value.lower() if isinstance(value, str) else value
+
 # Create your models here.
 
 class Category(models.Model):
@@ -21,34 +45,192 @@ class Product(models.Model):
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField(default=0)
+    # Units held by unexpired StockReservations; available = stock - reserved
+    reserved = models.PositiveIntegerField(default=0, editable=False)
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='products')
     image = models.ImageField(upload_to='products/', null=True, blank=True)
+    # Resized/WebP copies of image, filled in by products.images
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Composite keys backing KeysetPagination's orderings and ProductFilter.
+        # (created_at, id) also serves plain created_at lookups.
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            models.Index(fields=['stock', 'id'], name='product_stock_id_idx'),
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # ``reserved`` only changes through products.inventory's F() updates;
+        # never write back a stale copy when the rest of the row is saved.
+        if self.pk is not None and not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                f.attname for f in self._meta.concrete_fields if not f.primary_key and f.name != 'reserved'
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def available(self):
+        return self.stock - self.reserved
+
+class FullTextField(models.TextField):
+    """
+    The hidden column of an FTS5 table, named after the table, or a tsvector
+    column on PostgreSQL; query it with ``__match``.
+    """
+
+@FullTextField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', (*lhs_params, *rhs_params)
+
+    def as_postgresql(self, compiler, connection):
+        # The right-hand side is a SearchQuery
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} @@ {rhs}', (*lhs_params, *rhs_params)
+
+class ProductSearchEntry(models.Model):
+    """
+    The product search index, whose rowid is the product id: an FTS5 table
+    on SQLite (migration 0011), a tsvector table on PostgreSQL (migration
+    0025). Mapped so a search can join it once instead of matching in a
+    subquery per product; written by the search backend, never the ORM.
+    """
+    product = models.OneToOneField(Product, primary_key=True, db_column='rowid', on_delete=models.DO_NOTHING,
+                                   related_name='search_entry')
+    document = FullTextField(db_column='products_product_fts')
+
+    class Meta:
+        managed = False
+        db_table = 'products_product_fts'
+
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='product_images')
     image = models.ImageField(upload_to='products/')
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
         return f"Image for {self.product.name}"
 
+class CartQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Annotate ``items_total``, the sum of every line's price x quantity."""
+        return self.annotate(items_total=Coalesce(
+            Sum(F('items__product__price') * F('items__quantity'), output_field=money_field()),
+            Value(0), output_field=money_field(),
+        ))
+
+    def merge(self, source, target):
+        """
+        Move every line of cart ``source`` into cart ``target``, summing the
+        quantities of products both hold, and delete ``source``.
+        """
+        with transaction.atomic(using=self.db):
+            CartItem.objects.using(self.db).merge_lines(source.pk, target.pk)
+            self.filter(pk=source.pk).delete()
+            self.filter(pk=target.pk).bump_version()
+
+    def bump_version(self):
+        """Mark carts as changed; clients compare ``version`` to spot stale state."""
+        return self.update(version=F('version') + 1, updated_at=timezone.now())
+
+class CartItemQuerySet(models.QuerySet):
+    def with_subtotals(self):
+        """Annotate ``line_subtotal``, this line's price x quantity."""
+        return self.annotate(line_subtotal=ExpressionWrapper(
+            F('product__price') * F('quantity'), output_field=money_field(),
+        ))
+
+    def add_quantity(self, cart_id, product_id, quantity):
+        """
+        Add ``quantity`` of a product to a cart in one atomic statement,
+        creating the line if needed, so concurrent adds never lose an
+        increment or trip the (cart, product) unique constraint.
+        """
+        connection = connections[self.db]
+        now = timezone.now()
+        if connection.vendor in ('sqlite', 'postgresql'):
+            table = connection.ops.quote_name(self.model._meta.db_table)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {table} (cart_id, product_id, quantity, created_at, updated_at) '
+                    f'VALUES (%s, %s, %s, %s, %s) '
+                    f'ON CONFLICT (cart_id, product_id) DO UPDATE SET '
+                    f'quantity = {table}.quantity + excluded.quantity, updated_at = excluded.updated_at',
+                    [cart_id, product_id, quantity, *[connection.ops.adapt_datetimefield_value(now)] * 2],
+                )
+            return
+        self._increment_or_create(cart_id, product_id, quantity, now)
+
+    def merge_lines(self, source_id, target_id):
+        """Add every line of cart ``source_id`` to cart ``target_id``."""
+        connection = connections[self.db]
+        now = timezone.now()
+        if connection.vendor in ('sqlite', 'postgresql'):
+            table = connection.ops.quote_name(self.model._meta.db_table)
+            stamp = connection.ops.adapt_datetimefield_value(now)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {table} (cart_id, product_id, quantity, created_at, updated_at) '
+                    f'SELECT %s, product_id, quantity, %s, %s FROM {table} WHERE cart_id = %s '
+                    f'ON CONFLICT (cart_id, product_id) DO UPDATE SET '
+                    f'quantity = {table}.quantity + excluded.quantity, updated_at = excluded.updated_at',
+                    [target_id, stamp, stamp, source_id],
+                )
+            return
+        for product_id, quantity in self.filter(cart_id=source_id).values_list('product_id', 'quantity'):
+            self._increment_or_create(target_id, product_id, quantity, now)
+
+    def _increment_or_create(self, cart_id, product_id, quantity, now):
+        # Portable fallback: increment, else insert, else the racing insert won
+        lines = self.filter(cart_id=cart_id, product_id=product_id)
+        if lines.update(quantity=F('quantity') + quantity, updated_at=now):
+            return
+        try:
+            with transaction.atomic(using=self.db):
+                self.create(cart_id=cart_id, product_id=product_id, quantity=quantity)
+        except IntegrityError:
+            lines.update(quantity=F('quantity') + quantity, updated_at=now)
+
 class Cart(models.Model):
     session_id = models.CharField(max_length=100, unique=True)
     user_id = models.CharField(max_length=100, null=True, blank=True)  # Supabase user ID
-    user_email = models.EmailField(null=True, blank=True)  # Supabase user email
+    user_email = LowercaseEmailField(null=True, blank=True)  # Supabase user email
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CartQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id'], name='cart_user_idx'),
+            models.Index(fields=['updated_at'], name='cart_updated_idx'),
+            # Admin prefix search; pattern ops let PostgreSQL use it for LIKE 'x%'
+            models.Index(fields=['user_email'], name='cart_email_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ]
 
     def __str__(self):
         return f"Cart {self.session_id} - {self.user_email or 'Anonymous'}"
 
     @property
     def total(self):
+        # Prefer the SQL total from CartQuerySet.with_totals()
+        if hasattr(self, 'items_total'):
+            return self.items_total.quantize(CENTS)
         return sum(item.subtotal for item in self.items.all())
 
 class CartItem(models.Model):
@@ -58,16 +240,104 @@ class CartItem(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CartItemQuerySet.as_manager()
+
     class Meta:
         unique_together = ('cart', 'product')
 
     @property
     def subtotal(self):
+        # Prefer the SQL subtotal from CartItemQuerySet.with_subtotals()
+        if hasattr(self, 'line_subtotal'):
+            return self.line_subtotal.quantize(CENTS)
         return self.product.price * self.quantity
 
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in Cart {self.cart.session_id}"
 
+class StockReservation(models.Model):
+    """
+    Units of a product held for a cart (``holder`` is the cart's session_id)
+    until ``expires_at``. Product.reserved is the running sum of these rows.
+    """
+    holder = models.CharField(max_length=100)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['holder', 'product'], name='reservation_holder_product_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='reservation_expires_idx'),
+            models.Index(fields=['product', 'expires_at'], name='reservation_product_exp_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} held by {self.holder}"
+
+class IdempotencyKey(models.Model):
+    """
+    The stored outcome of a write made with an ``Idempotency-Key`` header,
+    so a retried request gets the first response back instead of running
+    again. ``status_code`` is null while the first request is in flight.
+    """
+    key = models.CharField(max_length=255)
+    scope = models.CharField(max_length=150)  # user:<id> or session:<key>
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='idempotency_scope_key_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='idempotency_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.scope})"
+
+class Job(models.Model):
+    """
+    A unit of background work (see products/jobs.py). Workers claim queued
+    jobs whose ``run_at`` has passed; failures are retried with backoff
+    until ``max_attempts``, then the job is dead-lettered as ``dead``.
+    """
+    QUEUED, RUNNING, DONE, DEAD = 'queued', 'running', 'done', 'dead'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (DEAD, 'Dead'),
+    )
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Claiming: the oldest due jobs of one status
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
+
 class Order(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
@@ -83,7 +353,7 @@ class Order(models.Model):
 
     order_number = models.CharField(max_length=20, unique=True)
     user_id = models.CharField(max_length=100, null=True, blank=True)  # Supabase user ID
-    user_email = models.EmailField(null=True, blank=True)  # Supabase user email
+    user_email = LowercaseEmailField(null=True, blank=True)  # Supabase user email
     full_name = models.CharField(max_length=100)
     phone = models.CharField(max_length=15)
     address = models.TextField()
@@ -95,6 +365,16 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Order history: a user's orders newest first, one range per page
+            models.Index(fields=['user_id', 'created_at'], name='order_user_created_idx'),
+            # Admin prefix search (order_number's unique index covers it already);
+            # pattern ops let PostgreSQL use them for LIKE 'x%'
+            models.Index(fields=['user_email'], name='order_email_prefix_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['phone'], name='order_phone_prefix_idx', opclasses=['varchar_pattern_ops']),
+            # Archival candidates: finished orders untouched for a while
+            models.Index(fields=['status', 'updated_at'], name='order_status_updated_idx'),
+        ]
 
     def __str__(self):
         return f"Order {self.order_number} by {self.user_email or 'Anonymous'}"
@@ -114,6 +394,178 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.quantity} x {self.product_name} in Order {self.order.order_number}"
 
+class ArchivedOrder(models.Model):
+    """
+    A delivered or cancelled order moved out of Order by products/archive.py.
+    The columns (and the id) are the order's own, so the same serializers
+    and admin columns read both tables; rows are never changed once written.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    order_number = models.CharField(max_length=20, unique=True)
+    user_id = models.CharField(max_length=100, null=True, blank=True)
+    user_email = LowercaseEmailField(null=True, blank=True)
+    full_name = models.CharField(max_length=100)
+    phone = models.CharField(max_length=15)
+    address = models.TextField()
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    payment_method = models.CharField(max_length=50, choices=Order.PAYMENT_CHOICES, default='cod')
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user_id', 'created_at'], name='archived_order_user_idx'),
+            # The same admin prefix search as Order
+            models.Index(fields=['user_email'], name='archived_order_email_idx', opclasses=['varchar_pattern_ops']),
+            models.Index(fields=['phone'], name='archived_order_phone_idx', opclasses=['varchar_pattern_ops']),
+        ]
+
+    def __str__(self):
+        return f"Archived order {self.order_number} by {self.user_email or 'Anonymous'}"
+
+class ArchivedOrderItem(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, related_name='items', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, related_name='+', on_delete=models.SET_NULL, null=True)
+    product_name = models.CharField(max_length=200)
+    product_price = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.PositiveIntegerField()
+    created_at = models.DateTimeField(null=True)
+
+    @property
+    def subtotal(self):
+        return self.product_price * self.quantity
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_name} in archived order {self.order_id}"
+
+class RollupQuerySet(models.QuerySet):
+    def increment(self, rows):
+        """
+        Add each row's measures to the rollup row with the same key,
+        creating it if needed, in one statement per row so concurrent
+        orders never lose an increment. ``rows`` are dicts of key fields,
+        label fields (overwritten with the latest value) and measures.
+        """
+        model = self.model
+        connection = connections[self.db]
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            return self._increment_portable(rows)
+        table = connection.ops.quote_name(model._meta.db_table)
+        quote = connection.ops.quote_name
+        columns = [*model.rollup_keys, *model.rollup_labels, *model.rollup_measures]
+        updates = [f'{quote(c)} = {table}.{quote(c)} + excluded.{quote(c)}' for c in model.rollup_measures]
+        updates += [f'{quote(c)} = excluded.{quote(c)}' for c in model.rollup_labels]
+        sql = (
+            f'INSERT INTO {table} ({", ".join(map(quote, columns))}) '
+            f'VALUES ({", ".join(["%s"] * len(columns))}) '
+            f'ON CONFLICT ({", ".join(map(quote, model.rollup_keys))}) DO UPDATE SET {", ".join(updates)}'
+        )
+        fields = {field.attname: field for field in model._meta.concrete_fields}
+        with connection.cursor() as cursor:
+            for row in rows:
+                cursor.execute(sql, [
+                    fields[column].get_db_prep_save(row[column], connection) for column in columns
+                ])
+
+    def _increment_portable(self, rows):
+        for row in rows:
+            keys = {key: row[key] for key in self.model.rollup_keys}
+            changes = {m: F(m) + row[m] for m in self.model.rollup_measures}
+            changes.update({label: row[label] for label in self.model.rollup_labels})
+            if self.filter(**keys).update(**changes):
+                continue
+            try:
+                with transaction.atomic(using=self.db):
+                    self.create(**row)
+            except IntegrityError:
+                self.filter(**keys).update(**changes)
+
+class DailySales(models.Model):
+    """
+    Orders, units and revenue per day placed and current order status,
+    maintained as orders are placed and change status (products/rollups.py).
+    """
+    day = models.DateField()
+    status = models.CharField(max_length=20)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    rollup_keys = ('day', 'status')
+    rollup_labels = ()
+    rollup_measures = ('orders', 'units', 'revenue')
+
+    objects = RollupQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = 'daily sales'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'status'], name='daily_sales_day_status_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.status}: {self.orders} orders"
+
+class DailyProductSales(models.Model):
+    """
+    The same measures per day, status and product; ``orders`` counts the
+    orders containing the product. ``product_id`` 0 collects deleted products.
+    """
+    day = models.DateField()
+    status = models.CharField(max_length=20)
+    product_id = models.IntegerField()
+    product_name = models.CharField(max_length=200)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    rollup_keys = ('day', 'status', 'product_id')
+    rollup_labels = ('product_name',)
+    rollup_measures = ('orders', 'units', 'revenue')
+
+    objects = RollupQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = 'daily product sales'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'status', 'product_id'], name='daily_product_sales_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.status}: {self.units} x {self.product_name}"
+
+class DailyCategorySales(models.Model):
+    """
+    The same measures per day, status and category; ``category_id`` 0
+    collects products that no longer exist.
+    """
+    day = models.DateField()
+    status = models.CharField(max_length=20)
+    category_id = models.IntegerField()
+    category_name = models.CharField(max_length=100)
+    orders = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    rollup_keys = ('day', 'status', 'category_id')
+    rollup_labels = ('category_name',)
+    rollup_measures = ('orders', 'units', 'revenue')
+
+    objects = RollupQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = 'daily category sales'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'status', 'category_id'], name='daily_category_sales_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.status}: {self.category_name}"
+
 class ContactSubmission(models.Model):
     SUBJECT_CHOICES = (
         ('general', 'General Inquiry'),
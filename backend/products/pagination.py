@@ -0,0 +1,272 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination with opaque cursors.
+
+    Each page is fetched with ``WHERE (key) > (last seen key) ... LIMIT n``
+    on a unique ordering, so page N costs the same as page 1 and rows
+    inserted between requests never shift or duplicate results.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    ordering_query_param = 'ordering'
+    invalid_cursor_message = 'Invalid cursor'
+
+    # Every ordering ends with a unique column so the key is a total order.
+    orderings = {
+        'newest': ('-created_at', '-id'),
+        'oldest': ('created_at', 'id'),
+        'price': ('price', 'id'),
+        '-price': ('-price', '-id'),
+        'stock': ('stock', 'id'),
+        '-stock': ('-stock', '-id'),
+        # Only offered when the queryset carries a search_rank annotation.
+        'relevance': ('search_rank', 'id'),
+    }
+    default_ordering = 'newest'
+    page_size_setting = ('CATALOG_PAGE_SIZE', 24)
+    max_page_size_setting = ('CATALOG_MAX_PAGE_SIZE', 100)
+
+    def __init__(self):
+        self.page_size = getattr(settings, *self.page_size_setting)
+        self.max_page_size = getattr(settings, *self.max_page_size_setting)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        cursor = self.decode_cursor(request)
+        if cursor is None:
+            self.ordering_key = self.get_ordering_key(request, queryset)
+            position, reverse = None, False
+        else:
+            self.ordering_key, position, reverse = cursor
+
+        ordering = self.orderings[self.ordering_key]
+        if reverse:
+            ordering = tuple(self._invert(field) for field in ordering)
+
+        # Fetch one extra row to find out whether another page exists.
+        results = self.fetch(queryset, ordering, position, self.page_size + 1)
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.page = results
+        return results
+
+    def fetch(self, queryset, ordering, position, limit):
+        """The first ``limit`` rows of ``queryset`` after ``position`` in ``ordering``."""
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self._seek_filter(ordering, position))
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+        return list(queryset[:limit])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering_key(self, request, queryset):
+        ranked = 'search_rank' in queryset.query.annotations
+        ordering = request.query_params.get(self.ordering_query_param)
+        if ordering in self.orderings and (ranked or ordering != 'relevance'):
+            return ordering
+        return 'relevance' if ranked else self.default_ordering
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._build_link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._build_link(self.page[0], reverse=True)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            ordering_key = payload['o']
+            position = payload['p']
+            reverse = bool(payload['r'])
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+        if ordering_key not in self.orderings or not isinstance(position, list) \
+                or len(position) != len(self.orderings[ordering_key]):
+            raise NotFound(self.invalid_cursor_message)
+        return ordering_key, position, reverse
+
+    def encode_cursor(self, position, reverse):
+        payload = json.dumps(
+            {'o': self.ordering_key, 'p': position, 'r': int(reverse)},
+            separators=(',', ':'),
+        )
+        return base64.urlsafe_b64encode(payload.encode('ascii')).decode('ascii')
+
+    def _build_link(self, instance, reverse):
+        position = [
+            self._serialize_value(getattr(instance, field.lstrip('-')))
+            for field in self.orderings[self.ordering_key]
+        ]
+        url = remove_query_param(self.base_url, self.ordering_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(position, reverse))
+
+    @staticmethod
+    def _serialize_value(value):
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    @staticmethod
+    def _invert(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    @staticmethod
+    def _seek_filter(ordering, position):
+        """
+        Build ``(a, b) > (x, y)`` as ``a > x OR (a = x AND b > y)``, honouring
+        the direction of each column.
+        """
+        condition = Q()
+        for index in reversed(range(len(ordering))):
+            field = ordering[index]
+            name = field.lstrip('-')
+            lookup = '%s__%s' % (name, 'lt' if field.startswith('-') else 'gt')
+            step = Q(**{lookup: position[index]})
+            if index < len(ordering) - 1:
+                step |= Q(**{name: position[index]}) & condition
+            condition = step
+        return condition
+
+
+class OrderHistoryPagination(KeysetPagination):
+    """
+    Keyset pages over one user's orders. The orderings match the
+    (user_id, created_at) index, so each page is a range scan of it.
+    """
+    orderings = {
+        'newest': ('-created_at', '-id'),
+        'oldest': ('created_at', 'id'),
+    }
+    page_size_setting = ('ORDER_HISTORY_PAGE_SIZE', 20)
+    max_page_size_setting = ('ORDER_HISTORY_MAX_PAGE_SIZE', 100)
+
+    def get_ordering_key(self, request, queryset):
+        ordering = request.query_params.get(self.ordering_query_param)
+        return ordering if ordering in self.orderings else self.default_ordering
+
+    def fetch(self, queryset, ordering, position, limit):
+        """
+        ``queryset`` may also be a list of querysets (live and archived
+        orders, see products/archive.py): each is read for a full page from
+        the same position and the pages are merged. Ids are unique across
+        the tables, so the merged key is still a total order.
+        """
+        if not isinstance(queryset, (list, tuple)):
+            return super().fetch(queryset, ordering, position, limit)
+        rows = []
+        for part in queryset:
+            rows.extend(super().fetch(part, ordering, position, limit))
+        # Both orderings run the same way on every column
+        rows.sort(key=lambda row: tuple(getattr(row, field.lstrip('-')) for field in ordering),
+                  reverse=ordering[0].startswith('-'))
+        return rows[:limit]
+
+
+# Row count kept in the database's statistics, by vendor
+ESTIMATE_QUERIES = {
+    'postgresql': 'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+    'mysql': 'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s',
+    # Only present after ANALYZE; the first number of a stat is the row count
+    'sqlite': 'SELECT CAST(stat AS INTEGER) FROM sqlite_stat1 WHERE tbl = %s ORDER BY idx IS NULL DESC LIMIT 1',
+}
+
+
+def estimated_row_count(model, using='default'):
+    """The planner's row count for ``model``'s table, or None where there is none."""
+    connection = connections[using]
+    sql = ESTIMATE_QUERIES.get(connection.vendor)
+    if sql is None:
+        return None
+    try:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(sql, [model._meta.db_table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    # PostgreSQL reports -1 for a table that was never analyzed
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Admin changelist paginator that never counts a large table exactly.
+    An unfiltered list past ADMIN_EXACT_COUNT_LIMIT rows takes its count
+    from the table statistics; a filtered or searched one counts at most
+    that many rows, so pages beyond the limit are not linked.
+    """
+    @cached_property
+    def count(self):
+        limit = getattr(settings, 'ADMIN_EXACT_COUNT_LIMIT', 10000)
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                return estimate
+        return min(queryset.order_by()[:limit + 1].count(), limit)
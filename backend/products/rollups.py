@@ -0,0 +1,217 @@
+import time as _time
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, ExpressionWrapper, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (CENTS, ArchivedOrder, ArchivedOrderItem, DailyCategorySales, DailyProductSales, DailySales,
+                     Order, OrderItem, money_field)
+
+DELETED = 0  # product_id / category_id of rows whose product no longer exists
+DELETED_PRODUCT_NAME = 'Deleted products'
+DELETED_CATEGORY_NAME = 'Unknown'
+ROLLUPS = (DailySales, DailyProductSales, DailyCategorySales)
+# Where orders live; archived orders keep counting towards sales
+SOURCES = ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem))
+
+
+def _contribution(order, items, status, sign):
+    """The rollup rows ``order`` adds (sign 1) or takes away (sign -1) under ``status``."""
+    day = timezone.localdate(order.created_at)
+    base = {'day': day, 'status': status}
+    daily = {**base, 'orders': sign, 'units': 0, 'revenue': sign * order.total_amount}
+    products, categories = {}, {}
+    for item in items:
+        product = item.product
+        category = product.category if product is not None else None
+        product_row = products.setdefault(product.pk if product else DELETED, {
+            **base, 'product_id': product.pk if product else DELETED,
+            'product_name': product.name if product else DELETED_PRODUCT_NAME,
+            'orders': sign, 'units': 0, 'revenue': Decimal('0'),
+        })
+        category_row = categories.setdefault(category.pk if category else DELETED, {
+            **base, 'category_id': category.pk if category else DELETED,
+            'category_name': category.name if category else DELETED_CATEGORY_NAME,
+            'orders': sign, 'units': 0, 'revenue': Decimal('0'),
+        })
+        for row in (daily, product_row, category_row):
+            row['units'] += sign * item.quantity
+        for row in (product_row, category_row):
+            row['revenue'] += sign * item.subtotal
+    return [daily], list(products.values()), list(categories.values())
+
+
+def _apply(order, items, status, sign):
+    daily, products, categories = _contribution(order, items, status, sign)
+    DailySales.objects.increment(daily)
+    DailyProductSales.objects.increment(products)
+    DailyCategorySales.objects.increment(categories)
+
+
+def _items(order):
+    return list(OrderItem.objects.filter(order=order).select_related('product__category'))
+
+
+def record_order(order, items=None):
+    """
+    Add a new order to the rollups; ``items`` are its OrderItems with
+    ``product__category`` loaded (read from the database when omitted).
+    Call it in the transaction that writes the order.
+    """
+    _apply(order, _items(order) if items is None else items, order.status, 1)
+
+
+def move_order(order, old_status, new_status):
+    """Move an order's figures from ``old_status`` to ``new_status``."""
+    items = _items(order)
+    with transaction.atomic():
+        _apply(order, items, old_status, -1)
+        _apply(order, items, new_status, 1)
+
+
+def forget_order(order):
+    """Take a deleted order out of the rollups (its items must still exist)."""
+    _apply(order, _items(order), order.status, -1)
+
+
+def _bounds(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def rebuild(since=None, until=None, chunk_days=31):
+    """
+    Recompute the rollups for the days ``since`` to ``until`` (inclusive
+    dates; the whole order history by default) straight from the orders
+    and their items, live and archived, ``chunk_days`` at a time, each
+    chunk in its own transaction.
+    Returns counts and timings for reporting.
+    """
+    started = _time.monotonic()
+    if since is None or until is None:
+        spans = [model.objects.aggregate(first=Min('created_at'), last=Max('created_at')) for model, _ in SOURCES]
+        firsts = [span['first'] for span in spans if span['first'] is not None]
+        if not firsts:
+            return {'days': 0, 'orders': 0, 'rows': 0, 'elapsed': _time.monotonic() - started}
+        since = since or timezone.localdate(min(firsts))
+        until = until or timezone.localdate(max(span['last'] for span in spans if span['last'] is not None))
+
+    stats = {'days': (until - since).days + 1, 'orders': 0, 'rows': 0}
+    start = since
+    while start <= until:
+        end = min(start + timedelta(days=chunk_days), until + timedelta(days=1))
+        with transaction.atomic():
+            for model in ROLLUPS:
+                model.objects.filter(day__gte=start, day__lt=end).delete()
+            orders, rows = _rebuild_range(_bounds(start), _bounds(end))
+        stats['orders'] += orders
+        stats['rows'] += rows
+        start = end
+    stats['elapsed'] = _time.monotonic() - started
+    return stats
+
+
+def _rebuild_range(start, end):
+    daily, products, categories = {}, {}, {}
+    for order_model, item_model in SOURCES:
+        _collect(order_model, item_model, start, end, daily, products, categories)
+    rows = {
+        DailySales: [DailySales(**row) for row in daily.values()],
+        DailyProductSales: [DailyProductSales(**row) for row in products.values()],
+        DailyCategorySales: [DailyCategorySales(**row) for row in categories.values()],
+    }
+    for model, objects in rows.items():
+        model.objects.bulk_create(objects, batch_size=500)
+    return sum(row['orders'] for row in daily.values()), sum(len(objects) for objects in rows.values())
+
+
+def _add(rows, key, row):
+    # An order lives in exactly one source, so counts from each simply add up
+    if key in rows:
+        for measure in ('orders', 'units', 'revenue'):
+            rows[key][measure] += row[measure]
+    else:
+        rows[key] = row
+
+
+def _collect(order_model, item_model, start, end, daily, products, categories):
+    """Add the GROUP BY totals of one order table and its items to the rollup rows."""
+    orders = order_model.objects.filter(created_at__gte=start, created_at__lt=end)
+    items = item_model.objects.filter(order__created_at__gte=start, order__created_at__lt=end).annotate(
+        day=TruncDate('order__created_at'), order_status=F('order__status'),
+    )
+    revenue = Sum(ExpressionWrapper(F('product_price') * F('quantity'), output_field=money_field()))
+
+    units = {
+        (row['day'], row['order_status']): row['units']
+        for row in items.values('day', 'order_status').annotate(units=Sum('quantity')).order_by()
+    }
+    for row in (orders.annotate(day=TruncDate('created_at')).values('day', 'status')
+                .annotate(orders=Count('id'), revenue=Sum('total_amount')).order_by()):
+        _add(daily, (row['day'], row['status']), {
+            'day': row['day'], 'status': row['status'], 'orders': row['orders'], 'revenue': row['revenue'],
+            'units': units.get((row['day'], row['status']), 0),
+        })
+    for row in items.values('day', 'order_status', 'product_id').annotate(
+        name=Max('product__name'), orders=Count('order_id', distinct=True), units=Sum('quantity'), revenue=revenue,
+    ).order_by():
+        product_id = row['product_id'] or DELETED
+        _add(products, (row['day'], row['order_status'], product_id), {
+            'day': row['day'], 'status': row['order_status'], 'product_id': product_id,
+            'product_name': row['name'] or DELETED_PRODUCT_NAME,
+            'orders': row['orders'], 'units': row['units'], 'revenue': row['revenue'],
+        })
+    for row in items.values('day', 'order_status', 'product__category_id').annotate(
+        name=Max('product__category__name'), orders=Count('order_id', distinct=True),
+        units=Sum('quantity'), revenue=revenue,
+    ).order_by():
+        category_id = row['product__category_id'] or DELETED
+        _add(categories, (row['day'], row['order_status'], category_id), {
+            'day': row['day'], 'status': row['order_status'], 'category_id': category_id,
+            'category_name': row['name'] or DELETED_CATEGORY_NAME,
+            'orders': row['orders'], 'units': row['units'], 'revenue': row['revenue'],
+        })
+
+
+GROUPS = {
+    'day': (DailySales, ('day',), 'day'),
+    'status': (DailySales, ('status',), 'status'),
+    'product': (DailyProductSales, ('product_id', 'product_name'), '-revenue'),
+    'category': (DailyCategorySales, ('category_id', 'category_name'), '-revenue'),
+}
+REPORTED_STATUSES = [status for status, _ in Order.STATUS_CHOICES if status != 'cancelled']
+
+
+def sales_report(since, until, group='day', statuses=None, limit=None):
+    """
+    Sales between two dates (inclusive) from the rollup tables alone.
+    Cancelled orders are left out unless ``statuses`` asks for them.
+    """
+    model, keys, ordering = GROUPS[group]
+    statuses = statuses or REPORTED_STATUSES
+    # Named apart from the model fields they sum
+    measures = {'total_orders': Sum('orders'), 'total_units': Sum('units'), 'total_revenue': Sum('revenue')}
+
+    totals = DailySales.objects.filter(day__gte=since, day__lte=until, status__in=statuses).aggregate(**measures)
+    labels = {keys[1]: Max(keys[1])} if len(keys) > 1 else {}
+    rows = (
+        model.objects.filter(day__gte=since, day__lte=until, status__in=statuses)
+        .values(keys[0]).annotate(**labels, **measures)
+        .exclude(total_orders=0).order_by(ordering.replace('revenue', 'total_revenue'), keys[0])
+    )
+    if limit:
+        rows = rows[:limit]
+    return {
+        'totals': _measures(totals),
+        'rows': [{**{key: row[key] for key in keys}, **_measures(row)} for row in rows],
+    }
+
+
+def _measures(row):
+    return {
+        'orders': row['total_orders'] or 0,
+        'units': row['total_units'] or 0,
+        'revenue': Decimal(row['total_revenue'] or 0).quantize(CENTS),
+    }
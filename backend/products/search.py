@@ -0,0 +1,204 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+# Annotation holding the relevance score. Lower is better for every backend so
+# KeysetPagination can page through results in ('search_rank', 'id') order.
+RANK_ANNOTATION = 'search_rank'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())[:16]
+
+
+class SearchBackend:
+    """
+    Full-text search over product name, description and category name.
+
+    ``search`` narrows a Product queryset to matches and annotates it with
+    ``search_rank``. ``index_products``/``remove_products`` keep the index in
+    step with writes and ``rebuild`` backfills it from scratch.
+    """
+    def search(self, queryset, query):
+        raise NotImplementedError
+
+    def index_products(self, product_ids=None, category_id=None):
+        pass
+
+    def remove_products(self, product_ids):
+        pass
+
+    def rebuild(self):
+        return 0
+
+
+class IndexTableBackend(SearchBackend):
+    """
+    A backend whose index is the ``products_product_fts`` table, one row per
+    product keyed by ``rowid`` = product id and mapped as ProductSearchEntry,
+    so a search joins it once. Subclasses fill it in ``index_products``.
+    """
+    table = 'products_product_fts'
+
+    def scope(self, product_ids=None, category_id=None):
+        """WHERE clause and params over ``products_product p``, or None if empty."""
+        if product_ids is not None:
+            ids = list(product_ids)
+            if not ids:
+                return None
+            return 'p.id IN (%s)' % ', '.join(['%s'] * len(ids)), ids
+        if category_id is not None:
+            return 'p.category_id = %s', [category_id]
+        return '1 = 1', []
+
+    def remove_products(self, product_ids):
+        ids = list(product_ids)
+        if not ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM %s WHERE rowid IN (%s)' % (self.table, ', '.join(['%s'] * len(ids))),
+                ids,
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s' % self.table)
+        return self.index_products()
+
+
+class SQLiteFTSBackend(IndexTableBackend):
+    """
+    BM25-ranked prefix search backed by an FTS5 virtual table whose rowid is
+    the product id (created by migration 0011).
+    """
+    # bm25 column weights: name, description, category
+    weights = (10.0, 1.0, 4.0)
+
+    def match_expression(self, query):
+        # Quote every token so user input can never inject FTS5 syntax, and
+        # mark each one as a prefix so "cem" finds "cement".
+        return ' '.join('"%s"*' % token for token in tokenize(query))
+
+    def search(self, queryset, query):
+        match = self.match_expression(query)
+        if not match:
+            return queryset.none()
+        # Join the index on rowid: MATCH runs once and bm25 is read from the
+        # joined row, instead of a correlated MATCH per matching product.
+        rank = RawSQL('bm25(%s, %s)' % (self.table, ', '.join(str(w) for w in self.weights)), ())
+        return queryset.filter(search_entry__document__match=match).annotate(**{RANK_ANNOTATION: rank})
+
+    def index_products(self, product_ids=None, category_id=None):
+        scope = self.scope(product_ids, category_id)
+        if scope is None:
+            return 0
+        where, params = scope
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM %s WHERE rowid IN (SELECT p.id FROM products_product p WHERE %s)' % (
+                    self.table, where),
+                params,
+            )
+            cursor.execute(
+                'INSERT INTO %s (rowid, name, description, category) '
+                'SELECT p.id, p.name, p.description, c.name '
+                'FROM products_product p JOIN products_category c ON c.id = p.category_id '
+                'WHERE %s' % (self.table, where),
+                params,
+            )
+            return cursor.rowcount
+
+
+class PostgresSearchBackend(IndexTableBackend):
+    """
+    tsvector search for PostgreSQL. Each product's weighted document (name A,
+    category name B, description C) is stored in the index table created by
+    migration 0025, under a GIN index, so a search is one index lookup and
+    the category name is searchable without a join.
+    """
+    config = 'simple'
+    # Must stay identical to the backfill in migration 0025
+    document = (
+        "setweight(to_tsvector('{config}', coalesce(p.name, '')), 'A') || "
+        "setweight(to_tsvector('{config}', coalesce(c.name, '')), 'B') || "
+        "setweight(to_tsvector('{config}', coalesce(p.description, '')), 'C')"
+    )
+
+    def search(self, queryset, query):
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+
+        tokens = tokenize(query)
+        if not tokens:
+            return queryset.none()
+        search_query = SearchQuery(
+            ' & '.join('%s:*' % token for token in tokens),
+            search_type='raw', config=self.config,
+        )
+        return queryset.filter(search_entry__document__match=search_query).annotate(
+            **{RANK_ANNOTATION: -SearchRank(F('search_entry__document'), search_query)}
+        )
+
+    def index_products(self, product_ids=None, category_id=None):
+        scope = self.scope(product_ids, category_id)
+        if scope is None:
+            return 0
+        where, params = scope
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO %s (rowid, %s) '
+                'SELECT p.id, %s '
+                'FROM products_product p JOIN products_category c ON c.id = p.category_id '
+                'WHERE %s '
+                'ON CONFLICT (rowid) DO UPDATE SET %s = EXCLUDED.%s' % (
+                    self.table, self.table, self.document.format(config=self.config), where,
+                    self.table, self.table),
+                params,
+            )
+            return cursor.rowcount
+
+
+class SubstringSearchBackend(SearchBackend):
+    """
+    Unindexed LIKE fallback for databases without a full-text backend.
+    Every token must appear in the name or description; names rank first.
+    """
+    def search(self, queryset, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return queryset.none()
+        for token in tokens:
+            queryset = queryset.filter(Q(name__icontains=token) | Q(description__icontains=token))
+        return queryset.annotate(**{RANK_ANNOTATION: Case(
+            When(name__icontains=tokens[0], then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        )})
+
+
+_backend = None
+
+
+def get_search_backend():
+    """
+    Return the configured backend (``PRODUCT_SEARCH_BACKEND`` dotted path),
+    defaulting to the one that matches the database vendor.
+    """
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == 'sqlite':
+            _backend = SQLiteFTSBackend()
+        elif connection.vendor == 'postgresql':
+            _backend = PostgresSearchBackend()
+        else:
+            _backend = SubstringSearchBackend()
+    return _backend
@@ -1,60 +1,206 @@
+from django.core.files.storage import default_storage
+from django.db.models import F, JSONField, OuterRef, Subquery
+from django.db.models.functions import Substr
 from rest_framework import serializers
 from .models import Category, Product, Cart, CartItem, Order, OrderItem, ProductImage, ContactSubmission
+from .images import variant_urls
+
+
+def parse_field_list(value):
+    """Split a ``?fields=a,b.c`` style query param into a list of paths."""
+    if not value:
+        return None
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+def _split_paths(paths):
+    top, nested = set(), {}
+    for path in paths or ():
+        name, _, rest = path.partition('.')
+        top.add(name)
+        if rest:
+            nested.setdefault(name, []).append(rest)
+    return top, nested
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer whose rendered fields can be chosen per request.
+
+    ``fields`` keeps only the listed fields and ``expand`` adds fields on top
+    of ``default_fields`` (all fields when unset). Dotted paths such as
+    ``items.product.name`` reach into nested dynamic serializers.
+    """
+    default_fields = None
+    # Extra columns a field needs beyond its own name, e.g. method fields
+    field_columns = {}
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        expand = kwargs.pop('expand', None)
+        super().__init__(*args, **kwargs)
+        self.select_fields(fields, expand)
+
+    def select_fields(self, fields=None, expand=None):
+        keep, nested_fields = _split_paths(fields)
+        extra, nested_expand = _split_paths(expand)
+        if fields is None:
+            keep = set(self.default_fields or self.fields) | extra
+        for name in set(self.fields) - keep:
+            self.fields.pop(name)
+
+        for name, field in self.fields.items():
+            child = getattr(field, 'child', field)
+            if isinstance(child, DynamicFieldsModelSerializer) and (
+                    name in nested_fields or name in nested_expand):
+                child.select_fields(nested_fields.get(name), nested_expand.get(name))
+
+    def nested(self, name):
+        """The selected nested serializer for ``name``, or None if not rendered."""
+        field = self.fields.get(name)
+        return getattr(field, 'child', field)
+
+    def load_columns(self):
+        """Concrete model columns the selected fields read."""
+        opts = self.Meta.model._meta
+        concrete = {f.name for f in opts.concrete_fields}
+        columns = [opts.pk.name] + [name for name in self.fields if name in concrete]
+        for name in self.fields:
+            columns.extend(self.field_columns.get(name, ()))
+        return columns
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = '__all__'
 
-class ProductImageSerializer(serializers.ModelSerializer):
+class ProductImageSerializer(DynamicFieldsModelSerializer):
     image_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
     
     class Meta:
         model = ProductImage
-        fields = ['id', 'image', 'image_url']
+        fields = ['id', 'image', 'image_url', 'image_variants']
     
     def get_image_url(self, obj):
         if obj.image:
             return obj.image.url
         return None
 
-class ProductSerializer(serializers.ModelSerializer):
+    def get_image_variants(self, obj):
+        return variant_urls(obj.image_variants)
+
+class ProductSerializer(DynamicFieldsModelSerializer):
     image = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
     product_images = ProductImageSerializer(many=True, read_only=True)
+    field_columns = {'image_variants': ('image',)}
     
     class Meta:
         model = Product
-        fields = '__all__'
+        # Catalog responses are cached by catalog version, which stock holds
+        # do not bump; live availability is served by /api/stock/
+        exclude = ['reserved']
 
     def get_image(self, obj):
         if obj.image:
             return obj.image.url
         return None
 
-class CartItemSerializer(serializers.ModelSerializer):
-    product = ProductSerializer()
+    def get_image_variants(self, obj):
+        return variant_urls(obj.image_variants)
+
+    def optimize_queryset(self, queryset, columns=()):
+        """
+        Restrict ``queryset`` to what the selected fields render: unused
+        columns are deferred in SQL and images are only prefetched when shown.
+        """
+        queryset = queryset.only(*self.load_columns(), *columns)
+        if 'product_images' in self.fields:
+            queryset = queryset.prefetch_related('product_images')
+        return queryset
+
+
+class ProductCardSerializer(ProductSerializer):
+    """
+    Compact product representation for grids and lists. ``image`` falls back
+    to the first additional image so cards never need ``product_images``.
+    """
+    default_fields = (
+        'id', 'name', 'price', 'stock', 'category', 'category_name',
+        'image', 'image_variants', 'summary',
+    )
+    summary_length = 160
+
+    category_name = serializers.SerializerMethodField()
+    summary = serializers.SerializerMethodField()
+
+    class Meta(ProductSerializer.Meta):
+        pass
+
+    # The annotations added by optimize_queryset are used when present; the
+    # fallbacks serve instances loaded elsewhere (e.g. cart lines).
+    def get_category_name(self, obj):
+        if hasattr(obj, 'category_name'):
+            return obj.category_name
+        return obj.category.name
+
+    def get_summary(self, obj):
+        if hasattr(obj, 'summary'):
+            return obj.summary
+        return obj.description[:self.summary_length]
+
+    def get_image(self, obj):
+        if obj.image:
+            return obj.image.url
+        primary_image = getattr(obj, 'primary_image', None)
+        if primary_image:
+            return default_storage.url(primary_image)
+        return None
+
+    def get_image_variants(self, obj):
+        if obj.image:
+            return variant_urls(obj.image_variants)
+        return variant_urls(getattr(obj, 'primary_image_variants', None))
+
+    def optimize_queryset(self, queryset, columns=()):
+        queryset = super().optimize_queryset(queryset, columns)
+        if 'category_name' in self.fields:
+            queryset = queryset.annotate(category_name=F('category__name'))
+        if 'summary' in self.fields:
+            queryset = queryset.annotate(summary=Substr('description', 1, self.summary_length))
+        first_image = ProductImage.objects.filter(product=OuterRef('pk')).order_by('id')
+        if 'image' in self.fields:
+            queryset = queryset.annotate(primary_image=Subquery(first_image.values('image')[:1]))
+        if 'image_variants' in self.fields:
+            queryset = queryset.annotate(primary_image_variants=Subquery(
+                first_image.values('image_variants')[:1], output_field=JSONField()))
+        return queryset
+
+class CartItemSerializer(DynamicFieldsModelSerializer):
+    product = ProductCardSerializer()
     subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
 
     class Meta:
         model = CartItem
         fields = ['id', 'product', 'quantity', 'subtotal']
 
-class CartSerializer(serializers.ModelSerializer):
+class CartSerializer(DynamicFieldsModelSerializer):
     items = CartItemSerializer(many=True, read_only=True)
     total = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
 
     class Meta:
         model = Cart
-        fields = ['id', 'session_id', 'user_id', 'user_email', 'items', 'total']
+        fields = ['id', 'session_id', 'user_id', 'user_email', 'items', 'total', 'version']
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(DynamicFieldsModelSerializer):
     subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
 
     class Meta:
         model = OrderItem
         fields = ['id', 'product_name', 'product_price', 'quantity', 'subtotal']
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(DynamicFieldsModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
 
     class Meta:
@@ -0,0 +1,67 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version_on_commit
+from .images import schedule_derivatives
+from .models import Category, Order, Product, ProductImage
+from .rollups import forget_order, move_order
+from .search import get_search_backend
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    get_search_backend().index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    get_search_backend().remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Category)
+def reindex_category(sender, instance, created, raw=False, **kwargs):
+    # A renamed category changes the indexed text of all its products
+    if raw or created:
+        return
+    get_search_backend().index_products(category_id=instance.pk)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_catalog_version_on_commit()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=ProductImage)
+def queue_image_derivatives(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_derivatives(instance)
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_status(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    instance._saved_status = Order.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=Order)
+def roll_up_status_change(sender, instance, created, raw=False, **kwargs):
+    # New orders are rolled up by checkout, once their items exist
+    old = getattr(instance, '_saved_status', None)
+    if raw or created or old is None or old == instance.status:
+        return
+    move_order(instance, old, instance.status)
+    instance._saved_status = instance.status
+
+
+@receiver(pre_delete, sender=Order)
+def roll_up_deleted_order(sender, instance, **kwargs):
+    forget_order(instance)
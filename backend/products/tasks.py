@@ -0,0 +1,72 @@
+from django.conf import settings
+from django.core.mail import send_mail
+
+from .jobs import task
+from .models import ContactSubmission, Order
+
+
+def _staff_recipients():
+    return list(getattr(settings, 'STAFF_NOTIFICATION_EMAILS', []))
+
+
+def _order_lines(order):
+    return '\n'.join(
+        f'  {item.quantity} x {item.product_name} @ ₹{item.product_price} = ₹{item.subtotal}'
+        for item in order.items.all()
+    )
+
+
+@task('order_confirmation')
+def send_order_confirmation(order_id):
+    order = Order.objects.prefetch_related('items').get(pk=order_id)
+    if not order.user_email:
+        return
+    send_mail(
+        f'Order {order.order_number} confirmed',
+        f'Hi {order.full_name},\n\nThank you for your order. We will call {order.phone} '
+        f'before delivery.\n\n{_order_lines(order)}\n\nTotal: ₹{order.total_amount} '
+        f'({order.get_payment_method_display()})\n\nDelivery address:\n{order.address}\n',
+        None,
+        [order.user_email],
+    )
+
+
+@task('order_notification')
+def notify_new_order(order_id):
+    recipients = _staff_recipients()
+    if not recipients:
+        return
+    order = Order.objects.prefetch_related('items').get(pk=order_id)
+    send_mail(
+        f'New order {order.order_number}: ₹{order.total_amount}',
+        f'{order.full_name} ({order.phone}, {order.user_email or "no email"})\n\n'
+        f'{_order_lines(order)}\n\nDeliver to:\n{order.address}\n',
+        None,
+        recipients,
+    )
+
+
+@task('contact_acknowledgement')
+def acknowledge_contact(submission_id):
+    submission = ContactSubmission.objects.get(pk=submission_id)
+    send_mail(
+        f'We received your message: {submission.get_subject_display()}',
+        f'Hi {submission.name},\n\nThanks for getting in touch. Our team will reply soon.\n\n'
+        f'Your message:\n{submission.message}\n',
+        None,
+        [submission.email],
+    )
+
+
+@task('contact_notification')
+def notify_contact(submission_id):
+    recipients = _staff_recipients()
+    if not recipients:
+        return
+    submission = ContactSubmission.objects.get(pk=submission_id)
+    send_mail(
+        f'Contact form: {submission.get_subject_display()} from {submission.name}',
+        f'{submission.name} <{submission.email}> {submission.phone or ""}\n\n{submission.message}\n',
+        None,
+        recipients,
+    )
@@ -1,3 +1,1740 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import F, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image as PILImage
+from rest_framework.test import APIClient
+
+from .images import generate_derivatives
+from .jobs import WorkerPool, claim, drain, enqueue, requeue_stale, task
+from .db import delete_in_chunks
+from .exports import export_lines
+from .models import (ArchivedOrder, ArchivedOrderItem, Cart, CartItem, Category, DailyCategorySales, DailyProductSales,
+                     DailySales, IdempotencyKey, Job, Order, OrderItem, Product, ProductImage, StockReservation)
+from .pagination import estimated_row_count
+
+
+class APITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+
+class CatalogTestMixin:
+    def make_catalog(self, count=10, category=None):
+        category = category or Category.objects.create(name='Cement')
+        return [
+            Product.objects.create(
+                name=f'Product {i}',
+                description=f'Description {i}',
+                price=Decimal('100.00') + (i % 3),
+                stock=i,
+                category=category,
+            )
+            for i in range(count)
+        ]
+
+
+@override_settings(CATALOG_PAGE_SIZE=4, CATALOG_MAX_PAGE_SIZE=6)
+class KeysetPaginationTests(CatalogTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = self.make_catalog(10)
+
+    def walk(self, url):
+        ids, pages = [], 0
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(p['id'] for p in response.data['results'])
+            url = response.data['next']
+            pages += 1
+        return ids, pages
+
+    def test_walks_every_product_once_newest_first(self):
+        ids, pages = self.walk('/api/products/')
+        self.assertEqual(ids, [p.id for p in reversed(self.products)])
+        self.assertEqual(pages, 3)
+
+    def test_price_ordering_with_ties_is_stable(self):
+        ids, _ = self.walk('/api/products/?ordering=price')
+        expected = sorted(self.products, key=lambda p: (p.price, p.id))
+        self.assertEqual(ids, [p.id for p in expected])
+
+    def test_previous_cursor_returns_prior_page(self):
+        first = self.client.get('/api/products/').data
+        second = self.client.get(first['next']).data
+        self.assertIsNone(first['previous'])
+        back = self.client.get(second['previous']).data
+        self.assertEqual(
+            [p['id'] for p in back['results']],
+            [p['id'] for p in first['results']],
+        )
+        self.assertIsNone(back['previous'])
+
+    def test_page_size_is_capped(self):
+        response = self.client.get('/api/products/?page_size=50')
+        self.assertEqual(len(response.data['results']), 6)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/products/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+    def test_actions_are_paginated(self):
+        response = self.client.get('/api/products/in_stock/')
+        self.assertEqual(len(response.data['results']), 4)
+        self.assertIsNotNone(response.data['next'])
+
+
+class QueryBudgetTests(CatalogTestMixin, APITestCase):
+    """
+    Each endpoint must render in a fixed number of queries regardless of
+    how many rows the response contains.
+    """
+    def add_images(self, products, per_product=2):
+        for product in products:
+            for i in range(per_product):
+                ProductImage.objects.create(product=product, image=f'products/{product.id}-{i}.jpg')
+
+    def test_product_list(self):
+        # Page rows plus the facet aggregate
+        self.add_images(self.make_catalog(3))
+        with self.assertNumQueries(2):
+            self.client.get('/api/products/')
+        self.add_images(self.make_catalog(15))
+        with self.assertNumQueries(2):
+            self.client.get('/api/products/')
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/products/', {'expand': 'product_images'})
+        self.assertEqual(len(response.data['results'][0]['product_images']), 2)
+
+    def test_cart_list(self):
+        cart = Cart.objects.create(session_id='s1', user_id='u1')
+        for product in self.make_catalog(2):
+            CartItem.objects.create(cart=cart, product=product, quantity=2)
+        with self.assertNumQueries(2):
+            self.client.get('/api/cart/', {'user_id': 'u1'})
+        products = self.make_catalog(12)
+        self.add_images(products)
+        for product in products:
+            CartItem.objects.create(cart=cart, product=product, quantity=1)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/cart/', {'user_id': 'u1'})
+        self.assertEqual(len(response.data['items']), 14)
+        self.assertEqual(Decimal(response.data['total']), sum(
+            Decimal(item['subtotal']) for item in response.data['items']
+        ))
+
+    def test_cart_totals_in_sql(self):
+        cart = Cart.objects.create(session_id='s1')
+        empty = Cart.objects.create(session_id='s2')
+        for product in self.make_catalog(3):
+            CartItem.objects.create(cart=cart, product=product, quantity=3)
+        expected = sum(item.product.price * item.quantity for item in cart.items.all())
+        annotated = Cart.objects.with_totals().get(pk=cart.pk)
+        self.assertEqual(annotated.total, expected)
+        self.assertEqual(annotated.total, Cart.objects.get(pk=cart.pk).total)
+        self.assertEqual(Cart.objects.with_totals().get(pk=empty.pk).total, 0)
+
+    def test_admin_cart_changelist(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'a@example.com', 'pw'))
+        products = self.make_catalog(5)
+
+        def add_carts(n):
+            for _ in range(n):
+                cart = Cart.objects.create(session_id=f's{Cart.objects.count()}')
+                for product in products:
+                    CartItem.objects.create(cart=cart, product=product, quantity=2)
+
+        add_carts(1)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get('/admin/products/cart/')
+        add_carts(10)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get('/admin/products/cart/')
+        self.assertEqual(len(large), len(small))
+        self.assertContains(response, '₹1008.00', count=11)
+
+    def test_order_list(self):
+        def place(n):
+            order = Order.objects.create(
+                order_number=f'ORD-{Order.objects.count()}', user_id='u1',
+                full_name='A', phone='1', address='X', total_amount=Decimal('10'),
+            )
+            for i in range(n):
+                OrderItem.objects.create(order=order, product_name='P', product_price=Decimal('5'), quantity=2)
+
+        # ETag aggregate, live orders, archived orders, item prefetch
+        place(1)
+        with self.assertNumQueries(4):
+            self.client.get('/api/orders/', {'user_id': 'u1'})
+        for _ in range(10):
+            place(5)
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/orders/', {'user_id': 'u1'})
+        self.assertEqual(len(response.data['results']), 11)
+
+
+@override_settings(ORDER_HISTORY_PAGE_SIZE=4)
+class OrderHistoryTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        start = timezone.now() - timedelta(days=30)
+        self.orders = []
+        for i in range(10):
+            order = Order.objects.create(
+                order_number=f'ORD-{i}', user_id='u1', full_name='A', phone='1', address='X',
+                total_amount=Decimal('10'), status='delivered' if i % 2 else 'pending',
+            )
+            OrderItem.objects.create(order=order, product_name='P', product_price=Decimal('5'), quantity=2)
+            self.orders.append(order)
+        # One order a day, and a same-day tie between the last two
+        for i, order in enumerate(self.orders):
+            Order.objects.filter(pk=order.pk).update(created_at=start + timedelta(days=min(i, 8)))
+        Order.objects.create(order_number='OTHER', user_id='u2', full_name='B', phone='1', address='X',
+                             total_amount=Decimal('1'))
+
+    def walk(self, params):
+        numbers, url, pages = [], '/api/orders/', 0
+        params = {'user_id': 'u1', **params}
+        while url:
+            with self.assertNumQueries(4):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            numbers.extend(order['order_number'] for order in response.data['results'])
+            url, params, pages = response.data['next'], None, pages + 1
+        return numbers, pages
+
+    def test_pages_newest_first_in_constant_queries(self):
+        numbers, pages = self.walk({})
+        self.assertEqual(numbers, [f'ORD-{i}' for i in (9, 8, 7, 6, 5, 4, 3, 2, 1, 0)])
+        self.assertEqual(pages, 3)
+        numbers, _ = self.walk({'ordering': 'oldest'})
+        self.assertEqual(numbers, [f'ORD-{i}' for i in range(10)])
+
+    def test_status_and_date_filters(self):
+        numbers, _ = self.walk({'status': 'delivered'})
+        self.assertEqual(numbers, ['ORD-9', 'ORD-7', 'ORD-5', 'ORD-3', 'ORD-1'])
+        first = timezone.localdate(Order.objects.get(pk=self.orders[0].pk).created_at)
+        since, until = first + timedelta(days=2), first + timedelta(days=4)
+        numbers, _ = self.walk({'since': since.isoformat(), 'until': until.isoformat()})
+        self.assertEqual(numbers, ['ORD-4', 'ORD-3', 'ORD-2'])
+
+    def test_invalid_filters_are_rejected(self):
+        self.assertEqual(self.client.get('/api/orders/', {'user_id': 'u1', 'status': 'lost'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/orders/', {'user_id': 'u1', 'since': 'soon'}).status_code, 400)
+
+    def test_sparse_fields_page_without_extra_queries(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/orders/', {'user_id': 'u1', 'fields': 'order_number'})
+        self.assertEqual(response.data['results'][0], {'order_number': 'ORD-9'})
+        self.assertIsNotNone(response.data['next'])
+
+    def test_pages_revalidate_with_etags(self):
+        response = self.client.get('/api/orders/', {'user_id': 'u1'})
+        second = self.client.get(response.data['next'])
+        response = self.client.get(response.data['next'], HTTP_IF_NONE_MATCH=second['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+class CartMutationTests(CatalogTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = self.make_catalog(2)
+        # Adding to the cart holds stock, so keep plenty of it
+        Product.objects.update(stock=100)
+
+    def add(self, product, quantity=1):
+        return self.client.post('/api/cart/add_item/', {'product_id': product.id, 'quantity': quantity}, format='json')
+
+    def test_add_increments_existing_line(self):
+        self.add(self.products[0], 2)
+        response = self.add(self.products[0], 3)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['quantity'] for item in response.data['items']], [5])
+        self.assertEqual(CartItem.objects.get().quantity, 5)
+
+    def test_update_and_remove(self):
+        item_id = self.add(self.products[0]).data['items'][0]['id']
+        response = self.client.post('/api/cart/update_item/', {'item_id': item_id, 'quantity': 4}, format='json')
+        self.assertEqual(response.data['items'][0]['quantity'], 4)
+        response = self.client.post('/api/cart/update_item/', {'item_id': item_id, 'quantity': 0}, format='json')
+        self.assertEqual(response.data['items'], [])
+        response = self.client.post('/api/cart/remove_item/', {'item_id': item_id}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_delta_responses(self):
+        first, second = self.products
+        full = self.add(first, 2)
+        self.assertEqual(full.data['version'], 1)
+        response = self.client.post('/api/cart/add_item/?response=delta',
+                                    {'product_id': second.id, 'quantity': 3}, format='json')
+        self.assertEqual(set(response.data), {'id', 'total', 'version', 'item'})
+        self.assertEqual(response.data['version'], 2)
+        self.assertEqual(response.data['item']['product']['id'], second.id)
+        self.assertEqual(response.data['item']['quantity'], 3)
+        self.assertEqual(Decimal(response.data['total']), first.price * 2 + second.price * 3)
+
+        item_id = response.data['item']['id']
+        response = self.client.post('/api/cart/update_item/?response=delta',
+                                    {'item_id': item_id, 'quantity': 1}, format='json')
+        self.assertEqual((response.data['version'], response.data['item']['quantity']), (3, 1))
+        response = self.client.post('/api/cart/remove_item/?response=delta', {'item_id': item_id}, format='json')
+        self.assertEqual(response.data['item'], None)
+        self.assertEqual(response.data['removed_item_id'], item_id)
+        self.assertEqual(Decimal(response.data['total']), first.price * 2)
+        self.assertEqual(self.client.get('/api/cart/').data['version'], 4)
+
+    def test_session_cart_resolves_in_one_query(self):
+        self.add(self.products[0])
+        # Session row, cart with its total, lines
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/cart/')
+        self.assertEqual(len(response.data['items']), 1)
+
+    def test_login_attaches_anonymous_cart(self):
+        self.add(self.products[0])
+        response = self.client.get('/api/cart/', {'user_id': 'u1'})
+        self.assertEqual(response.data['user_id'], 'u1')
+        self.assertEqual(Cart.objects.get().user_id, 'u1')
+
+    def test_login_merges_anonymous_cart(self):
+        first, second = self.products
+        user_cart = Cart.objects.create(session_id='old-session', user_id='u1')
+        CartItem.objects.create(cart=user_cart, product=first, quantity=3)
+        self.add(first, 2)
+        self.add(second, 1)
+        response = self.client.get('/api/cart/', {'user_id': 'u1'})
+        self.assertEqual(response.data['id'], user_cart.id)
+        quantities = {item['product']['id']: item['quantity'] for item in response.data['items']}
+        self.assertEqual(quantities, {first.id: 5, second.id: 1})
+        self.assertEqual(Decimal(response.data['total']), first.price * 5 + second.price)
+        self.assertEqual(Cart.objects.count(), 1)
+        # The session now follows the user's cart
+        self.assertEqual(self.client.get('/api/cart/').data['id'], user_cart.id)
+
+    def test_batch_operations(self):
+        first, second = self.products
+        self.add(first, 1)
+        response = self.client.post('/api/cart/batch/', {'operations': [
+            {'op': 'add', 'product_id': first.id, 'quantity': 2},
+            {'op': 'set', 'product_id': second.id, 'quantity': 5},
+            {'op': 'add', 'product_id': 999999},
+            {'op': 'remove', 'product_id': second.id},
+            {'op': 'set', 'product_id': second.id, 'quantity': 4},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(r['status'], r.get('quantity')) for r in response.data['results']],
+            [('ok', 3), ('ok', 5), ('error', None), ('ok', 0), ('ok', 4)],
+        )
+        quantities = {item['product']['id']: item['quantity'] for item in response.data['cart']['items']}
+        self.assertEqual(quantities, {first.id: 3, second.id: 4})
+        self.assertEqual(Decimal(response.data['cart']['total']), first.price * 3 + second.price * 4)
+
+    def test_batch_rejects_malformed_operations(self):
+        for operations in ([], [{'op': 'bump', 'product_id': 1}], [{'op': 'add'}],
+                           [{'op': 'set', 'product_id': 1, 'quantity': -1}]):
+            response = self.client.post('/api/cart/batch/', {'operations': operations}, format='json')
+            self.assertEqual(response.status_code, 400, operations)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_batch_query_count_does_not_grow_with_operations(self):
+        products = self.make_catalog(30)
+        Product.objects.update(stock=100)
+
+        def batch(items):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post('/api/cart/batch/', {'operations': [
+                    {'op': 'add', 'product_id': p.id, 'quantity': 2} for p in items
+                ]}, format='json')
+            return len(queries)
+
+        self.add(self.products[0])
+        self.assertEqual(batch(products[:2]), batch(products[2:]))
+        self.assertEqual(CartItem.objects.count(), 31)
+
+    def test_reorder(self):
+        first, second = self.products
+        order = Order.objects.create(
+            order_number='ORD-1', user_id='u1', full_name='A', phone='1',
+            address='X', total_amount=Decimal('10'),
+        )
+        OrderItem.objects.create(order=order, product=first, product_name='P', product_price=first.price, quantity=2)
+        OrderItem.objects.create(order=order, product=None, product_name='Gone', product_price=1, quantity=1)
+        OrderItem.objects.create(order=order, product=second, product_name='Q', product_price=second.price, quantity=7)
+        response = self.client.post('/api/cart/reorder/', {'order_number': 'ORD-1', 'user_id': 'u2'}, format='json')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post('/api/cart/reorder/', {'order_number': 'ORD-1', 'user_id': 'u1'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        quantities = {item['product']['id']: item['quantity'] for item in response.data['cart']['items']}
+        self.assertEqual(quantities, {first.id: 2, second.id: 7})
+
+
+@override_settings(CART_STORE='products.cart_storage.CacheCartStore')
+class CacheCartStoreTests(CatalogTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = self.make_catalog(3)
+        # Adding to the cart holds stock, so keep plenty of it
+        Product.objects.update(stock=100)
+
+    def post(self, action, data, **params):
+        query = f'?{"&".join(f"{k}={v}" for k, v in params.items())}' if params else ''
+        return self.client.post(f'/api/cart/{action}/{query}', data, format='json')
+
+    def test_anonymous_cart_writes_nothing_to_the_cart_tables(self):
+        first, second, third = self.products
+        self.post('add_item', {'product_id': first.id, 'quantity': 2})
+        response = self.post('add_item', {'product_id': second.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['version'], 2)
+        self.assertEqual(Decimal(response.data['total']), first.price * 2 + second.price)
+
+        response = self.post('update_item', {'item_id': first.id, 'quantity': 5}, response='delta')
+        self.assertEqual(response.data['item']['quantity'], 5)
+        self.assertEqual(Decimal(response.data['total']), first.price * 5 + second.price)
+        response = self.post('remove_item', {'item_id': second.id})
+        self.assertEqual([item['product']['id'] for item in response.data['items']], [first.id])
+        response = self.post('batch', {'operations': [
+            {'op': 'add', 'product_id': third.id, 'quantity': 1},
+            {'op': 'remove', 'item_id': 999999},
+        ]})
+        self.assertEqual([r['status'] for r in response.data['results']], ['ok', 'error'])
+        self.assertEqual(len(self.client.get('/api/cart/').data['items']), 2)
+        self.assertEqual(self.post('remove_item', {'item_id': second.id}).status_code, 404)
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(CartItem.objects.exists())
+        # Stock holds are still kept in the database
+        self.assertEqual(dict(StockReservation.objects.values_list('product_id', 'quantity')),
+                         {first.id: 5, third.id: 1})
+
+    def test_login_persists_and_merges_the_anonymous_cart(self):
+        first, second, _ = self.products
+        user_cart = Cart.objects.create(session_id='old-session', user_id='u1')
+        CartItem.objects.create(cart=user_cart, product=first, quantity=1)
+        self.post('add_item', {'product_id': first.id, 'quantity': 2})
+        self.post('add_item', {'product_id': second.id, 'quantity': 4})
+        response = self.client.get('/api/cart/', {'user_id': 'u1'})
+        self.assertEqual(response.data['id'], user_cart.id)
+        quantities = {item['product']['id']: item['quantity'] for item in response.data['items']}
+        self.assertEqual(quantities, {first.id: 3, second.id: 4})
+        self.assertEqual(self.client.get('/api/cart/').data['id'], user_cart.id)
+
+    def test_checkout_from_an_anonymous_cart(self):
+        first = self.products[2]
+        self.post('add_item', {'product_id': first.id, 'quantity': 2})
+        response = self.post('place_order', {
+            'user_id': 'u9', 'user_email': 'u9@example.com', 'full_name': 'A',
+            'phone': '1', 'address': 'X',
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.data['total_amount']), first.price * 2)
+        self.assertEqual(Cart.objects.get().user_id, 'u9')
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_cart_stores', '--sessions', '3', '--adds', '2', stdout=out)
+        rows = {line.split()[0]: line.split() for line in out.getvalue().splitlines()[1:]}
+        self.assertEqual(set(rows), {'orm', 'cache'})
+        self.assertLess(int(rows['cache'][3]), int(rows['orm'][3]))
+        self.assertFalse(Cart.objects.exists())
+
+
+class PurgeCartsTests(CatalogTestMixin, TestCase):
+    def make_cart(self, session_id, idle_days, user_id=None):
+        cart = Cart.objects.create(session_id=session_id, user_id=user_id)
+        for product in self.products:
+            CartItem.objects.create(cart=cart, product=product)
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now() - timedelta(days=idle_days))
+        return cart
+
+    def test_purges_idle_carts_in_chunks(self):
+        from django.contrib.sessions.models import Session
+
+        self.products = self.make_catalog(2)
+        for i in range(5):
+            self.make_cart(f'old-{i}', idle_days=40)
+        fresh = self.make_cart('fresh', idle_days=1)
+        kept_user = self.make_cart('user-recent', idle_days=40, user_id='u1')
+        self.make_cart('user-old', idle_days=400, user_id='u2')
+        Session.objects.create(session_key='expired', session_data='', expire_date=timezone.now() - timedelta(days=1))
+        Session.objects.create(session_key='live', session_data='', expire_date=timezone.now() + timedelta(days=1))
+
+        out = StringIO()
+        call_command('purge_carts', '--dry-run', stdout=out)
+        self.assertIn('would purge 5 anonymous and 1 user carts', out.getvalue())
+        self.assertEqual(Cart.objects.count(), 8)
+
+        out = StringIO()
+        call_command('purge_carts', '--chunk-size', '2', stdout=out)
+        self.assertEqual(set(Cart.objects.values_list('pk', flat=True)), {fresh.pk, kept_user.pk})
+        self.assertEqual(CartItem.objects.count(), 4)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['live'])
+        # 5 anonymous carts in 3 chunks, 1 user cart, 1 session: 18 cart rows + 1 session
+        self.assertIn('Purged 19 rows in 5 chunks', out.getvalue())
+
+
+    def test_a_cart_used_mid_purge_is_kept(self):
+        self.products = self.make_catalog(1)
+        cart = self.make_cart('old', idle_days=40)
+        atomic = transaction.atomic
+
+        def touch_then_delete(*args, **kwargs):
+            # The visitor comes back between the id select and the delete
+            Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+            return atomic(*args, **kwargs)
+
+        with mock.patch('products.db.transaction.atomic', side_effect=touch_then_delete):
+            rows, _ = delete_in_chunks(Cart.objects.filter(updated_at__lt=timezone.now() - timedelta(days=30)), 10)
+        self.assertEqual(rows, 0)
+        self.assertTrue(Cart.objects.filter(pk=cart.pk).exists())
+
+
+class CheckoutTests(CatalogTestMixin, APITestCase):
+    details = {'user_id': 'u1', 'user_email': 'u1@example.com', 'full_name': 'A', 'phone': '1', 'address': 'X'}
+
+    def setUp(self):
+        super().setUp()
+        self.products = self.make_catalog(6)
+        self.cart = Cart.objects.create(session_id='s1', user_id='u1')
+
+    def checkout(self):
+        return self.client.post('/api/cart/place_order/', self.details, format='json')
+
+    def test_places_order_and_takes_stock(self):
+        lines = {self.products[3]: 2, self.products[5]: 5}
+        for product, quantity in lines.items():
+            CartItem.objects.create(cart=self.cart, product=product, quantity=quantity)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.data['total_amount']),
+                         sum(product.price * quantity for product, quantity in lines.items()))
+        self.assertEqual(len(response.data['items']), 2)
+        self.assertEqual(Product.objects.get(pk=self.products[3].pk).stock, 1)
+        self.assertEqual(Product.objects.get(pk=self.products[5].pk).stock, 0)
+        self.assertFalse(self.cart.items.exists())
+
+    def test_insufficient_stock_writes_nothing(self):
+        CartItem.objects.create(cart=self.cart, product=self.products[5], quantity=2)
+        CartItem.objects.create(cart=self.cart, product=self.products[1], quantity=3)
+        CartItem.objects.create(cart=self.cart, product=self.products[2], quantity=4)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            [(line['product_id'], line['requested'], line['available']) for line in response.data['lines']],
+            [(self.products[1].id, 3, 1), (self.products[2].id, 4, 2)],
+        )
+        self.assertEqual(Product.objects.get(pk=self.products[5].pk).stock, 5)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.cart.items.count(), 3)
+
+
+class StockHoldTests(CatalogTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = self.make_catalog(6)[5]
+
+    def add(self, client, quantity):
+        return client.post('/api/cart/add_item/', {'product_id': self.product.id, 'quantity': quantity}, format='json')
+
+    def reserved(self):
+        return Product.objects.get(pk=self.product.pk).reserved
+
+    def test_adds_hold_stock_and_other_carts_see_it(self):
+        other = APIClient()
+        self.assertEqual(self.add(self.client, 3).status_code, 200)
+        self.assertEqual(self.reserved(), 3)
+        response = self.add(other, 3)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['lines'][0]['available'], 2)
+        self.assertEqual(self.add(other, 2).status_code, 200)
+        response = self.client.get('/api/stock/', {'ids': str(self.product.id)})
+        self.assertEqual(response.data[str(self.product.id)], {'stock': 5, 'reserved': 5, 'available': 0})
+
+    def test_update_and_remove_adjust_the_hold(self):
+        item_id = self.add(self.client, 2).data['items'][0]['id']
+        self.client.post('/api/cart/update_item/', {'item_id': item_id, 'quantity': 4}, format='json')
+        self.assertEqual(self.reserved(), 4)
+        response = self.client.post('/api/cart/update_item/', {'item_id': item_id, 'quantity': 6}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(CartItem.objects.get(pk=item_id).quantity, 4)
+        self.client.post('/api/cart/remove_item/', {'item_id': item_id}, format='json')
+        self.assertEqual(self.reserved(), 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_batches_cannot_hold_more_than_the_stock(self):
+        other = Product.objects.exclude(pk=self.product.pk).get(stock=1)
+        self.add(self.client, 2)
+        response = self.client.post('/api/cart/batch/', {'operations': [
+            {'op': 'set', 'product_id': self.product.id, 'quantity': 50},
+            {'op': 'add', 'product_id': other.id, 'quantity': 1},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        refused, added = response.data['results']
+        self.assertEqual((refused['status'], refused['available']), ('error', 5))
+        self.assertEqual((added['status'], added['quantity']), ('ok', 1))
+        self.assertEqual(response.data['unavailable'][0]['requested'], 50)
+        # The short line keeps its held quantity; the rest of the batch applies
+        self.assertEqual(CartItem.objects.get(product=self.product).quantity, 2)
+        self.assertEqual(self.reserved(), 2)
+        self.assertEqual(Product.objects.get(pk=other.pk).reserved, 1)
+
+        with override_settings(CART_STORE='products.cart_storage.CacheCartStore'):
+            anonymous = APIClient()
+            response = anonymous.post('/api/cart/batch/', {'operations': [
+                {'op': 'add', 'product_id': self.product.id, 'quantity': 4},
+            ]}, format='json')
+            self.assertEqual(response.data['results'][0]['available'], 3)
+            self.assertEqual(anonymous.get('/api/cart/').data['items'], [])
+        self.assertEqual(self.reserved(), 2)
+
+    def test_catalog_responses_leave_live_holds_to_the_stock_endpoint(self):
+        self.client.get(f'/api/products/{self.product.id}/')
+        self.add(self.client, 2)
+        response = self.client.get(f'/api/products/{self.product.id}/')
+        self.assertNotIn('reserved', response.data)
+        self.assertNotIn('reserved', self.client.get('/api/products/', {'expand': 'description'}).data['results'][0])
+        self.assertEqual(self.client.get('/api/stock/', {'ids': str(self.product.id)}).data[str(self.product.id)]['reserved'], 2)
+
+    def test_invalid_quantities_leave_the_hold_alone(self):
+        item_id = self.add(self.client, 3).data['items'][0]['id']
+        for quantity in (-2, 0, 'two'):
+            self.assertEqual(self.add(self.client, quantity).status_code, 400)
+        response = self.client.post('/api/cart/update_item/', {'item_id': item_id, 'quantity': -1}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.reserved(), 3)
+        self.assertEqual(CartItem.objects.get(pk=item_id).quantity, 3)
+
+    def test_failed_cart_write_rolls_back_the_hold(self):
+        item_id = self.add(self.client, 3).data['items'][0]['id']
+        with mock.patch('products.cart_storage.ORMCartStore.add', side_effect=RuntimeError('disk full')):
+            self.assertEqual(self.add(self.client, 1).status_code, 400)
+        with mock.patch('products.cart_storage.ORMCartStore.set_quantity', return_value=False):
+            response = self.client.post('/api/cart/update_item/', {'item_id': item_id, 'quantity': 1}, format='json')
+            self.assertEqual(response.status_code, 404)
+        with mock.patch('products.cart_storage.ORMCartStore.remove', return_value=False):
+            self.client.post('/api/cart/remove_item/', {'item_id': item_id}, format='json')
+        self.assertEqual(self.reserved(), 3)
+        self.assertEqual(StockReservation.objects.get().quantity, 3)
+
+    def test_expired_holds_are_released(self):
+        self.add(self.client, 5)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        # A short add sweeps lapsed holds on the product before giving up
+        self.assertEqual(self.add(APIClient(), 4).status_code, 200)
+        self.assertEqual(self.reserved(), 4)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+        out = StringIO()
+        call_command('release_expired_holds', stdout=out)
+        self.assertIn('Released 1 expired holds', out.getvalue())
+        self.assertEqual(self.reserved(), 0)
+
+    def test_recount_repairs_drift(self):
+        self.add(self.client, 2)
+        Product.objects.filter(pk=self.product.pk).update(reserved=5)
+        call_command('release_expired_holds', '--recount', stdout=StringIO())
+        self.assertEqual(self.reserved(), 2)
+
+    def test_start_checkout_holds_the_cart_and_checkout_consumes_it(self):
+        self.add(self.client, 2)
+        StockReservation.objects.all().delete()
+        Product.objects.filter(pk=self.product.pk).update(reserved=0)
+        response = self.client.post('/api/cart/start_checkout/', format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['holds'], [{'product_id': self.product.id, 'quantity': 2}])
+        self.assertEqual(self.reserved(), 2)
+        response = self.client.post('/api/cart/place_order/', {
+            'user_id': 'u1', 'user_email': 'u1@example.com', 'full_name': 'A', 'phone': '1', 'address': 'X',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((product.stock, product.reserved), (3, 0))
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_start_checkout_reports_lines_it_cannot_hold(self):
+        self.add(self.client, 4)
+        Product.objects.filter(pk=self.product.pk).update(stock=F('stock') - 3)
+        StockReservation.objects.all().delete()
+        Product.objects.filter(pk=self.product.pk).update(reserved=0)
+        response = self.client.post('/api/cart/start_checkout/', format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['lines'][0]['available'], 2)
+
+    def test_stock_endpoint_validates_ids(self):
+        self.assertEqual(self.client.get('/api/stock/', {'ids': 'a,b'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/stock/').status_code, 400)
+
+
+class StockHoldConcurrencyTests(TransactionTestCase):
+    def test_parallel_holds_never_exceed_stock(self):
+        from .inventory import InsufficientStock, hold
+
+        category = Category.objects.create(name='Cement')
+        product = Product.objects.create(name='P', price=Decimal('10'), stock=20, category=category)
+        outcomes = []
+        barrier = threading.Barrier(12)
+
+        def worker(holder):
+            barrier.wait()
+            try:
+                for _ in range(200):
+                    try:
+                        hold(holder, product.pk, 3)
+                        outcomes.append('ok')
+                        return
+                    except InsufficientStock:
+                        outcomes.append('short')
+                        return
+                    except OperationalError:
+                        time.sleep(0.005)
+                outcomes.append('gave up')
+            finally:
+                connection.close()
+
+        pool = [threading.Thread(target=worker, args=(f's{i}',)) for i in range(12)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+
+        self.assertEqual(sorted(outcomes), ['ok'] * 6 + ['short'] * 6)
+        self.assertEqual(Product.objects.get(pk=product.pk).reserved, 18)
+        self.assertEqual(StockReservation.objects.aggregate(total=Sum('quantity'))['total'], 18)
+
+
+class IdempotencyTests(CatalogTestMixin, APITestCase):
+    details = {'user_id': 'u1', 'user_email': 'u1@example.com', 'full_name': 'A', 'phone': '1', 'address': 'X'}
+
+    def setUp(self):
+        super().setUp()
+        self.product = self.make_catalog(6)[5]
+
+    def post(self, action, data, key='k1'):
+        return self.client.post(f'/api/cart/{action}/', data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def add(self, key='k1', quantity=2, user_id='u1'):
+        return self.post('add_item', {'product_id': self.product.id, 'quantity': quantity, 'user_id': user_id}, key)
+
+    def test_retried_add_is_replayed_not_repeated(self):
+        first = self.add()
+        retry = self.add()
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(CartItem.objects.get().quantity, 2)
+        self.add(key='k2')
+        self.assertEqual(CartItem.objects.get().quantity, 4)
+
+    def test_retried_checkout_places_one_order(self):
+        self.add()
+        first = self.post('place_order', self.details, key='order-1')
+        retry = self.post('place_order', self.details, key='order-1')
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json()['order_number'], first.json()['order_number'])
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 3)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.add()
+        self.assertEqual(self.add(quantity=3).status_code, 422)
+        self.assertEqual(CartItem.objects.get().quantity, 2)
+
+    def test_keys_are_scoped_per_user(self):
+        self.add()
+        other = APIClient()
+        response = other.post('/api/cart/add_item/', {'product_id': self.product.id, 'quantity': 2, 'user_id': 'u2'},
+                              format='json', HTTP_IDEMPOTENCY_KEY='k1')
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(CartItem.objects.count(), 2)
+
+    def test_duplicate_waits_for_the_request_in_flight(self):
+        now = timezone.now()
+        row = IdempotencyKey.objects.create(
+            scope='user:u1', key='k1', fingerprint=self.fingerprint(),
+            created_at=now, expires_at=now + timedelta(hours=1),
+        )
+
+        def first_request_finishes(seconds):
+            IdempotencyKey.objects.filter(pk=row.pk).update(status_code=200, response_body={'done': True})
+
+        with mock.patch('products.idempotency.time.sleep', side_effect=first_request_finishes) as sleep:
+            response = self.add()
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(response.json(), {'done': True})
+        self.assertFalse(CartItem.objects.exists())
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    def test_duplicate_gives_up_while_in_flight_and_takes_over_when_stale(self):
+        now = timezone.now()
+        row = IdempotencyKey.objects.create(
+            scope='user:u1', key='k1', fingerprint=self.fingerprint(),
+            created_at=now, expires_at=now + timedelta(hours=1),
+        )
+        response = self.add()
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(CartItem.objects.exists())
+        IdempotencyKey.objects.filter(pk=row.pk).update(created_at=now - timedelta(minutes=5))
+        self.assertEqual(self.add().status_code, 200)
+        self.assertEqual(CartItem.objects.get().quantity, 2)
+
+    def test_purge_command_deletes_expired_keys(self):
+        self.add()
+        self.add(key='k2')
+        IdempotencyKey.objects.filter(key='k1').update(expires_at=timezone.now() - timedelta(seconds=1))
+        out = StringIO()
+        call_command('purge_idempotency_keys', '--chunk-size', '1', stdout=out)
+        self.assertIn('Purged 1 idempotency keys', out.getvalue())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['k2'])
+
+    def fingerprint(self):
+        """The fingerprint ``add()`` sends, captured from a throwaway key."""
+        self.add(key='probe')
+        row = IdempotencyKey.objects.get(key='probe')
+        CartItem.objects.all().delete()
+        row.delete()
+        return row.fingerprint
+
+
+flaky_calls = []
+
+
+@task('tests.flaky', max_attempts=3)
+def flaky(fail_times):
+    flaky_calls.append(fail_times)
+    if len(flaky_calls) <= fail_times:
+        raise RuntimeError('supplier API down')
+
+
+@override_settings(STAFF_NOTIFICATION_EMAILS=['desk@example.com'])
+class JobQueueTests(CatalogTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        flaky_calls.clear()
+
+    def test_checkout_queues_emails_with_the_order(self):
+        product = self.make_catalog(6)[5]
+        cart = Cart.objects.create(session_id='s1', user_id='u1')
+        CartItem.objects.create(cart=cart, product=product, quantity=9)
+        details = {'user_id': 'u1', 'user_email': 'u1@example.com', 'full_name': 'A', 'phone': '1', 'address': 'X'}
+        self.assertEqual(self.client.post('/api/cart/place_order/', details, format='json').status_code, 409)
+        self.assertFalse(Job.objects.exists())
+
+        CartItem.objects.filter(cart=cart).update(quantity=2)
+        self.assertEqual(self.client.post('/api/cart/place_order/', details, format='json').status_code, 201)
+        self.assertEqual(sorted(Job.objects.values_list('task', flat=True)), ['order_confirmation', 'order_notification'])
+        # Nothing is sent inside the request
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(drain(), {'done': 2, 'queued': 0, 'dead': 0})
+        order = Order.objects.get()
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['desk@example.com', 'u1@example.com'])
+        confirmation = next(message for message in mail.outbox if message.to == ['u1@example.com'])
+        self.assertIn(order.order_number, confirmation.subject)
+        self.assertIn(f'2 x {product.name}', confirmation.body)
+
+    def test_contact_submission_queues_acknowledgement(self):
+        response = self.client.post('/api/contact/', {
+            'name': 'Ravi', 'email': 'ravi@example.com', 'subject': 'product', 'message': 'Need 40 bags',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Job.objects.count(), 2)
+        drain()
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['desk@example.com', 'ravi@example.com'])
+
+    @override_settings(JOB_RETRY_BASE_SECONDS=10)
+    def test_failures_retry_with_backoff_then_dead_letter(self):
+        job = enqueue('tests.flaky', fail_times=5)
+        self.assertEqual(drain(), {'done': 0, 'queued': 1, 'dead': 0})
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertIn('supplier API down', job.last_error)
+        delay = (job.run_at - timezone.now()).total_seconds()
+        self.assertTrue(7 < delay <= 12, delay)
+        # Not due yet
+        self.assertEqual(drain(), {'done': 0, 'queued': 0, 'dead': 0})
+
+        for attempt in (2, 3):
+            Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+            drain()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('dead', 3))
+        self.assertEqual(len(flaky_calls), 3)
+
+        self.client.force_login(User.objects.create_superuser('admin', 'a@example.com', 'pw'))
+        self.client.post('/admin/products/job/', {'action': 'retry_jobs', '_selected_action': [job.pk]})
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 0))
+
+    def test_retry_succeeds(self):
+        job = enqueue('tests.flaky', fail_times=1)
+        drain()
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertEqual(drain(), {'done': 1, 'queued': 0, 'dead': 0})
+
+    def test_a_claimed_job_is_not_claimed_again(self):
+        enqueue('tests.flaky', fail_times=0)
+        self.assertEqual(len(claim('a', 10)), 1)
+        self.assertEqual(claim('b', 10), [])
+        self.assertEqual(requeue_stale(), 0)
+        # The worker holding it is presumed lost once the lock times out
+        with override_settings(JOB_LOCK_TIMEOUT=-1):
+            self.assertEqual(requeue_stale(), 1)
+        self.assertEqual(len(claim('b', 10)), 1)
+
+
+ran_jobs = []
+
+
+@task('tests.record')
+def record(n):
+    ran_jobs.append(n)
+
+
+class WorkerPoolTests(TransactionTestCase):
+    def test_threads_run_every_job_exactly_once(self):
+        ran_jobs.clear()
+        for n in range(60):
+            enqueue('tests.record', n=n)
+        pool = WorkerPool(threads=4, batch=5, burst=True)
+        stats = pool.run()
+        self.assertEqual(sorted(ran_jobs), list(range(60)))
+        self.assertEqual(stats['done'], 60)
+        self.assertEqual(Job.objects.filter(status='done').count(), 60)
+
+    def test_run_workers_command_reports_throughput(self):
+        for n in range(5):
+            enqueue('tests.record', n=n)
+        out = StringIO()
+        call_command('run_workers', '--burst', '--threads', '2', stdout=out)
+        self.assertIn('5 jobs in', out.getvalue())
+        self.assertIn('5 done', out.getvalue())
+        self.assertIn('Queue: 0 queued', out.getvalue())
+
+
+class SalesTestMixin(CatalogTestMixin):
+    def setUp(self):
+        super().setUp()
+        self.cement = self.make_catalog(3)
+        self.steel = self.make_catalog(3, category=Category.objects.create(name='Steel'))
+        Product.objects.update(stock=100)
+
+    def place(self, user_id, lines):
+        from .checkout import place_order
+
+        cart = Cart.objects.create(session_id=f'cart-{user_id}-{Cart.objects.count()}', user_id=user_id)
+        for product, quantity in lines:
+            CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+        return place_order(cart, {'user_id': user_id, 'full_name': 'A', 'phone': '1', 'address': 'X'})
+
+    def snapshot(self):
+        fields = ('day', 'status', 'orders', 'units', 'revenue')
+        return [
+            sorted(model.objects.exclude(orders=0).values_list(*fields, *extra))
+            for model, extra in ((DailySales, ()), (DailyProductSales, ('product_id',)),
+                                 (DailyCategorySales, ('category_id',)))
+        ]
+
+
+class SalesRollupTests(SalesTestMixin, APITestCase):
+    def test_rollups_follow_orders_and_match_a_rebuild(self):
+        first = self.place('u1', [(self.cement[0], 2), (self.cement[1], 1), (self.steel[0], 4)])
+        self.place('u2', [(self.cement[0], 3)])
+        daily = DailySales.objects.get(status='pending')
+        self.assertEqual((daily.orders, daily.units), (2, 10))
+        self.assertEqual(daily.revenue, Order.objects.aggregate(total=Sum('total_amount'))['total'])
+        cement = DailyCategorySales.objects.get(category_id=self.cement[0].category_id)
+        # Two cement lines in one order still count as one order
+        self.assertEqual((cement.orders, cement.units), (2, 6))
+
+        first.status = 'shipped'
+        first.save()
+        self.assertEqual(DailySales.objects.get(status='shipped').orders, 1)
+        self.assertEqual(DailySales.objects.get(status='pending').orders, 1)
+        Order.objects.filter(user_id='u2').delete()
+
+        incremental = self.snapshot()
+        out = StringIO()
+        call_command('rebuild_sales_rollups', stdout=out)
+        self.assertIn('1 orders into', out.getvalue())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_analytics_endpoint_reads_only_rollups(self):
+        self.place('u1', [(self.cement[0], 2), (self.steel[1], 1)])
+        cancelled = self.place('u2', [(self.steel[2], 9)])
+        cancelled.status = 'cancelled'
+        cancelled.save()
+        self.assertEqual(self.client.get('/api/analytics/sales/').status_code, 403)
+
+        self.client.force_login(User.objects.create_superuser('admin', 'a@example.com', 'pw'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/analytics/sales/', {'group': 'product'})
+        self.assertFalse([q for q in queries.captured_queries if 'products_order' in q['sql']])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['totals']['orders'], 1)
+        self.assertEqual([row['product_id'] for row in response.data['rows']], [self.cement[0].id, self.steel[1].id])
+        self.assertEqual(response.data['rows'][0]['revenue'], Decimal('200.00'))
+
+        response = self.client.get('/api/analytics/sales/', {'group': 'status', 'status': 'cancelled'})
+        self.assertEqual([(row['status'], row['units']) for row in response.data['rows']], [('cancelled', 9)])
+        self.assertEqual(self.client.get('/api/analytics/sales/', {'group': 'week'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/analytics/sales/', {'since': 'yesterday'}).status_code, 400)
+
+    def test_admin_dashboard(self):
+        self.place('u1', [(self.cement[0], 2)])
+        self.client.force_login(User.objects.create_superuser('admin', 'a@example.com', 'pw'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/products/dailysales/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in queries.captured_queries if 'products_order' in q['sql']])
+        self.assertContains(response, 'Top products')
+        self.assertContains(response, '<strong>₹200.00</strong> revenue', html=False)
+
+
+class AdminChangelistTests(CatalogTestMixin, TestCase):
+    def setUp(self):
+        self.products = self.make_catalog(5)
+        self.client.force_login(User.objects.create_superuser('admin', 'a@example.com', 'pw'))
+
+    def add_rows(self, count):
+        for i in range(count):
+            n = Order.objects.count()
+            order = Order.objects.create(
+                order_number=f'ORD-20260101-{n:08X}', user_email=f'buyer{n}@example.com', full_name='Buyer',
+                phone=f'98{n:08d}', address='Site', total_amount=Decimal('300.00'),
+            )
+            cart = Cart.objects.create(session_id=f'session-{n}', user_email=f'buyer{n}@example.com')
+            for product in self.products[:3]:
+                OrderItem.objects.create(order=order, product=product, product_name=product.name,
+                                         product_price=product.price, quantity=1)
+                CartItem.objects.create(cart=cart, product=product, quantity=2)
+            Product.objects.create(name=f'Extra {n}', description='', price=Decimal('5.00'), stock=1,
+                                   category=self.products[0].category)
+
+    def changelist(self, url, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl'], len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        urls = ('/admin/products/order/', '/admin/products/cart/', '/admin/products/product/')
+        self.add_rows(2)
+        before = [self.changelist(url)[1] for url in urls]
+        self.add_rows(10)
+        self.assertEqual([self.changelist(url)[1] for url in urls], before)
+        # Session, user, statistics lookup (in a savepoint), capped count, page rows, item prefetch
+        self.assertLessEqual(before[0], 9)
+
+    def test_order_search_matches_prefixes(self):
+        self.add_rows(3)
+        results = lambda term: sorted(self.changelist('/admin/products/order/', q=term)[0].result_list,
+                                      key=lambda order: order.pk)
+        orders = list(Order.objects.order_by('pk'))
+        self.assertEqual(results('ord-20260101-00000001'), [orders[1]])
+        self.assertEqual(results('BUYER2@'), [orders[2]])
+        self.assertEqual(results('9800000000'), [orders[0]])
+        # Not a prefix of anything
+        self.assertEqual(results('example.com'), [])
+
+    def test_mixed_case_emails_are_found(self):
+        order = Order.objects.create(order_number='ORD-1', user_email='Ravi.Kumar@Example.COM', full_name='Ravi',
+                                     phone='1', address='Site', total_amount=Decimal('10'))
+        cart = Cart.objects.create(session_id='s-mixed', user_email='Ravi.Kumar@Example.COM')
+        self.assertEqual(order.user_email, 'ravi.kumar@example.com')
+        for term in ('Ravi.Kumar', 'ravi.kumar@example', 'RAVI'):
+            self.assertEqual(list(self.changelist('/admin/products/order/', q=term)[0].result_list), [order])
+            self.assertEqual(list(self.changelist('/admin/products/cart/', q=term)[0].result_list), [cart])
+
+        # Rows stored as entered before the field lower-cased them
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE products_order SET user_email = 'Old.Buyer@Example.com'")
+        import_module('products.migrations.0026_lowercase_emails').lowercase_emails(django_apps, None)
+        self.assertEqual(list(self.changelist('/admin/products/order/', q='old.buyer')[0].result_list), [order])
+
+    def test_product_search_uses_the_search_index(self):
+        call_command('rebuild_search_index', stdout=StringIO())
+        cl, _ = self.changelist('/admin/products/product/', q='descr')
+        self.assertEqual(cl.result_count, 5)
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=5)
+    def test_large_tables_are_not_counted_exactly(self):
+        self.add_rows(8)
+        with mock.patch('products.pagination.estimated_row_count', return_value=250000):
+            self.assertEqual(self.changelist('/admin/products/order/')[0].result_count, 250000)
+            # Filtered lists count up to the limit
+            self.assertEqual(self.changelist('/admin/products/order/', status__exact='pending')[0].result_count, 5)
+        with mock.patch('products.pagination.estimated_row_count', return_value=None):
+            self.assertEqual(self.changelist('/admin/products/order/')[0].result_count, 5)
+
+    def test_estimated_row_count_reads_sqlite_statistics(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('sqlite_stat1 is SQLite only')
+        self.add_rows(4)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(estimated_row_count(Order), 4)
+
+
+@override_settings(ORDER_ARCHIVE_AFTER_DAYS=90)
+class OrderArchiveTests(SalesTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.orders = [self.place('u1', [(self.cement[i % 3], i + 1), (self.steel[0], 1)]) for i in range(6)]
+        for order, status in zip(self.orders, ('delivered', 'cancelled', 'delivered', 'pending', 'shipped')):
+            order.status = status
+            order.save()
+        # The first four finished or stalled long ago; the fifth was delivered recently
+        Order.objects.filter(pk__in=[order.pk for order in self.orders[:4]]).update(
+            updated_at=timezone.now() - timedelta(days=120))
+        self.orders[4].status = 'delivered'
+        self.orders[4].save()
+
+    def archive(self, *args):
+        out = StringIO()
+        call_command('archive_orders', *args, stdout=out)
+        return out.getvalue()
+
+    def history(self):
+        results, url, params = [], '/api/orders/', {'user_id': 'u1', 'page_size': 2}
+        while url:
+            response = self.client.get(url, params)
+            results.extend(response.data['results'])
+            url, params = response.data['next'], None
+        return results
+
+    def test_moves_old_finished_orders_in_chunks(self):
+        old = self.orders[:3]
+        before = list(Order.objects.filter(pk__in=[o.pk for o in old]).order_by('pk').values_list(
+            'id', 'order_number', 'total_amount', 'status', 'created_at', 'updated_at'))
+        output = self.archive('--chunk-size', '2')
+        self.assertIn('Archived 3 orders and 6 items in 2 chunks', output)
+        self.assertIn('rows/sec', output)
+        self.assertEqual(list(ArchivedOrder.objects.order_by('pk').values_list(
+            'id', 'order_number', 'total_amount', 'status', 'created_at', 'updated_at')), before)
+        self.assertEqual(ArchivedOrderItem.objects.count(), 6)
+        # Pending, shipped and recently delivered orders stay live
+        self.assertEqual(set(Order.objects.values_list('pk', flat=True)), {o.pk for o in self.orders[3:]})
+        self.assertFalse(OrderItem.objects.filter(order_id__in=[o.pk for o in old]).exists())
+        self.assertIn('Archived 0 orders', self.archive())
+
+    def test_history_reads_archived_orders_transparently(self):
+        before = self.history()
+        self.archive()
+        self.assertEqual(self.history(), before)
+        self.assertEqual(self.client.get('/api/orders/', {'user_id': 'u1', 'status': 'cancelled'}).data['results'],
+                         [order for order in before if order['status'] == 'cancelled'])
+
+        response = self.client.get(f'/api/orders/{self.orders[0].pk}/', {'user_id': 'u1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['items']), 2)
+        self.assertEqual(self.client.get(f'/api/orders/{self.orders[0].pk}/', {'user_id': 'u2'}).status_code, 404)
+
+        response = self.client.post('/api/cart/reorder/', {'order_number': self.orders[2].order_number,
+                                                           'user_id': 'u1'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(item['quantity'] for item in response.data['cart']['items']), [1, 3])
+
+    def test_archiving_changes_the_history_validators(self):
+        etag = self.client.get('/api/orders/', {'user_id': 'u1'})['ETag']
+        self.archive()
+        response = self.client.get('/api/orders/', {'user_id': 'u1'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        # Still one query to revalidate, archived orders included
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/orders/', {'user_id': 'u1'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        archived = self.client.get(f'/api/orders/{self.orders[0].pk}/', {'user_id': 'u1'})
+        response = self.client.get(f'/api/orders/{self.orders[0].pk}/', {'user_id': 'u1'},
+                                   HTTP_IF_NONE_MATCH=archived['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_archiving_leaves_sales_rollups_alone(self):
+        before = self.snapshot()
+        self.archive()
+        self.assertEqual(self.snapshot(), before)
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+        self.assertEqual(self.snapshot(), before)
+
+    def test_admin_and_exports_read_the_archive(self):
+        self.archive()
+        self.client.force_login(User.objects.create_superuser('admin', 'a@example.com', 'pw'))
+        response = self.client.get('/admin/products/archivedorder/', {'q': self.orders[1].order_number.lower()})
+        self.assertContains(response, self.orders[1].order_number)
+        self.assertContains(response, 'Product 1</strong> (x2)')
+        lines = list(export_lines('orders', 'csv')[0])
+        self.assertEqual(len(lines), 1 + len(self.orders))
+
+        # The Orders admin points searches and lookups at the archive
+        response = self.client.get('/admin/products/order/', {'q': self.orders[1].order_number})
+        self.assertContains(response, 'Archived orders also match')
+        self.assertContains(response, f'/admin/products/archivedorder/?q={self.orders[1].order_number}')
+        response = self.client.get('/admin/products/order/', {'q': self.orders[3].order_number})
+        self.assertNotContains(response, 'Archived orders also match')
+        response = self.client.get(f'/admin/products/order/{self.orders[1].pk}/change/')
+        self.assertRedirects(response, f'/admin/products/archivedorder/{self.orders[1].pk}/change/')
+
+
+class CheckoutConcurrencyTests(TransactionTestCase):
+    def test_parallel_checkouts_never_oversell(self):
+        from .checkout import InsufficientStock, place_order
+
+        category = Category.objects.create(name='Cement')
+        product = Product.objects.create(name='P', price=Decimal('10'), stock=20, category=category)
+        carts = []
+        for i in range(12):
+            cart = Cart.objects.create(session_id=f's{i}', user_id=f'u{i}')
+            CartItem.objects.create(cart=cart, product=product, quantity=3)
+            carts.append(cart)
+        outcomes = []
+        barrier = threading.Barrier(len(carts))
+
+        def worker(cart):
+            barrier.wait()
+            try:
+                # SQLite's shared test database reports contention as "locked"
+                # instead of waiting, so retry like a client would
+                for _ in range(200):
+                    try:
+                        place_order(cart, {'user_id': cart.user_id, 'full_name': 'A', 'phone': '1', 'address': 'X'})
+                        outcomes.append('ok')
+                        return
+                    except InsufficientStock:
+                        outcomes.append('short')
+                        return
+                    except OperationalError:
+                        time.sleep(0.005)
+                outcomes.append('gave up')
+            finally:
+                connection.close()
+
+        pool = [threading.Thread(target=worker, args=(cart,)) for cart in carts]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+
+        self.assertEqual(sorted(outcomes), ['ok'] * 6 + ['short'] * 6)
+        self.assertEqual(Product.objects.get(pk=product.pk).stock, 2)
+        self.assertEqual(OrderItem.objects.aggregate(total=Sum('quantity'))['total'], 18)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_checkout', '--carts', '15', '--stock', '10', '--threads', '3', stdout=out)
+        self.assertIn('10 checkouts, 5 refused for stock', out.getvalue())
+        self.assertIn('Final stock 0', out.getvalue())
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(Job.objects.exists())
+
+
+class CartConcurrencyTests(TransactionTestCase):
+    def test_parallel_adds_lose_no_quantity(self):
+        category = Category.objects.create(name='Cement')
+        product = Product.objects.create(name='P', price=Decimal('10'), stock=1, category=category)
+        cart = Cart.objects.create(session_id='s1')
+        threads, per_thread = 8, 25
+        errors = []
+        barrier = threading.Barrier(threads)
+
+        def worker():
+            try:
+                barrier.wait()
+                for _ in range(per_thread):
+                    CartItem.objects.add_quantity(cart.pk, product.pk, 1)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        pool = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(CartItem.objects.get(cart=cart, product=product).quantity, threads * per_thread)
+
+
+class ProductSearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.cement = Category.objects.create(name='Cement')
+        self.steel = Category.objects.create(name='TMT Steel Bars')
+        self.opc = Product.objects.create(
+            name='OPC 53 Grade Cement', description='Ordinary Portland Cement',
+            price=Decimal('350'), category=self.cement)
+        self.white = Product.objects.create(
+            name='White Finish', description='Decorative cement for finishes',
+            price=Decimal('450'), category=self.cement)
+        self.bar = Product.objects.create(
+            name='8mm TMT Bars', description='High strength reinforcement',
+            price=Decimal('65'), category=self.steel)
+
+    def search(self, query):
+        response = self.client.get('/api/products/search/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [p['id'] for p in response.data['results']]
+
+    def test_name_matches_rank_first_and_prefixes_match(self):
+        self.assertEqual(self.search('cem'), [self.opc.id, self.white.id])
+
+    def test_category_name_is_searchable(self):
+        self.assertEqual(self.search('steel'), [self.bar.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.bar.name = 'Rebar coil'
+        self.bar.save()
+        self.assertEqual(self.search('rebar'), [self.bar.id])
+        self.steel.name = 'Reinforcement Steel'
+        self.steel.save()
+        self.assertEqual(self.search('reinforcement steel'), [self.bar.id])
+        self.bar.delete()
+        self.assertEqual(self.search('rebar'), [])
+
+    def test_query_syntax_is_escaped(self):
+        self.assertEqual(self.search('"cement" -(:'), [self.opc.id, self.white.id])
+        self.assertEqual(self.search('***'), [])
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM products_product_fts')
+        self.assertEqual(self.search('cement'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('cement'), [self.opc.id, self.white.id])
+
+    def test_search_param_on_list_is_paged_by_relevance(self):
+        response = self.client.get('/api/products/', {'search': 'cement', 'page_size': 1})
+        self.assertEqual([p['id'] for p in response.data['results']], [self.opc.id])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([p['id'] for p in response.data['results']], [self.white.id])
+        self.assertIsNone(response.data['next'])
+
+    def test_index_is_matched_once_per_query(self):
+        operator = {'sqlite': 'MATCH', 'postgresql': '@@'}.get(connection.vendor)
+        if operator is None:
+            self.skipTest('No full-text index on this database')
+        with CaptureQueriesContext(connection) as queries:
+            self.search('cement')
+        page = [q['sql'] for q in queries.captured_queries if operator in q['sql']]
+        self.assertEqual(len(page), 1)
+        # Ranked from the joined index row, not a correlated subquery per product
+        self.assertEqual(page[0].count(operator), 1)
+        self.assertIn('JOIN "products_product_fts"', page[0])
+
+
+class CatalogCacheTests(CatalogTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.products = self.make_catalog(3)
+
+    def test_cache_stats_are_staff_only(self):
+        self.assertEqual(self.client.get('/api/catalog/cache-stats/').status_code, 403)
+        self.client.force_login(User.objects.create_superuser('admin', 'a@example.com', 'pw'))
+        self.assertEqual(self.client.get('/api/catalog/cache-stats/').status_code, 200)
+
+    def test_repeat_reads_are_served_from_cache(self):
+        first = self.client.get('/api/products/', {'search': 'Product'})
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/products/', {'search': ' product '})
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+
+        self.client.force_login(User.objects.create_superuser('admin', 'a@example.com', 'pw'))
+        stats = self.client.get('/api/catalog/cache-stats/').data
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_params_are_part_of_the_key(self):
+        self.client.get('/api/products/')
+        response = self.client.get('/api/products/', {'page_size': 1})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_catalog_writes_invalidate(self):
+        product = self.products[0]
+        url = f'/api/products/{product.id}/'
+        self.client.get(url)
+        self.client.get('/api/categories/')
+
+        product.price = Decimal('999.00')
+        product.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['price'], '999.00')
+
+        ProductImage.objects.create(product=product, image='products/new.jpg')
+        self.assertEqual(len(self.client.get(url).data['product_images']), 1)
+
+        Category.objects.create(name='Tiles')
+        response = self.client.get('/api/categories/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data), 2)
+
+
+    def test_checkout_only_invalidates_when_a_product_sells_out(self):
+        product = self.products[2]
+        cart = Cart.objects.create(session_id='s1', user_id='u1')
+        details = {'user_id': 'u1', 'user_email': 'u1@example.com', 'full_name': 'A', 'phone': '1', 'address': 'X'}
+        url = f'/api/products/{product.id}/'
+
+        CartItem.objects.create(cart=cart, product=product, quantity=1)
+        self.client.get(url)
+        self.assertEqual(self.client.post('/api/cart/place_order/', details, format='json').status_code, 201)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+        CartItem.objects.create(cart=cart, product=product, quantity=1)
+        self.assertEqual(self.client.post('/api/cart/place_order/', details, format='json').status_code, 201)
+        response = self.client.get(url)
+        self.assertEqual((response['X-Cache'], response.data['stock']), ('MISS', 0))
+
+class ConditionalGetTests(CatalogTestMixin, APITestCase):
+    def make_order(self, user_id='u1'):
+        return Order.objects.create(
+            order_number=f'ORD-{Order.objects.count()}', user_id=user_id,
+            full_name='A', phone='1', address='X', total_amount=Decimal('10'),
+        )
+
+    def test_catalog_revalidation_costs_no_queries(self):
+        self.make_catalog(2)
+        response = self.client.get('/api/products/')
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        Category.objects.create(name='Tiles')
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_catalog_etag_depends_on_params(self):
+        self.make_catalog(2)
+        etag = self.client.get('/api/categories/')['ETag']
+        response = self.client.get('/api/products/in_stock/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_orders_not_modified_until_status_changes(self):
+        order = self.make_order()
+        OrderItem.objects.create(order=order, product_name='P', product_price=Decimal('5'), quantity=2)
+        response = self.client.get('/api/orders/', {'user_id': 'u1'})
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertIn('private', response['Cache-Control'])
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/orders/', {'user_id': 'u1'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            f'/api/orders/{order.id}/', {'user_id': 'u1'}, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        order.status = 'shipped'
+        order.save()
+        response = self.client.get('/api/orders/', {'user_id': 'u1'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['status'], 'shipped')
+
+    def test_new_order_changes_etag(self):
+        self.make_order()
+        etag = self.client.get('/api/orders/', {'user_id': 'u1'})['ETag']
+        self.make_order()
+        response = self.client.get('/api/orders/', {'user_id': 'u1'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class SparseFieldsetTests(CatalogTestMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.product = self.make_catalog(1)[0]
+        ProductImage.objects.create(product=self.product, image='products/extra.jpg')
+
+    def test_list_defaults_to_cards(self):
+        card = self.client.get('/api/products/').data['results'][0]
+        self.assertEqual(set(card), {
+            'id', 'name', 'price', 'stock', 'category', 'category_name', 'image',
+            'image_variants', 'summary'})
+        self.assertEqual(card['category_name'], 'Cement')
+        self.assertEqual(card['image'], '/media/products/extra.jpg')
+
+    def test_detail_is_full(self):
+        detail = self.client.get(f'/api/products/{self.product.id}/').data
+        self.assertIn('description', detail)
+        self.assertEqual(len(detail['product_images']), 1)
+
+    def test_fields_are_deferred_in_sql(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/products/', {'fields': 'id,name'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'name'})
+        self.assertNotIn('description', queries[0]['sql'])
+
+    def test_expand_adds_to_the_card(self):
+        card = self.client.get('/api/products/', {'expand': 'description'}).data['results'][0]
+        self.assertEqual(card['description'], 'Description 0')
+        self.assertIn('price', card)
+
+    def test_nested_selection_on_cart_and_orders(self):
+        cart = Cart.objects.create(session_id='s1', user_id='u1')
+        CartItem.objects.create(cart=cart, product=self.product, quantity=3)
+        data = self.client.get('/api/cart/', {
+            'user_id': 'u1', 'fields': 'total,items.quantity,items.product.name'}).data
+        self.assertEqual(data, {
+            'total': '300.00', 'items': [{'quantity': 3, 'product': {'name': 'Product 0'}}]})
+
+        order = Order.objects.create(
+            order_number='ORD-1', user_id='u1', full_name='A', phone='1',
+            address='X', total_amount=Decimal('10'))
+        OrderItem.objects.create(order=order, product_name='P', product_price=Decimal('5'), quantity=2)
+        with self.assertNumQueries(3):
+            data = self.client.get('/api/orders/', {'user_id': 'u1', 'fields': 'order_number,status'}).data
+        self.assertEqual(data['results'], [{'order_number': 'ORD-1', 'status': 'pending'}])
+
+
+@override_settings(CATALOG_PRICE_BUCKETS=(100, 1000))
+class ProductFilterTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.cement = Category.objects.create(name='Cement')
+        self.tiles = Category.objects.create(name='Tiles')
+        for name, price, stock, category in [
+            ('OPC Cement', '350', 10, self.cement),
+            ('White Cement', '1450', 0, self.cement),
+            ('Floor Tile', '45', 100, self.tiles),
+            ('Wall Tile', '40', 0, self.tiles),
+        ]:
+            Product.objects.create(
+                name=name, description=name, price=Decimal(price), stock=stock, category=category)
+
+    def get(self, **params):
+        response = self.client.get('/api/products/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def names(self, data):
+        return [p['name'] for p in data['results']]
+
+    def test_filters_combine(self):
+        data = self.get(min_price='40', max_price='400', in_stock='true', ordering='price')
+        self.assertEqual(self.names(data), ['Floor Tile', 'OPC Cement'])
+        data = self.get(category=f'{self.cement.id},{self.tiles.id}', ordering='-stock')
+        self.assertEqual(self.names(data)[:2], ['Floor Tile', 'OPC Cement'])
+
+    def test_facets_are_disjunctive_and_single_query(self):
+        with self.assertNumQueries(2):
+            facets = self.get(category=self.cement.id, in_stock='1')['facets']
+        self.assertEqual(
+            [(c['name'], c['count'], c['selected']) for c in facets['categories']],
+            [('Cement', 1, True), ('Tiles', 1, False)],
+        )
+        self.assertEqual([b['count'] for b in facets['price']], [0, 1, 0])
+        self.assertEqual(facets['in_stock'], 1)
+
+    def test_facets_follow_search(self):
+        facets = self.get(search='tile')['facets']
+        self.assertEqual([c['name'] for c in facets['categories']], ['Tiles'])
+        self.assertEqual([b['count'] for b in facets['price']], [2, 0, 0])
+
+    def test_facets_only_on_first_page(self):
+        data = self.get(page_size=1)
+        self.assertNotIn('facets', self.client.get(data['next']).data)
+
+    def test_invalid_values_are_rejected(self):
+        self.assertEqual(self.client.get('/api/products/', {'min_price': 'cheap'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/products/', {'category': 'x'}).status_code, 400)
+
+
+@override_settings(PRODUCT_IMAGE_WIDTHS=(50, 100, 400), PRODUCT_IMAGE_DERIVATIVES_SYNC=True)
+class ImageDerivativeTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.category = Category.objects.create(name='Tiles')
+
+    def upload(self, color='red', mode='RGB'):
+        buffer = BytesIO()
+        PILImage.new(mode, (200, 120), color).save(buffer, 'PNG')
+        return SimpleUploadedFile('tile.png', buffer.getvalue(), content_type='image/png')
+
+    def test_derivatives_generated_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(
+                name='Tile', description='d', price=Decimal('1'), category=self.category,
+                image=self.upload())
+        product.refresh_from_db()
+        variants = product.image_variants
+        self.assertEqual(variants['source'], product.image.name)
+        self.assertEqual(sorted(variants['webp'], key=int), ['50', '100'])
+        self.assertTrue(default_storage.exists(variants['webp']['50']))
+
+        card = self.client.get('/api/products/').data['results'][0]
+        self.assertEqual(card['image_variants']['webp']['100'], default_storage.url(variants['webp']['100']))
+        self.assertTrue(card['image_variants']['srcset']['jpeg'].endswith(' 100w'))
+
+    def test_generation_is_idempotent_and_content_addressed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = ProductImage.objects.create(
+                product=Product.objects.create(
+                    name='Tile', description='d', price=Decimal('1'), category=self.category),
+                image=self.upload(mode='RGBA', color=(0, 0, 0, 0)))
+        self.assertEqual(generate_derivatives(ProductImage, first.pk), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            second = ProductImage.objects.create(product=first.product, image=self.upload(mode='RGBA', color=(0, 0, 0, 0)))
+        second.refresh_from_db()
+        first.refresh_from_db()
+        self.assertEqual(second.image_variants['hash'], first.image_variants['hash'])
+        self.assertEqual(generate_derivatives(ProductImage, second.pk, force=True), 4)
+
+    def test_backfill_command(self):
+        with override_settings(PRODUCT_IMAGE_DERIVATIVES_SYNC=False):
+            product = Product.objects.create(
+                name='Tile', description='d', price=Decimal('1'), category=self.category,
+                image=self.upload())
+        self.assertEqual(product.image_variants, {})
+        out = StringIO()
+        call_command('generate_image_derivatives', workers=1, stdout=out)
+        self.assertIn('wrote 4 files', out.getvalue())
+        product.refresh_from_db()
+        self.assertIn('hash', product.image_variants)
+
+
+class ImportCatalogTests(APITestCase):
+    def write(self, suffix, content):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(fd, 'w') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def run_import(self, path, **options):
+        out = StringIO()
+        call_command('import_catalog', path, stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def test_csv_import_creates_updates_and_skips_bad_rows(self):
+        cement = Category.objects.create(name='Cement')
+        Product.objects.create(name='PPC Cement', description='old', price=Decimal('300'), stock=5, category=cement)
+        Product.objects.create(name='White Cement', description='same', price=Decimal('450'), stock=1, category=cement)
+        path = self.write('.csv', (
+            'name,description,price,stock,category\n'
+            'PPC Cement,Portland Pozzolana,340,150,Cement\n'
+            'White Cement,same,450.00,1,Cement\n'
+            'River Sand,Fine sand,80,1000,Sand and Aggregates\n'
+            'Broken,,not-a-price,1,Cement\n'
+        ))
+        output = self.run_import(path, batch_size=2)
+        self.assertIn('1 created, 1 updated, 1 unchanged, 1 errors', output)
+        self.assertIn('rows/sec', output)
+        ppc = Product.objects.get(name='PPC Cement')
+        self.assertEqual((ppc.price, ppc.stock, ppc.description), (Decimal('340.00'), 150, 'Portland Pozzolana'))
+        sand = Product.objects.get(name='River Sand')
+        self.assertEqual(sand.category.name, 'Sand and Aggregates')
+        # Bulk writes still reach the search index
+        response = self.client.get('/api/products/search/', {'q': 'pozzolana'})
+        self.assertEqual([p['id'] for p in response.data['results']], [ppc.id])
+
+    def test_out_of_range_values_are_row_errors(self):
+        path = self.write('.jsonl', '\n'.join(json.dumps(row) for row in [
+            {'name': 'Negative', 'price': -5, 'stock': 1, 'category': 'Cement'},
+            {'name': 'Not a number', 'price': 'NaN', 'stock': 1, 'category': 'Cement'},
+            {'name': 'Too dear', 'price': '1e12', 'stock': 1, 'category': 'Cement'},
+            {'name': 'Oversold', 'price': 10, 'stock': -3, 'category': 'Cement'},
+            {'name': 'Good', 'price': 10, 'stock': 3, 'category': 'Cement'},
+        ]))
+        out, err = StringIO(), StringIO()
+        call_command('import_catalog', path, stdout=out, stderr=err)
+        self.assertIn('1 created, 0 updated, 0 unchanged, 4 errors', out.getvalue())
+        for message in ("invalid price -5", "invalid price 'NaN'", "invalid price '1e12'", 'invalid stock -3'):
+            self.assertIn(message, err.getvalue())
+        self.assertEqual(list(Product.objects.values_list('name', flat=True)), ['Good'])
+
+    def test_jsonl_dry_run_writes_nothing(self):
+        path = self.write('.jsonl', '\n'.join(json.dumps(row) for row in [
+            {'name': 'AAC Blocks', 'price': 55, 'stock': 800, 'category': 'Bricks'},
+            {'name': 'Red Bricks', 'price': '10', 'stock': 5000, 'category': 'Bricks'},
+        ]))
+        output = self.run_import(path, dry_run=True, verbosity=2)
+        self.assertIn('+ category Bricks', output)
+        self.assertIn('would import 2 rows', output)
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(Category.objects.exists())
+
+    def test_batches_are_bulk_queries(self):
+        Category.objects.create(name='Tiles')
+        path = self.write('.jsonl', '\n'.join(
+            json.dumps({'name': f'Tile {i}', 'price': i, 'stock': i, 'category': 'Tiles'})
+            for i in range(50)
+        ))
+        with CaptureQueriesContext(connection) as queries:
+            self.run_import(path, batch_size=50)
+        self.assertEqual(Product.objects.count(), 50)
+        self.assertLess(len(queries), 15)
+
+
+class ExportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        for number, status_, day in [(1, 'delivered', 5), (2, 'pending', 6), (3, 'delivered', 20)]:
+            order = Order.objects.create(
+                order_number=f'ORD-{number}', user_id='u1', user_email='a@example.com',
+                full_name='A, "B"', phone='1', address='Line 1\nLine 2',
+                total_amount=Decimal('20'), status=status_)
+            Order.objects.filter(pk=order.pk).update(
+                created_at=timezone.make_aware(datetime(2025, 1, day, 12)))
+            for i in range(2):
+                OrderItem.objects.create(order=order, product_name=f'P{i}', product_price=Decimal('5'), quantity=2)
+        self.admin = User.objects.create_user('staff', password='x', is_staff=True)
+
+    def test_requires_staff(self):
+        self.assertEqual(self.client.get('/api/exports/orders.csv').status_code, 403)
+
+    def test_streams_filtered_order_lines_as_csv(self):
+        self.client.force_login(self.admin)
+        response = self.client.get('/api/exports/order-items.csv', {
+            'since': '2025-01-01', 'until': '2025-01-10', 'status': 'delivered'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([(r['order_number'], r['product_name']) for r in rows],
+                         [('ORD-1', 'P0'), ('ORD-1', 'P1')])
+        self.assertEqual(rows[0]['address'], 'Line 1\nLine 2')
+
+    def test_ndjson_and_bad_arguments(self):
+        self.client.force_login(self.admin)
+        response = self.client.get('/api/exports/orders.ndjson', {'until': '2025-01-06'})
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([line['order_number'] for line in lines], ['ORD-1', 'ORD-2'])
+        self.assertEqual(lines[0]['total_amount'], '20.00')
+        self.assertEqual(self.client.get('/api/exports/orders.xml').status_code, 400)
+        self.assertEqual(self.client.get('/api/exports/products.csv', {'status': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/exports/orders.csv', {'since': 'soon'}).status_code, 400)
+
+    def test_management_command(self):
+        out = StringIO()
+        call_command('export_data', 'orders', format='ndjson', status='delivered', stdout=out, stderr=StringIO())
+        self.assertEqual(len(out.getvalue().splitlines()), 2)
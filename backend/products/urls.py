@@ -11,5 +11,9 @@ router.register(r'contact', views.ContactSubmissionViewSet, basename='contact')
 
 urlpatterns = [
     path('csrf/', views.csrf, name='csrf'),
+    path('catalog/cache-stats/', views.catalog_cache_stats, name='catalog-cache-stats'),
+    path('stock/', views.stock_availability, name='stock-availability'),
+    path('exports/<slug:dataset>.<slug:fmt>', views.export, name='export'),
+    path('analytics/sales/', views.sales_analytics, name='sales-analytics'),
     path('', include(router.urls)),
 ] 
\ No newline at end of file
@@ -1,18 +1,35 @@
-from django.shortcuts import render, get_object_or_404
+from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, status
 from rest_framework.response import Response
-from rest_framework.decorators import action, api_view
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from django.middleware.csrf import get_token
-from django.http import JsonResponse
-from django.db.models import Q
-from .models import Product, Category, Cart, CartItem, Order, OrderItem, ProductImage, ContactSubmission
-from .serializers import (ProductSerializer, CategorySerializer, CartSerializer, 
-                        CartItemSerializer, OrderSerializer, OrderItemSerializer, 
-                        ProductImageSerializer, ContactSubmissionSerializer)
-import uuid
-from datetime import datetime
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.db import transaction
+from django.db.models import Count, Max, Value
+from .models import Product, Category, Order, ProductImage, ContactSubmission
+from .serializers import (ProductSerializer, ProductCardSerializer, CategorySerializer,
+                        CartSerializer, CartItemSerializer, OrderSerializer,
+                        ContactSubmissionSerializer, parse_field_list)
+from .pagination import KeysetPagination, OrderHistoryPagination
+from .archive import find_order, order_querysets
+from .search import get_search_backend
+from .filters import OrderFilter, ProductFilter
+from .carts import parse_operations, parse_quantity
+from .cart_storage import get_cart_store
+from .checkout import place_order
+from .idempotency import idempotent
+from .jobs import enqueue
+from .rollups import GROUPS as SALES_GROUPS, sales_report
+from .inventory import InsufficientStock, availability, hold, hold_many, hold_ttl, release
+from .exports import ExportError, export_lines
+from .cache import CatalogCacheMixin, cache_catalog_response, cache_stats
+from .conditional import CatalogConditionalMixin, ConditionalGetMixin, conditional_get, make_etag
+from datetime import datetime, timedelta
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.utils.decorators import method_decorator
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 
 # Create your views here.
 
@@ -22,30 +39,141 @@ def csrf(request):
     token = get_token(request)
     return JsonResponse({'csrfToken': token})
 
-class CategoryViewSet(viewsets.ModelViewSet):
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def catalog_cache_stats(request):
+    return Response(cache_stats())
+
+@api_view(['GET'])
+def stock_availability(request):
+    """
+    Live stock for ?ids=1,2,3: units in stock, units held in carts and units
+    still available. Read straight from the product rows, never cached.
+    """
+    try:
+        ids = [int(pk) for pk in request.query_params.get('ids', '').split(',') if pk.strip()]
+    except ValueError:
+        return Response({'error': 'ids must be a comma-separated list of product ids'}, status=status.HTTP_400_BAD_REQUEST)
+    if not ids or len(ids) > 100:
+        return Response({'error': 'Pass between 1 and 100 product ids'}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({str(pk): stock for pk, stock in availability(ids).items()})
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def export(request, dataset, fmt):
+    """
+    Stream a dataset as CSV or NDJSON, e.g. /api/exports/order-items.csv
+    ?since=2025-01-01&until=2025-03-31&status=delivered,shipped
+    """
+    statuses = parse_field_list(request.query_params.get('status'))
+    try:
+        lines, content_type = export_lines(
+            dataset, fmt,
+            since=request.query_params.get('since'),
+            until=request.query_params.get('until'),
+            statuses=statuses,
+        )
+    except ExportError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    response = StreamingHttpResponse(lines, content_type=content_type)
+    filename = f'{dataset}-{datetime.now().strftime("%Y%m%d-%H%M%S")}.{fmt}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def sales_analytics(request):
+    """
+    Sales from the daily rollups, e.g. /api/analytics/sales/?group=product
+    &since=2025-01-01&until=2025-01-31&status=delivered. ``group`` is day,
+    status, product or category; the range defaults to the last 30 days.
+    """
+    params = request.query_params
+    group = params.get('group', 'day')
+    if group not in SALES_GROUPS:
+        return Response({'error': f'group must be one of {", ".join(SALES_GROUPS)}'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        until = parse_date(params['until']) if params.get('until') else timezone.localdate()
+        since = parse_date(params['since']) if params.get('since') else until and until - timedelta(days=29)
+        limit = max(min(int(params.get('limit', 20)), 100), 1)
+    except ValueError:
+        since = until = None
+    if since is None or until is None or since > until:
+        return Response({'error': 'since and until must be dates (YYYY-MM-DD), since first; limit a number'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    report = sales_report(
+        since, until, group, statuses=parse_field_list(params.get('status')),
+        limit=limit if group in ('product', 'category') else None,
+    )
+    return Response({'since': since, 'until': until, 'group': group, **report})
+
+class SparseFieldsetMixin:
+    """
+    Pass ``?fields=`` and ``?expand=`` from GET requests to the serializer.
+    """
+    def get_field_selection(self):
+        params = self.request.query_params
+        return {
+            'fields': parse_field_list(params.get('fields')),
+            'expand': parse_field_list(params.get('expand')),
+        }
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request is not None and self.request.method == 'GET':
+            for key, value in self.get_field_selection().items():
+                kwargs.setdefault(key, value)
+        return super().get_serializer(*args, **kwargs)
+
+class CategoryViewSet(CatalogConditionalMixin, CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(CatalogConditionalMixin, CatalogCacheMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    pagination_class = KeysetPagination
+    # Listing actions render compact cards unless ?fields=/?expand= ask for more
+    list_actions = ('list', 'search', 'by_category', 'in_stock')
+
+    def get_serializer_class(self):
+        if self.action in self.list_actions:
+            return ProductCardSerializer
+        return ProductSerializer
 
     def get_queryset(self):
         queryset = Product.objects.all()
         search = self.request.query_params.get('search', None)
-        category = self.request.query_params.get('category', None)
         
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | 
-                Q(description__icontains=search)
-            )
-            
-        if category:
-            queryset = queryset.filter(category=category)
+            queryset = get_search_backend().search(queryset, search)
+
+        # Facets are counted over the searched set before the filters narrow it
+        self.product_filter = ProductFilter(self.request.query_params)
+        self.facet_queryset = queryset
+        queryset = self.product_filter.filter(queryset)
+
+        if self.request.method == 'GET':
+            # Keyset cursors read these columns from the page's rows
+            queryset = self.get_serializer().optimize_queryset(
+                queryset, columns=('created_at', 'price', 'stock'))
             
         return queryset
 
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        # Facets describe the whole result set, so only the first page carries them
+        if self.action == 'list' and not self.request.query_params.get('cursor'):
+            response.data['facets'] = self.product_filter.facets(self.facet_queryset)
+        return response
+
+    def paginated_response(self, queryset):
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
     def create(self, request, *args, **kwargs):
         images = request.FILES.getlist('images')
         main_image = request.FILES.get('image')
@@ -82,19 +210,21 @@ class ProductViewSet(viewsets.ModelViewSet):
         return Response(updated_serializer.data)
 
     @action(detail=False, methods=['GET'])
+    @conditional_get
+    @cache_catalog_response
     def by_category(self, request):
         category_id = request.query_params.get('category_id', None)
         if category_id:
-            products = Product.objects.filter(category_id=category_id)
-            serializer = self.get_serializer(products, many=True)
-            return Response(serializer.data)
+            products = self.get_queryset().filter(category_id=category_id)
+            return self.paginated_response(products)
         return Response({'error': 'Category ID is required'}, status=400)
 
     @action(detail=False, methods=['GET'])
+    @conditional_get
+    @cache_catalog_response
     def in_stock(self, request):
-        products = Product.objects.filter(stock__gt=0)
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        products = self.get_queryset().filter(stock__gt=0)
+        return self.paginated_response(products)
         
     @action(detail=True, methods=['DELETE'])
     def remove_image(self, request, pk=None):
@@ -111,91 +241,92 @@ class ProductViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Image not found'}, status=status.HTTP_404_NOT_FOUND)
 
     @action(detail=False, methods=['GET'])
+    @conditional_get
+    @cache_catalog_response
     def search(self, request):
         """
-        Search for products by name or description.
+        Full-text search over name, description and category, best matches first.
         """
         search_query = request.query_params.get('q', '')
         if not search_query:
             return Response({'error': 'No search query provided'}, status=status.HTTP_400_BAD_REQUEST)
             
-        products = self.get_queryset().filter(
-            Q(name__icontains=search_query) | 
-            Q(description__icontains=search_query)
-        )
+        products = get_search_backend().search(self.get_queryset(), search_query)
         
-        serializer = self.get_serializer(products, many=True)
-        return Response(serializer.data)
+        return self.paginated_response(products)
 
 @method_decorator(ensure_csrf_cookie, name='dispatch')
 class CartViewSet(viewsets.ViewSet):
+    @property
+    def store(self):
+        return get_cart_store()
+
+    def serialize_cart(self, cart):
+        params = self.request.query_params
+        serializer = CartSerializer(
+            cart,
+            fields=parse_field_list(params.get('fields')),
+            expand=parse_field_list(params.get('expand')),
+        )
+        self.store.load_items(cart, serializer)
+        return serializer.data
+
+    def mutation_response(self, cart, product_id=None, item_id=None, removed_id=None):
+        """
+        Answer a cart write with the whole cart, or with ``?response=delta``
+        only the changed line, the total and the version.
+        """
+        self.store.changed(cart)
+        if self.request.query_params.get('response') != 'delta':
+            return Response(self.serialize_cart(cart))
+        data = CartSerializer(cart, fields=['id', 'total', 'version']).data
+        item = None
+        if product_id is not None or item_id is not None:
+            item = self.store.line(cart, product_id=product_id, item_id=item_id)
+        data['item'] = CartItemSerializer(item).data if item else None
+        if removed_id is not None:
+            data['removed_item_id'] = int(removed_id)
+        return Response(data)
+
     def get_cart(self, request):
-        user_id = request.query_params.get('user_id') or request.data.get('user_id')
-        session_id = request.session.get('cart_id')
-
-        if user_id:
-            # Try to find cart by user_id first
-            cart = Cart.objects.filter(user_id=user_id).first()
-            if cart:
-                return cart
-
-        if session_id:
-            cart = Cart.objects.filter(session_id=session_id).first()
-            if cart:
-                # If user is now logged in, update the cart with user info
-                if user_id and not cart.user_id:
-                    cart.user_id = user_id
-                    cart.save()
-                return cart
-
-        return None
+        """The request's cart from the configured store, resolved once per request."""
+        if not hasattr(request, '_cart'):
+            request._cart = self.store.get(request)
+        return request._cart
+
+    def get_or_create_cart(self, request):
+        request._cart = self.store.get_or_create(request, self.get_cart(request))
+        return request._cart
 
     def list(self, request):
         cart = self.get_cart(request)
         if not cart:
             return Response({'items': []})
-        serializer = CartSerializer(cart)
-        return Response(serializer.data)
+        return Response(self.serialize_cart(cart))
 
     @action(detail=False, methods=['post'])
+    @idempotent
     def add_item(self, request):
         try:
             product_id = request.data.get('product_id')
-            quantity = int(request.data.get('quantity', 1))
-            user_id = request.data.get('user_id')
-            user_email = request.data.get('user_email')
+            quantity = parse_quantity(request.data.get('quantity', 1), minimum=1)
 
             if not product_id:
                 return Response({'error': 'Product ID is required'}, status=status.HTTP_400_BAD_REQUEST)
+            if quantity is None:
+                return Response({'error': 'Quantity must be a whole number of at least 1'},
+                                status=status.HTTP_400_BAD_REQUEST)
 
             product = get_object_or_404(Product, id=product_id)
-            
-            cart = self.get_cart(request)
-            if not cart:
-                session_id = str(uuid.uuid4())
-                request.session['cart_id'] = session_id
-                cart = Cart.objects.create(
-                    session_id=session_id,
-                    user_id=user_id,
-                    user_email=user_email
-                )
-            elif user_id and not cart.user_id:
-                cart.user_id = user_id
-                cart.user_email = user_email
-                cart.save()
-
-            cart_item, created = CartItem.objects.get_or_create(
-                cart=cart,
-                product=product,
-                defaults={'quantity': quantity}
-            )
-
-            if not created:
-                cart_item.quantity += quantity
-                cart_item.save()
-
-            serializer = CartSerializer(cart)
-            return Response(serializer.data)
+            cart = self.get_or_create_cart(request)
+            # A failed cart write rolls the hold back with it
+            with transaction.atomic():
+                hold(cart.session_id, product.pk, quantity, add=True)
+                self.store.add(cart, product.pk, quantity)
+
+            return self.mutation_response(cart, product_id=product.pk)
+        except InsufficientStock as e:
+            return self.insufficient_stock(e)
         except Exception as e:
             print(f"Error in add_item: {str(e)}")
             return Response(
@@ -204,6 +335,54 @@ class CartViewSet(viewsets.ViewSet):
             )
 
     @action(detail=False, methods=['post'])
+    @idempotent
+    def batch(self, request):
+        """
+        Apply many add/set/remove operations in one transaction and return the
+        final cart once, with a result per operation.
+        """
+        operations = parse_operations(request.data.get('operations'))
+        return self.batch_response(request, operations)
+
+    @action(detail=False, methods=['post'])
+    @idempotent
+    def reorder(self, request):
+        """Add every still-listed product from a past order to the cart."""
+        order_number = request.data.get('order_number')
+        user_id = request.data.get('user_id')
+        if not order_number or not user_id:
+            return Response({'error': 'order_number and user_id are required'}, status=status.HTTP_400_BAD_REQUEST)
+        order = find_order(order_number=order_number, user_id=user_id)
+        if order is None:
+            raise Http404
+        operations = [
+            {'op': 'add', 'product_id': product_id, 'quantity': quantity}
+            for product_id, quantity in order.items.filter(product__isnull=False).values_list('product_id', 'quantity')
+        ]
+        if not operations:
+            return Response({'error': 'None of these products are available'}, status=status.HTTP_400_BAD_REQUEST)
+        return self.batch_response(request, operations)
+
+    def batch_response(self, request, operations):
+        user_id = request.data.get('user_id')
+        cart = self.get_or_create_cart(request)
+        if user_id and cart.user_id and cart.user_id != user_id:
+            return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
+        unavailable = []
+
+        def reserve(targets):
+            # Hold the final quantity of every product the batch touched;
+            # the store leaves the products that fall short as they were
+            unavailable.extend(hold_many(cart.session_id, targets)[1])
+            return unavailable
+
+        with transaction.atomic():
+            results = self.store.apply(cart, operations, reserve=reserve)
+        self.store.changed(cart)
+        return Response({'cart': self.serialize_cart(cart), 'results': results, 'unavailable': unavailable})
+
+    @action(detail=False, methods=['post'])
+    @idempotent
     def update_item(self, request):
         item_id = request.data.get('item_id')
         quantity = request.data.get('quantity')
@@ -220,20 +399,28 @@ class CartViewSet(viewsets.ViewSet):
         if user_id and cart.user_id and cart.user_id != user_id:
             return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
 
-        try:
-            cart_item = CartItem.objects.get(id=item_id, cart=cart)
-            if int(quantity) > 0:
-                cart_item.quantity = int(quantity)
-                cart_item.save()
-            else:
-                cart_item.delete()
-        except CartItem.DoesNotExist:
+        quantity = parse_quantity(quantity, minimum=0)
+        if quantity is None:
+            return Response({'error': 'Quantity must be a whole number of at least 0'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        product_id = self.store.product_of(cart, item_id)
+        if product_id is None:
             return Response({'error': 'Item not found'}, status=status.HTTP_404_NOT_FOUND)
-
-        serializer = CartSerializer(cart)
-        return Response(serializer.data)
+        try:
+            with transaction.atomic():
+                hold(cart.session_id, product_id, quantity)
+                if not self.store.set_quantity(cart, item_id, quantity):
+                    transaction.set_rollback(True)
+                    return Response({'error': 'Item not found'}, status=status.HTTP_404_NOT_FOUND)
+        except InsufficientStock as e:
+            return self.insufficient_stock(e)
+
+        if quantity > 0:
+            return self.mutation_response(cart, item_id=item_id)
+        return self.mutation_response(cart, removed_id=item_id)
 
     @action(detail=False, methods=['post'])
+    @idempotent
     def remove_item(self, request):
         item_id = request.data.get('item_id')
         user_id = request.data.get('user_id')
@@ -249,16 +436,19 @@ class CartViewSet(viewsets.ViewSet):
         if user_id and cart.user_id and cart.user_id != user_id:
             return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
 
-        try:
-            cart_item = CartItem.objects.get(id=item_id, cart=cart)
-            cart_item.delete()
-        except CartItem.DoesNotExist:
+        product_id = self.store.product_of(cart, item_id)
+        if product_id is None:
             return Response({'error': 'Item not found'}, status=status.HTTP_404_NOT_FOUND)
+        with transaction.atomic():
+            release(cart.session_id, [product_id])
+            if not self.store.remove(cart, item_id):
+                transaction.set_rollback(True)
+                return Response({'error': 'Item not found'}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = CartSerializer(cart)
-        return Response(serializer.data)
+        return self.mutation_response(cart, removed_id=item_id)
 
     @action(detail=False, methods=['post'])
+    @idempotent
     def clear(self, request):
         user_id = request.data.get('user_id')
         cart = self.get_cart(request)
@@ -267,14 +457,43 @@ class CartViewSet(viewsets.ViewSet):
             # Verify cart belongs to user
             if user_id and cart.user_id and cart.user_id != user_id:
                 return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
-            cart.items.all().delete()
-            
+            with transaction.atomic():
+                release(cart.session_id)
+                self.store.clear(cart)
+            self.store.changed(cart)
+
         return Response({'message': 'Cart cleared'})
 
     @action(detail=False, methods=['post'])
+    @idempotent
+    def start_checkout(self, request):
+        """
+        Hold stock for every line for STOCK_HOLD_MINUTES while the customer
+        fills in checkout details. Lines that cannot be held come back as a
+        409 with the quantities still available.
+        """
+        cart = self.get_cart(request)
+        if not cart or self.store.is_empty(cart):
+            return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
+        user_id = request.data.get('user_id')
+        if user_id and cart.user_id and cart.user_id != user_id:
+            return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
+        held, short = hold_many(cart.session_id, self.store.quantities(cart))
+        if short:
+            return self.insufficient_stock(InsufficientStock(short))
+        return Response({
+            'holds': [{'product_id': pk, 'quantity': quantity} for pk, quantity in held.items()],
+            'expires_at': timezone.now() + hold_ttl(),
+        })
+
+    def insufficient_stock(self, error):
+        return Response({'error': 'Insufficient stock', 'lines': error.lines}, status=status.HTTP_409_CONFLICT)
+
+    @action(detail=False, methods=['post'])
+    @idempotent
     def place_order(self, request):
         cart = self.get_cart(request)
-        if not cart or not cart.items.exists():
+        if not cart or self.store.is_empty(cart):
             return Response({'error': 'Cart is empty'}, status=status.HTTP_400_BAD_REQUEST)
 
         # Validate required fields
@@ -288,56 +507,97 @@ class CartViewSet(viewsets.ViewSet):
         if user_id and cart.user_id and cart.user_id != user_id:
             return Response({'error': 'Unauthorized'}, status=status.HTTP_403_FORBIDDEN)
 
+        details = {field: request.data[field] for field in required_fields}
         try:
-            # Create order
-            order = Order.objects.create(
-                order_number=f"ORD-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}",
-                user_id=request.data['user_id'],
-                user_email=request.data['user_email'],
-                full_name=request.data['full_name'],
-                phone=request.data['phone'],
-                address=request.data['address'],
-                total_amount=cart.total
-            )
-
-            # Create order items
-            for cart_item in cart.items.all():
-                OrderItem.objects.create(
-                    order=order,
-                    product=cart_item.product,
-                    product_name=cart_item.product.name,
-                    product_price=cart_item.product.price,
-                    quantity=cart_item.quantity
-                )
-                
-                # Update product stock
-                product = cart_item.product
-                product.stock -= cart_item.quantity
-                product.save()
-
-            # Clear the cart
-            cart.items.all().delete()
-
-            serializer = OrderSerializer(order)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
-
-class OrderViewSet(viewsets.ReadOnlyModelViewSet):
+            order = place_order(cart, details)
+        except InsufficientStock as e:
+            return self.insufficient_stock(e)
+
+        serializer = OrderSerializer(order)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+class OrderViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    A user's order history, newest first in keyset pages (?ordering=oldest
+    reverses it), optionally filtered with ?status= and ?since=/?until=.
+    Archived orders are read alongside live ones.
+    """
     serializer_class = OrderSerializer
+    pagination_class = OrderHistoryPagination
+    conditional_cache_control = {'private': True, 'no_cache': True}
     
-    def get_queryset(self):
+    def get_querysets(self):
+        """The user's live and archived orders, read through together."""
         user_id = self.request.query_params.get('user_id', None)
         if not user_id:
-            return Order.objects.none()
-        return Order.objects.filter(user_id=user_id).order_by('-created_at')
+            return [Order.objects.none()]
+        serializer = self.get_serializer()
+        querysets = []
+        for queryset in order_querysets(user_id=user_id):
+            if self.action == 'list':
+                queryset = OrderFilter(self.request.query_params).filter(queryset)
+            # created_at and id build the page cursors even when not rendered
+            queryset = queryset.only(*serializer.load_columns(), 'created_at')
+            if 'items' in serializer.fields:
+                queryset = queryset.prefetch_related('items')
+            querysets.append(queryset)
+        return querysets
+
+    def get_queryset(self):
+        return self.get_querysets()[0]
+
+    def paginate_queryset(self, queryset):
+        return self.paginator.paginate_queryset(self.get_querysets(), self.request, view=self)
+
+    def get_object(self):
+        if str(self.kwargs['pk']).isdigit():
+            for queryset in self.get_querysets():
+                order = queryset.filter(pk=self.kwargs['pk']).first()
+                if order is not None:
+                    self.check_object_permissions(self.request, order)
+                    return order
+        raise Http404
+
+    def get_validators(self, request):
+        # An aggregate over the user's orders stands in for the whole body:
+        # any status change moves max(updated_at), any insert or delete the count.
+        user_id = request.query_params.get('user_id')
+        if not user_id:
+            return None, None
+        if self.action == 'retrieve' and not str(self.kwargs.get('pk', '')).isdigit():
+            return None, None
+        # Live and archived orders alike, in one UNION ALL query: archiving
+        # moves an order between the tables, which changes both counts.
+        parts = []
+        for source, orders in zip(('live', 'archived'), order_querysets(user_id=user_id)):
+            if self.action == 'retrieve':
+                orders = orders.filter(pk=self.kwargs['pk'])
+            parts.append(
+                orders.order_by().values('user_id')
+                .annotate(source=Value(source), last_modified=Max('updated_at'), count=Count('id'))
+                .values_list('source', 'last_modified', 'count')
+            )
+        stats = sorted(parts[0].union(*parts[1:], all=True))
+        if not stats:
+            return None, None
+        last_modified = max(modified for _, modified, _ in stats)
+        etag = make_etag(
+            'orders', user_id, self.kwargs.get('pk', ''), stats,
+            last_modified.isoformat(), request.query_params.urlencode(),
+        )
+        return etag, int(last_modified.timestamp())
 
 class ContactSubmissionViewSet(viewsets.ModelViewSet):
     queryset = ContactSubmission.objects.all()
     serializer_class = ContactSubmissionSerializer
     http_method_names = ['post', 'head']  # Only allow POST requests for submissions
     
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            submission = serializer.save()
+            enqueue('contact_acknowledgement', submission_id=submission.pk)
+            enqueue('contact_notification', submission_id=submission.pk)
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -50,6 +50,8 @@ const ProductCard = ({ product }) => {
     >
       <Image
         src={getImageSrc()}
+        srcSet={product.image_variants?.srcset?.webp?.replace(/(^|, )\//g, '$1http://localhost:8000/')}
+        sizes="(max-width: 480px) 100vw, 320px"
         alt={product.name}
         height="200px"
         width="100%"
@@ -81,7 +83,7 @@ const ProductCard = ({ product }) => {
         </Box>
 
         <Text mt={2} color="gray.600" fontSize="sm" noOfLines={2}>
-          {product.description}
+          {product.summary ?? product.description}
         </Text>
 
         <Flex mt={4} justifyContent="space-between" align="center">
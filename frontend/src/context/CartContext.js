@@ -10,6 +10,17 @@ axios.defaults.xsrfHeaderName = 'X-CSRFToken';
 
 const CartContext = createContext();
 
+// A 409 from the cart lists each line that is short of stock
+const describeError = (error, fallback) => {
+  const shortLines = error.response?.data?.lines;
+  if (shortLines) {
+    return shortLines
+      .map((line) => `${line.product_name}: only ${line.available} left (you asked for ${line.requested})`)
+      .join('; ');
+  }
+  return error.response?.data?.error || fallback;
+};
+
 export const CartProvider = ({ children }) => {
   const [cart, setCart] = useState(null);
   const [loading, setLoading] = useState(true);
@@ -107,7 +118,7 @@ export const CartProvider = ({ children }) => {
       console.error('Error adding to cart:', error.response || error);
       toast({
         title: 'Error',
-        description: error.response?.data?.error || 'Failed to add item to cart',
+        description: describeError(error, 'Failed to add item to cart'),
         status: 'error',
         duration: 3000,
         isClosable: true,
@@ -134,7 +145,7 @@ export const CartProvider = ({ children }) => {
     } catch (error) {
       toast({
         title: 'Error',
-        description: error.response?.data?.error || 'Failed to update cart',
+        description: describeError(error, 'Failed to update cart'),
         status: 'error',
         duration: 3000,
         isClosable: true,
@@ -192,6 +203,10 @@ export const CartProvider = ({ children }) => {
       await fetchCart();
       return { success: true, data: response.data };
     } catch (error) {
+      const shortLines = error.response?.data?.lines;
+      if (shortLines) {
+        return { success: false, error: describeError(error), lines: shortLines };
+      }
       return {
         success: false,
         error: error.response?.data?.error || 'Failed to place order',
@@ -20,6 +20,7 @@ import {
   AccordionButton,
   AccordionPanel,
   AccordionIcon,
+  Button,
 } from '@chakra-ui/react';
 import axios from 'axios';
 import { useAuth } from '../context/AuthContext';
@@ -33,8 +34,16 @@ const statusColors = {
   cancelled: 'red',
 };
 
+// Put a freshly fetched first page in front of the older pages already loaded
+const mergeOrders = (current, page) => {
+  const fresh = new Set(page.map((order) => order.id));
+  return [...page, ...current.filter((order) => !fresh.has(order.id))];
+};
+
 const Orders = () => {
   const [orders, setOrders] = useState([]);
+  const [nextPage, setNextPage] = useState(undefined);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState(true);
   const { user } = useAuth();
   const navigate = useNavigate();
@@ -48,7 +57,9 @@ const Orders = () => {
         },
         withCredentials: true,
       });
-      setOrders(response.data);
+      setOrders((current) => mergeOrders(current, response.data.results));
+      // Polling refreshes the first page; keep the cursor of pages already loaded
+      setNextPage((current) => (current === undefined ? response.data.next : current));
     } catch (error) {
       console.error('Error fetching orders:', error);
       toast({
@@ -63,6 +74,25 @@ const Orders = () => {
     }
   };
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const response = await axios.get(nextPage, { withCredentials: true });
+      setOrders((current) => [...current, ...response.data.results]);
+      setNextPage(response.data.next);
+    } catch (error) {
+      toast({
+        title: 'Error',
+        description: 'Failed to load more orders',
+        status: 'error',
+        duration: 3000,
+        isClosable: true,
+      });
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     if (!user) {
       toast({
@@ -183,6 +213,11 @@ const Orders = () => {
             </AccordionItem>
           ))}
         </Accordion>
+        {nextPage && (
+          <Button onClick={loadMore} isLoading={loadingMore} alignSelf="center">
+            Load older orders
+          </Button>
+        )}
       </VStack>
     </Container>
   );
@@ -41,6 +41,8 @@ const Products = () => {
   const navigate = useNavigate();
   const toast = useToast();
   const [searchQuery, setSearchQuery] = useState('');
+  const [nextPage, setNextPage] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const fetchProducts = async (category = null, search = null) => {
     setSearchLoading(true);
@@ -57,7 +59,8 @@ const Products = () => {
       }
       
       const response = await axios.get(url, { params });
-      setProducts(response.data);
+      setProducts(response.data.results);
+      setNextPage(response.data.next);
     } catch (error) {
       console.error('Error fetching products:', error);
       toast({
@@ -110,6 +113,20 @@ const Products = () => {
     setSearchLoading(true);
   };
 
+  const loadMore = async () => {
+    if (!nextPage) return;
+    setLoadingMore(true);
+    try {
+      const response = await axios.get(nextPage);
+      setProducts((current) => [...current, ...response.data.results]);
+      setNextPage(response.data.next);
+    } catch (error) {
+      console.error('Error loading more products:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleAddToCart = async (productId) => {
     const result = await addToCart(productId);
     
@@ -213,6 +230,12 @@ const Products = () => {
             )}
           </MotionSimpleGrid>
         </AnimatePresence>
+
+        {nextPage && (
+          <Button onClick={loadMore} isLoading={loadingMore} alignSelf="center">
+            Load more
+          </Button>
+        )}
       </VStack>
     </MotionContainer>
   );
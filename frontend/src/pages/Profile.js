@@ -41,12 +41,16 @@ const Profile = () => {
   const fetchOrders = async () => {
     try {
       const response = await axios.get('http://localhost:8000/api/orders/', {
+        params: {
+          user_id: user.id,
+          page_size: 5,
+        },
         withCredentials: true,
         headers: {
           'Authorization': `Bearer ${user?.access_token}`
         }
       });
-      setOrders(response.data);
+      setOrders(response.data.results);
     } catch (error) {
       toast({
         title: 'Error',
@@ -109,7 +113,12 @@ const Profile = () => {
           <Divider />
 
           <Box>
-            <Heading size="md" mb={4}>Order History</Heading>
+            <HStack justify="space-between" mb={4}>
+              <Heading size="md">Recent Orders</Heading>
+              <Button size="sm" variant="link" onClick={() => navigate('/orders')}>
+                View all
+              </Button>
+            </HStack>
             {orders.length === 0 ? (
               <Text>No orders found.</Text>
             ) : (